@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Anvil区域文件(.mca)头部解析模块
+
+区域文件开头的8 KiB是两张表：1024个区块的位置（3字节扇区偏移 + 1字节扇区数）
+和1024个区块的最后保存时间（4字节Unix时间戳），都是大端序。
+"""
+
+import os
+import re
+import gzip
+import mmap
+import zlib
+import struct
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # 没有numpy时逐个区块计算统计（较慢）
+    np = None
+
+
+SECTOR_SIZE = 4096
+HEADER_SIZE = 2 * SECTOR_SIZE
+CHUNKS_PER_REGION = 1024
+REGION_FILE_PATTERN = re.compile(r"^r\.(-?\d+)\.(-?\d+)\.mca$")
+
+_HEADER_STRUCT = struct.Struct(">1024I1024I")
+_LENGTH_STRUCT = struct.Struct(">I")
+
+COMPRESSION_GZIP = 1
+COMPRESSION_ZLIB = 2
+COMPRESSION_NONE = 3
+COMPRESSION_LZ4 = 4
+EXTERNAL_CHUNK_FLAG = 0x80  # 区块超过255个扇区时数据存放在同目录的 c.<x>.<z>.mcc 文件中
+
+
+def _morton_key(index: int) -> int:
+    x, z = index % 32, index // 32
+    key = 0
+    for bit in range(5):
+        key |= ((x >> bit) & 1) << (2 * bit) | ((z >> bit) & 1) << (2 * bit + 1)
+    return key
+
+
+# 区块下标的Z序（Morton）排序键：按它排列时相邻区块在文件中也相近
+SPATIAL_KEYS = [_morton_key(index) for index in range(CHUNKS_PER_REGION)]
+
+
+def region_coords(path: str) -> Optional[Tuple[int, int]]:
+    """从文件名解析区域坐标，不是区域文件时返回None"""
+    match = REGION_FILE_PATTERN.match(os.path.basename(path.replace('\\', '/')))
+    if not match:
+        return None
+    return int(match.group(1)), int(match.group(2))
+
+
+@dataclass
+class RegionHeader:
+    """区域文件头"""
+    region_x: int
+    region_z: int
+    locations: List[int] = field(default_factory=lambda: [0] * CHUNKS_PER_REGION)  # (扇区偏移 << 8) | 扇区数
+    timestamps: List[int] = field(default_factory=lambda: [0] * CHUNKS_PER_REGION)
+
+    def is_present(self, index: int) -> bool:
+        return self.locations[index] != 0
+
+    def sector_offset(self, index: int) -> int:
+        return self.locations[index] >> 8
+
+    def sector_count(self, index: int) -> int:
+        return self.locations[index] & 0xFF
+
+    def chunk_coords(self, index: int) -> Tuple[int, int]:
+        """区块的世界区块坐标"""
+        return self.region_x * 32 + index % 32, self.region_z * 32 + index // 32
+
+    def present_indexes(self) -> List[int]:
+        return [i for i, location in enumerate(self.locations) if location]
+
+    @property
+    def chunk_count(self) -> int:
+        return sum(1 for location in self.locations if location)
+
+
+def parse_region_header(data: bytes, region_x: int = 0, region_z: int = 0) -> RegionHeader:
+    """解析区域文件头，不足8 KiB（空文件或新建文件）时视为没有区块"""
+    if len(data) < HEADER_SIZE:
+        return RegionHeader(region_x, region_z)
+    values = _HEADER_STRUCT.unpack_from(data)
+    return RegionHeader(region_x, region_z, list(values[:CHUNKS_PER_REGION]), list(values[CHUNKS_PER_REGION:]))
+
+
+def read_region_header(path: str) -> RegionHeader:
+    """读取区域文件头"""
+    region_x, region_z = region_coords(path) or (0, 0)
+    with open(path, 'rb') as f:
+        return parse_region_header(f.read(HEADER_SIZE), region_x, region_z)
+
+
+def diff_region_headers(old: RegionHeader, new: RegionHeader) -> Dict[str, List]:
+    """按区块时间戳比较两个区域文件头
+
+    返回 {"added": [[x, z, 时间]], "removed": [[x, z, 时间]], "modified": [[x, z, 旧时间, 新时间]]}，
+    坐标为世界区块坐标。时间戳相同但扇区数变化的区块也算作修改。
+    """
+    added, removed, modified = [], [], []
+    for index in range(CHUNKS_PER_REGION):
+        was, now = old.is_present(index), new.is_present(index)
+        if not was and not now:
+            continue
+        x, z = new.chunk_coords(index)
+        if not was:
+            added.append([x, z, new.timestamps[index]])
+        elif not now:
+            removed.append([x, z, old.timestamps[index]])
+        elif (old.timestamps[index] != new.timestamps[index]
+              or old.sector_count(index) != new.sector_count(index)):
+            modified.append([x, z, old.timestamps[index], new.timestamps[index]])
+    return {"added": added, "removed": removed, "modified": modified}
+
+
+@dataclass
+class RegionStats:
+    """单个区域文件的统计（只读文件头得到）"""
+    path: str
+    region_x: int
+    region_z: int
+    file_size: int = 0
+    chunk_count: int = 0
+    used_sectors: int = 0
+    free_sectors: int = 0  # 文件内未被任何区块占用的扇区（不含头部）
+    gaps: int = 0  # 区块数据之间的空洞数
+    oldest_timestamp: int = 0
+    newest_timestamp: int = 0
+
+    @property
+    def fragmentation(self) -> float:
+        """空闲扇区占数据区的比例"""
+        total = self.used_sectors + self.free_sectors
+        return self.free_sectors / total if total else 0.0
+
+    def to_dict(self) -> Dict:
+        return {
+            "path": self.path,
+            "region_x": self.region_x,
+            "region_z": self.region_z,
+            "file_size": self.file_size,
+            "chunk_count": self.chunk_count,
+            "used_sectors": self.used_sectors,
+            "free_sectors": self.free_sectors,
+            "gaps": self.gaps,
+            "fragmentation": round(self.fragmentation, 4),
+            "oldest_timestamp": self.oldest_timestamp,
+            "newest_timestamp": self.newest_timestamp
+        }
+
+
+def region_stats(header: RegionHeader, path: str, file_size: int) -> RegionStats:
+    """由文件头计算区块数、扇区占用、碎片和时间范围"""
+    stats = RegionStats(path, header.region_x, header.region_z, file_size)
+    # 位置值高24位为扇区偏移，直接排序即按偏移排序
+    runs = sorted(location for location in header.locations if location)
+    timestamps = [t for location, t in zip(header.locations, header.timestamps) if location and t]
+    stats.chunk_count = len(runs)
+    end = HEADER_SIZE // SECTOR_SIZE
+    for location in runs:
+        offset = location >> 8
+        if offset > end:
+            stats.gaps += 1
+        run_end = offset + (location & 0xFF)
+        if run_end > end:
+            end = run_end
+        stats.used_sectors += location & 0xFF
+    file_sectors = -(-file_size // SECTOR_SIZE)
+    stats.free_sectors = max(0, file_sectors - HEADER_SIZE // SECTOR_SIZE - stats.used_sectors)
+    if timestamps:
+        stats.oldest_timestamp = min(timestamps)
+        stats.newest_timestamp = max(timestamps)
+    return stats
+
+
+def _region_stats_numpy(mapped, path: str, region_x: int, region_z: int, file_size: int) -> RegionStats:
+    """region_stats 的向量化版本，直接在映射的头部上计算"""
+    table = np.frombuffer(mapped, dtype='>u4', count=2 * CHUNKS_PER_REGION)
+    locations = table[:CHUNKS_PER_REGION]
+    present = locations != 0
+    runs = np.sort(locations[present])
+    stats = RegionStats(path, region_x, region_z, file_size)
+    stats.chunk_count = int(runs.size)
+    if runs.size:
+        offsets = (runs >> 8).astype(np.int64)
+        ends = np.maximum.accumulate(offsets + (runs & 0xFF))
+        stats.used_sectors = int((runs & 0xFF).sum())
+        stats.gaps = int(offsets[0] > HEADER_SIZE // SECTOR_SIZE) + int((offsets[1:] > ends[:-1]).sum())
+        timestamps = table[CHUNKS_PER_REGION:][present]
+        timestamps = timestamps[timestamps != 0]
+        if timestamps.size:
+            stats.oldest_timestamp = int(timestamps.min())
+            stats.newest_timestamp = int(timestamps.max())
+    file_sectors = -(-file_size // SECTOR_SIZE)
+    stats.free_sectors = max(0, file_sectors - HEADER_SIZE // SECTOR_SIZE - stats.used_sectors)
+    return stats
+
+
+def scan_region_file(path: str) -> RegionStats:
+    """内存映射区域文件，只读取8 KiB头部计算统计"""
+    region_x, region_z = region_coords(path) or (0, 0)
+    with open(path, 'rb') as f:
+        file_size = os.fstat(f.fileno()).st_size
+        if file_size < HEADER_SIZE:
+            return RegionStats(path, region_x, region_z, file_size)
+        with mmap.mmap(f.fileno(), HEADER_SIZE, access=mmap.ACCESS_READ) as mapped:
+            if np is not None:
+                return _region_stats_numpy(mapped, path, region_x, region_z, file_size)
+            header = parse_region_header(mapped, region_x, region_z)
+    return region_stats(header, path, file_size)
+
+
+@dataclass
+class ChunkRecord:
+    """区域文件中的一个区块，数据保持压缩状态"""
+    index: int
+    x: int
+    z: int
+    timestamp: int
+    compression: int  # 不含外部存放标志
+    payload: bytes
+    external: bool = False
+
+    def decompress(self) -> bytes:
+        return decompress_chunk(self.compression, self.payload)
+
+
+def decompress_chunk(compression: int, payload: bytes) -> bytes:
+    """解压区块数据，返回未压缩的NBT"""
+    if compression == COMPRESSION_ZLIB:
+        return zlib.decompress(payload)
+    if compression == COMPRESSION_GZIP:
+        return gzip.decompress(payload)
+    if compression == COMPRESSION_NONE:
+        return payload
+    # LZ4（1.20.5起可选）使用 lz4-java 的私有分块格式，这里不支持
+    raise ValueError(f"不支持的区块压缩方式 {compression}")
+
+
+def external_chunk_path(region_path: str, x: int, z: int) -> str:
+    return os.path.join(os.path.dirname(region_path), f"c.{x}.{z}.mcc")
+
+
+def _read_chunk(mapped, file_size: int, header: RegionHeader, index: int, path: str) -> Tuple[Optional[ChunkRecord], str]:
+    start = header.sector_offset(index) * SECTOR_SIZE
+    if start < HEADER_SIZE or start + 5 > file_size:
+        return None, "扇区偏移超出文件"
+    length = _LENGTH_STRUCT.unpack_from(mapped, start)[0]
+    if length == 0 or length > header.sector_count(index) * SECTOR_SIZE or start + 4 + length > file_size:
+        return None, f"区块长度无效: {length}"
+    compression = mapped[start + 4]
+    x, z = header.chunk_coords(index)
+    if compression & EXTERNAL_CHUNK_FLAG:
+        try:
+            with open(external_chunk_path(path, x, z), 'rb') as f:
+                payload = f.read()
+        except OSError as e:
+            return None, f"外部区块文件不可读: {e}"
+        return ChunkRecord(index, x, z, header.timestamps[index], compression & ~EXTERNAL_CHUNK_FLAG, payload, True), ""
+    return ChunkRecord(index, x, z, header.timestamps[index], compression, mapped[start + 5:start + 4 + length]), ""
+
+
+def iter_chunks(path: str, errors: Optional[List[Tuple[int, str]]] = None) -> Iterator[ChunkRecord]:
+    """按数据在文件中的顺序读取区域文件的所有区块
+
+    损坏的区块不产出，(区块下标, 原因) 记入 errors。
+    """
+    region_x, region_z = region_coords(path) or (0, 0)
+    with open(path, 'rb') as f:
+        file_size = os.fstat(f.fileno()).st_size
+        if file_size < HEADER_SIZE:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            header = parse_region_header(mapped[:HEADER_SIZE], region_x, region_z)
+            for index in sorted(header.present_indexes(), key=header.sector_offset):
+                record, error = _read_chunk(mapped, file_size, header, index, path)
+                if record is None:
+                    if errors is not None:
+                        errors.append((index, error))
+                    continue
+                yield record
+
+
+def write_region(path: str, records: Iterable[ChunkRecord]) -> int:
+    """把区块按给定顺序连续写入新的区域文件，原子替换原文件，返回新文件大小
+
+    先写临时文件并落盘再替换，中途崩溃时原文件保持不变。外部存放的区块只写入
+    标志字节，.mcc 文件保持原样。
+    """
+    locations = [0] * CHUNKS_PER_REGION
+    timestamps = [0] * CHUNKS_PER_REGION
+    temp_path = path + ".tmp"
+    sector = HEADER_SIZE // SECTOR_SIZE
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(bytes(HEADER_SIZE))
+            for record in records:
+                if record.external:
+                    body = _LENGTH_STRUCT.pack(1) + bytes([record.compression | EXTERNAL_CHUNK_FLAG])
+                else:
+                    body = _LENGTH_STRUCT.pack(len(record.payload) + 1) + bytes([record.compression]) + record.payload
+                sectors = -(-len(body) // SECTOR_SIZE)
+                if sectors > 0xFF:
+                    raise ValueError(f"区块 ({record.x}, {record.z}) 超过255个扇区，必须外部存放")
+                f.write(body)
+                f.write(bytes(sectors * SECTOR_SIZE - len(body)))
+                locations[record.index] = (sector << 8) | sectors
+                timestamps[record.index] = record.timestamp
+                sector += sectors
+            f.seek(0)
+            f.write(_HEADER_STRUCT.pack(*locations, *timestamps))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return sector * SECTOR_SIZE
+
+
+def spatial_order(records: Iterable[ChunkRecord]) -> List[ChunkRecord]:
+    """按Z序排列区块，写入后空间上相邻的区块在文件中连续"""
+    return sorted(records, key=lambda record: SPATIAL_KEYS[record.index])
+
+
+def is_compact(header: RegionHeader, file_size: int) -> bool:
+    """区块已经按Z序连续排列且文件中没有空闲扇区"""
+    indexes = sorted(header.present_indexes(), key=header.sector_offset)
+    if indexes != sorted(indexes, key=SPATIAL_KEYS.__getitem__):
+        return False
+    sector = HEADER_SIZE // SECTOR_SIZE
+    for index in indexes:
+        if header.sector_offset(index) != sector:
+            return False
+        sector += header.sector_count(index)
+    return -(-file_size // SECTOR_SIZE) == sector
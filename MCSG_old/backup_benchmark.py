@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+备份性能基准测试脚本
+
+生成一个模拟世界（区块文件 + 玩家数据），分别测量完整ZIP备份、
+增量备份的基准备份，以及修改1%文件后的增量备份耗时。
+指定 --players 时另外生成大量玩家文件，比较小文件使用zstd训练字典前后的ZIP备份。
+
+用法: python backup_benchmark.py [--size-mb 2048] [--change-percent 1] [--players 50000]
+"""
+
+import os
+import sys
+import time
+import random
+import shutil
+import gzip
+import json
+import uuid
+import argparse
+import tempfile
+
+from backup_manager import BackupManager
+
+
+REGION_FILE_SIZE = 8 * 1024 * 1024
+SECTOR_SIZE = 4096
+
+
+def create_test_world(directory: str, size_mb: int):
+    """生成模拟世界"""
+    region_dir = os.path.join(directory, "world", "region")
+    playerdata_dir = os.path.join(directory, "world", "playerdata")
+    os.makedirs(region_dir, exist_ok=True)
+    os.makedirs(playerdata_dir, exist_ok=True)
+
+    region_count = max(1, size_mb * 1024 * 1024 // REGION_FILE_SIZE)
+    side = int(region_count ** 0.5) + 1
+    for i in range(region_count):
+        x, z = i % side - side // 2, i // side - side // 2
+        with open(os.path.join(region_dir, f"r.{x}.{z}.mca"), 'wb') as f:
+            # 区块数据本身已压缩，用随机数据模拟
+            f.write(os.urandom(REGION_FILE_SIZE))
+
+    for i in range(200):
+        with open(os.path.join(playerdata_dir, f"{i:08x}-0000-0000-0000-000000000000.dat"), 'wb') as f:
+            f.write(os.urandom(2048))
+
+    with open(os.path.join(directory, "server.properties"), 'w', encoding='utf-8') as f:
+        f.write("motd=benchmark\n")
+
+
+STAT_KEYS = ["minecraft:" + name for name in (
+    "play_time", "walk_one_cm", "sprint_one_cm", "jump", "deaths", "mob_kills", "damage_dealt",
+    "damage_taken", "time_since_rest", "leave_game", "fly_one_cm", "swim_one_cm", "crouch_one_cm")]
+BLOCK_KEYS = ["minecraft:" + name for name in (
+    "stone", "dirt", "grass_block", "oak_log", "cobblestone", "deepslate", "iron_ore", "coal_ore",
+    "sand", "gravel", "netherrack", "diamond_ore", "andesite", "granite", "diorite")]
+ADVANCEMENTS = ["minecraft:story/" + name for name in (
+    "root", "mine_stone", "upgrade_tools", "smelt_iron", "obtain_armor", "lava_bucket", "iron_tools",
+    "deflect_arrow", "form_obsidian", "mine_diamond", "enter_the_nether", "shiny_gear", "enchant_item")]
+
+
+def create_player_files(directory: str, count: int):
+    """生成 count 个玩家的 playerdata(.dat, gzip)、stats 和 advancements(JSON) 文件"""
+    world = os.path.join(directory, "world")
+    for sub in ("playerdata", "stats", "advancements"):
+        os.makedirs(os.path.join(world, sub), exist_ok=True)
+
+    rng = random.Random(42)
+    for _ in range(count):
+        player = str(uuid.UUID(int=rng.getrandbits(128)))
+        stats = {
+            "stats": {
+                "minecraft:custom": {k: rng.randint(1, 10 ** 6) for k in rng.sample(STAT_KEYS, rng.randint(4, 13))},
+                "minecraft:mined": {k: rng.randint(1, 5000) for k in rng.sample(BLOCK_KEYS, rng.randint(0, 15))},
+                "minecraft:used": {k: rng.randint(1, 500) for k in rng.sample(BLOCK_KEYS, rng.randint(0, 8))}
+            },
+            "DataVersion": 3700
+        }
+        advancements = {
+            name: {"criteria": {name.split("/")[-1]: f"2024-0{rng.randint(1, 9)}-1{rng.randint(0, 9)} "
+                                                       f"1{rng.randint(0, 9)}:{rng.randint(10, 59)}:00 +0000"},
+                   "done": True}
+            for name in rng.sample(ADVANCEMENTS, rng.randint(1, len(ADVANCEMENTS)))
+        }
+        advancements["DataVersion"] = 3700
+        with open(os.path.join(world, "stats", f"{player}.json"), 'w', encoding='utf-8') as f:
+            json.dump(stats, f, indent=2)
+        with open(os.path.join(world, "advancements", f"{player}.json"), 'w', encoding='utf-8') as f:
+            json.dump(advancements, f, indent=2)
+        with open(os.path.join(world, "playerdata", f"{player}.dat"), 'wb') as f:
+            # 玩家数据是gzip压缩的NBT
+            f.write(gzip.compress(os.urandom(256) + b"\x00" * rng.randint(512, 4096)))
+
+
+def modify_world(directory: str, change_percent: float) -> int:
+    """修改指定比例的文件（每个文件改写一个扇区），返回修改的文件数"""
+    files = []
+    for root, _, names in os.walk(os.path.join(directory, "world")):
+        files.extend(os.path.join(root, name) for name in names)
+
+    count = max(1, int(len(files) * change_percent / 100))
+    for path in random.sample(files, count):
+        size = os.path.getsize(path)
+        with open(path, 'r+b') as f:
+            f.seek(random.randrange(0, max(size - SECTOR_SIZE, 1)))
+            f.write(os.urandom(min(SECTOR_SIZE, size)))
+    return count
+
+
+def timed(label: str, func):
+    """执行并打印耗时"""
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    size = result.backup_size if result else 0
+    print(f"{label:<28} {elapsed:8.2f} s   {size / 1024 / 1024:10.1f} MB")
+    return elapsed
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="备份性能基准测试")
+    parser.add_argument("--size-mb", type=int, default=2048, help="模拟世界大小（MB）")
+    parser.add_argument("--change-percent", type=float, default=1.0, help="增量前修改的文件比例")
+    parser.add_argument("--work-dir", default=None, help="工作目录（默认临时目录）")
+    parser.add_argument("--players", type=int, default=0, help="生成的玩家数量（比较字典压缩，0 表示跳过）")
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="mcsg_bench_")
+    server_dir = os.path.join(work_dir, "server")
+    backup_dir = os.path.join(work_dir, "backups")
+
+    try:
+        print(f"=== 生成 {args.size_mb} MB 模拟世界: {server_dir} ===")
+        create_test_world(server_dir, args.size_mb)
+
+        manager = BackupManager(backup_dir)
+        manager.max_backups_per_server = 100
+
+        print(f"\n{'测试':<28} {'耗时':>10}   {'备份大小':>12}")
+        timed("完整ZIP备份", lambda: manager.create_backup("bench", "bench", server_dir, backup_format="zip"))
+        time.sleep(1)  # 备份ID精确到秒
+        timed("完整tar+zstd备份", lambda: manager.create_backup("bench", "bench", server_dir, backup_format="tarzst"))
+        time.sleep(1)
+        timed("增量备份（基准）", lambda: manager.create_backup("bench", "bench", server_dir, backup_format="incremental"))
+
+        changed = modify_world(server_dir, args.change_percent)
+        print(f"\n已修改 {changed} 个文件 ({args.change_percent}%)")
+        time.sleep(1)
+        timed(f"增量备份（{args.change_percent}%变化）",
+              lambda: manager.create_backup("bench", "bench", server_dir, backup_format="incremental"))
+        time.sleep(1)
+        timed(f"完整ZIP备份（{args.change_percent}%变化）",
+              lambda: manager.create_backup("bench", "bench", server_dir, backup_format="zip"))
+
+        if args.players > 0:
+            players_dir = os.path.join(work_dir, "players")
+            print(f"\n=== 生成 {args.players} 个玩家的数据文件: {players_dir} ===")
+            create_player_files(players_dir, args.players)
+            print(f"\n{'测试':<28} {'耗时':>10}   {'备份大小':>12}")
+            manager.use_compression_dictionary = False
+            time.sleep(1)
+            timed("玩家文件ZIP（逐文件deflate）",
+                  lambda: manager.create_backup("players", "players", players_dir, backup_format="zip"))
+            manager.use_compression_dictionary = True
+            timed("训练字典", lambda: manager.get_compression_dictionary("players", players_dir) and None)
+            time.sleep(1)
+            timed("玩家文件ZIP（zstd字典）",
+                  lambda: manager.create_backup("players", "players", players_dir, backup_format="zip"))
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
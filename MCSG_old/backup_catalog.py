@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+备份目录（SQLite索引）模块
+"""
+
+import os
+import json
+import sqlite3
+import threading
+from typing import Callable, Dict, Iterable, List, Optional
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS backups (
+    backup_id TEXT PRIMARY KEY,
+    server_id TEXT NOT NULL,
+    backup_time TEXT NOT NULL,
+    backup_format TEXT NOT NULL DEFAULT 'zip',
+    backup_size INTEGER NOT NULL DEFAULT 0,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_backups_server_time ON backups (server_id, backup_time);
+CREATE INDEX IF NOT EXISTS idx_backups_time ON backups (backup_time);
+"""
+
+
+class BackupCatalog:
+    """备份目录
+
+    常用查询字段（ID、服务器、时间、格式、大小）建索引列，完整记录以JSON保存在 data 列，
+    记录结构变化时无需修改表结构。所有写操作在事务中完成。
+    """
+
+    def __init__(self, db_path: str, record_from_dict: Callable[[Dict], object]):
+        self.db_path = db_path
+        self.record_from_dict = record_from_dict
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def _row_values(record) -> tuple:
+        data = record.to_dict()
+        return (data["backup_id"], data["server_id"], data["backup_time"], data.get("backup_format", "zip"),
+                data.get("backup_size", 0), json.dumps(data, ensure_ascii=False))
+
+    def _records(self, rows: Iterable[tuple]) -> list:
+        return [self.record_from_dict(json.loads(row[0])) for row in rows]
+
+    def upsert_many(self, records: Iterable):
+        """在一个事务中添加或更新多条记录"""
+        values = [self._row_values(r) for r in records]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO backups (backup_id, server_id, backup_time, backup_format, backup_size, data) "
+                "VALUES (?, ?, ?, ?, ?, ?)", values)
+
+    def upsert(self, record):
+        """添加或更新一条记录"""
+        self.upsert_many([record])
+
+    def delete_many(self, backup_ids: Iterable[str]) -> int:
+        """在一个事务中删除多条记录，返回删除数量"""
+        ids = [(backup_id,) for backup_id in backup_ids]
+        with self._lock, self._conn:
+            before = self._conn.total_changes
+            self._conn.executemany("DELETE FROM backups WHERE backup_id = ?", ids)
+            return self._conn.total_changes - before
+
+    def get(self, backup_id: str):
+        """按ID查询（主键索引）"""
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM backups WHERE backup_id = ?", (backup_id,)).fetchone()
+        return self._records([row])[0] if row else None
+
+    def find(self, server_id: Optional[str] = None, backup_format: Optional[str] = None,
+             newest_first: bool = True, limit: int = -1, offset: int = 0) -> list:
+        """按服务器/格式查询，按备份时间排序"""
+        conditions = []
+        params: List = []
+        if server_id is not None:
+            conditions.append("server_id = ?")
+            params.append(server_id)
+        if backup_format is not None:
+            conditions.append("backup_format = ?")
+            params.append(backup_format)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        order = "DESC" if newest_first else "ASC"
+        sql = f"SELECT data FROM backups {where} ORDER BY backup_time {order} LIMIT ? OFFSET ?"
+        with self._lock:
+            rows = self._conn.execute(sql, params + [limit, offset]).fetchall()
+        return self._records(rows)
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM backups").fetchone()[0]
+
+    def has_format(self, backup_format: str) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM backups WHERE backup_format = ? LIMIT 1",
+                                      (backup_format,)).fetchone() is not None
+
+    def server_summary(self) -> Dict[str, Dict]:
+        """按服务器汇总数量、大小和最新备份时间"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT server_id, COUNT(*), COALESCE(SUM(backup_size), 0), MAX(backup_time) "
+                "FROM backups GROUP BY server_id").fetchall()
+        return {row[0]: {"count": row[1], "size": row[2], "latest": row[3]} for row in rows}
+
+    def migrate_from_json(self, json_path: str) -> int:
+        """从旧的 backups.json 导入，成功后把旧文件改名保留，返回导入数量"""
+        if not os.path.exists(json_path):
+            return 0
+        with open(json_path, 'r', encoding='utf-8') as f:
+            records = [self.record_from_dict(item) for item in json.load(f)]
+        self.upsert_many(records)
+        os.replace(json_path, json_path + ".migrated")
+        return len(records)
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+备份差异比较模块
+
+只读取两个备份的清单/索引和区域文件开头的8 KiB头部，不解压文件主体：
+普通文件按清单中的哈希比较，区域文件再按区块时间戳比较出变化的区块。
+"""
+
+import hashlib
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+import anvil
+import seekable_archive
+from parallel_archive import INTERNAL_NAMES, load_zip_manifest, open_zip_member
+
+
+class BackupReader:
+    """按备份格式读取文件表 {路径: (大小, 签名)} 和文件开头的字节
+
+    签名带方案前缀（block/crc/sha256/chunks），只有方案相同的签名才可比较。
+    """
+
+    def __init__(self, backup_format: str, archive_path: str, chunk_store=None,
+                 manifest: Optional[Dict] = None, archive_paths: Optional[Dict[str, str]] = None):
+        self.backup_format = backup_format
+        self.archive_path = archive_path
+        self.chunk_store = chunk_store
+        self.manifest = manifest  # 增量或去重备份的清单
+        self.archive_paths = archive_paths or {}  # 增量链：备份ID -> 归档路径
+        self._zips: Dict[str, zipfile.ZipFile] = {}
+        self._tar = None
+        self._infos: Dict[str, zipfile.ZipInfo] = {}
+        self._entries: Dict[str, Dict] = {}
+
+    def close(self):
+        for zipf in self._zips.values():
+            zipf.close()
+        self._zips.clear()
+        if self._tar:
+            self._tar.close()
+
+    def _zip(self, path: str) -> zipfile.ZipFile:
+        zipf = self._zips.get(path)
+        if zipf is None:
+            zipf = self._zips[path] = zipfile.ZipFile(path, 'r')
+        return zipf
+
+    def _tar_reader(self) -> seekable_archive.SeekableTarReader:
+        if self._tar is None:
+            self._tar = seekable_archive.SeekableTarReader(self.archive_path)
+        return self._tar
+
+    def files(self) -> Dict[str, Tuple[int, str]]:
+        if self.backup_format == "dedup":
+            return {e["path"]: (e["size"], "chunks:" + hashlib.sha256(",".join(e["chunks"]).encode()).hexdigest())
+                    for e in self.manifest["files"]}
+        if self.backup_format == "incremental":
+            return {p: (e["size"], "sha256:" + e["hash"]) for p, e in self.manifest["files"].items()}
+        if self.backup_format == "tarzst":
+            return {p: (e["size"], "block:" + e["hash"]) for p, e in self._tar_reader().files.items()}
+
+        zipf = self._zip(self.archive_path)
+        hashes = (load_zip_manifest(zipf) or {"files": {}})["files"]
+        table = {}
+        for info in zipf.infolist():
+            if info.is_dir() or info.filename in INTERNAL_NAMES:
+                continue
+            self._infos[info.filename] = info
+            entry = hashes.get(info.filename)
+            table[info.filename] = (info.file_size, "block:" + entry["hash"] if entry else f"crc:{info.CRC:08x}")
+        return table
+
+    def read_prefix(self, path: str, length: int) -> bytes:
+        """读取文件开头 length 字节（zstd/deflate条目只解压开头部分）"""
+        if self.backup_format == "dedup":
+            if not self._entries:
+                self._entries = {e["path"]: e for e in self.manifest["files"]}
+            entry = self._entries[path]
+            data = b""
+            for digest in entry["chunks"]:
+                if len(data) >= length:
+                    break
+                data += self.chunk_store.get_chunk(digest)
+            return data[:length]
+        if self.backup_format == "incremental":
+            entry = self.manifest["files"][path]
+            with self._zip(self.archive_paths[entry["backup_id"]]).open(path) as f:
+                return f.read(length)
+        if self.backup_format == "tarzst":
+            reader = self._tar_reader()
+            entry = reader.files[path]
+            return b"".join(reader.read_range(entry["offset"], min(length, entry["size"])))
+
+        zipf = self._zip(self.archive_path)
+        info = self._infos.get(path) or zipf.getinfo(path)
+        with open_zip_member(zipf, info) as f:
+            return f.read(length)
+
+
+def _region_header(reader: BackupReader, path: str) -> anvil.RegionHeader:
+    region_x, region_z = anvil.region_coords(path)
+    return anvil.parse_region_header(reader.read_prefix(path, anvil.HEADER_SIZE), region_x, region_z)
+
+
+def diff_backups(old_reader: BackupReader, new_reader: BackupReader,
+                 open_old: Callable[[], BackupReader], open_new: Callable[[], BackupReader],
+                 max_workers: int = 4) -> Dict:
+    """比较两个备份，返回变化报告
+
+    文件哈希相同的区域文件直接跳过；其余区域文件在线程池中读取头部
+    （每个线程通过 open_old/open_new 打开自己的读取器），按区块时间戳比较。
+    """
+    old_files = old_reader.files()
+    new_files = new_reader.files()
+
+    added = sorted(set(new_files) - set(old_files))
+    removed = sorted(set(old_files) - set(new_files))
+    modified, unverified = [], []
+    for path in sorted(set(old_files) & set(new_files)):
+        (old_size, old_sig), (new_size, new_sig) = old_files[path], new_files[path]
+        if old_sig.split(':', 1)[0] == new_sig.split(':', 1)[0]:
+            if old_sig != new_sig:
+                modified.append(path)
+        elif old_size != new_size:
+            modified.append(path)
+        else:
+            unverified.append(path)  # 不同格式的备份签名不可比，只有大小相同
+
+    region_jobs = [p for p in added + removed + modified + unverified if anvil.region_coords(p)]
+    local = threading.local()
+    readers: List[BackupReader] = []
+    lock = threading.Lock()
+
+    def compare_region(path: str) -> Tuple[str, Dict]:
+        if not hasattr(local, "readers"):
+            local.readers = (open_old(), open_new())
+            with lock:
+                readers.extend(local.readers)
+        old, new = local.readers
+        region_x, region_z = anvil.region_coords(path)
+        empty = anvil.RegionHeader(region_x, region_z)
+        old_header = _region_header(old, path) if path in old_files else empty
+        new_header = _region_header(new, path) if path in new_files else empty
+        return path, anvil.diff_region_headers(old_header, new_header)
+
+    regions = {}
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for path, changes in executor.map(compare_region, region_jobs):
+                if changes["added"] or changes["removed"] or changes["modified"]:
+                    regions[path] = changes
+    finally:
+        for reader in readers:
+            reader.close()
+
+    # 区块都没变的区域文件（例如只改动了未使用的扇区）不算作修改
+    region_files = set(region_jobs)
+    unverified = [p for p in unverified if p not in region_files or p in regions]
+    modified = [p for p in modified if p not in region_files or p in regions]
+
+    return {
+        "files": {"added": added, "removed": removed, "modified": modified, "unverified": unverified},
+        "regions": regions,
+        "summary": {
+            "files_added": len(added),
+            "files_removed": len(removed),
+            "files_modified": len(modified),
+            "regions_changed": len(regions),
+            "chunks_added": sum(len(r["added"]) for r in regions.values()),
+            "chunks_removed": sum(len(r["removed"]) for r in regions.values()),
+            "chunks_modified": sum(len(r["modified"]) for r in regions.values())
+        }
+    }
+
+
+def format_diff_report(report: Dict, max_chunks: int = 20) -> str:
+    """把差异报告格式化为文本"""
+    summary = report["summary"]
+    lines = [
+        f"备份差异: {report.get('old_backup', '')} → {report.get('new_backup', '')}",
+        f"文件: 新增 {summary['files_added']}, 删除 {summary['files_removed']}, 修改 {summary['files_modified']}",
+        f"区块: 新增 {summary['chunks_added']}, 删除 {summary['chunks_removed']}, "
+        f"修改 {summary['chunks_modified']}（{summary['regions_changed']} 个区域文件）",
+        ""
+    ]
+    for kind, label in (("added", "新增"), ("removed", "删除"), ("modified", "修改")):
+        for path in report["files"][kind]:
+            if path not in report["regions"]:
+                lines.append(f"  [{label}] {path}")
+    for path in report["files"]["unverified"]:
+        if path not in report["regions"]:
+            lines.append(f"  [可能修改] {path}")
+    for path, changes in sorted(report["regions"].items()):
+        lines.append(f"  [区域] {path}: 新增 {len(changes['added'])}, 删除 {len(changes['removed'])}, "
+                     f"修改 {len(changes['modified'])}")
+        chunks = [("+", c) for c in changes["added"]] + [("-", c) for c in changes["removed"]] + \
+                 [("*", c) for c in changes["modified"]]
+        for mark, chunk in chunks[:max_chunks]:
+            lines.append(f"      {mark} 区块 ({chunk[0]}, {chunk[1]})")
+        if len(chunks) > max_chunks:
+            lines.append(f"      ... 另有 {len(chunks) - max_chunks} 个区块")
+    return "\n".join(lines)
@@ -7,12 +7,32 @@
 import os
 import json
 import shutil
+import fnmatch
 import zipfile
 import datetime
 import threading
 import time
-from typing import List, Dict, Optional
-from dataclasses import dataclass
+from typing import List, Dict, Optional, Iterator, Tuple
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
+
+from chunk_store import ChunkStore
+from parallel_archive import (INTERNAL_NAMES, CompressionPolicy, train_dictionary, ParallelZipWriter, extract_archive,
+                              verify_archive)
+from io_throttle import TokenBucket, AdaptiveThrottle, lower_current_priority
+from backup_catalog import BackupCatalog
+from backup_scheduler import BackupScheduler
+from retention import RetentionPolicy, PruneCostModel, plan_prune
+from snapshot import SnapshotBackend
+from object_storage import ObjectStorage, ObjectStorageConfig, ObjectStorageError
+import incremental_backup
+import seekable_archive
+import backup_diff
+
+
+# 备份时跳过的目录与文件
+SKIP_DIRECTORIES = ['logs', 'cache', '.git']
+SKIP_FILE_SUFFIXES = ('.log', '.log.gz', '.tmp')
 
 
 @dataclass
@@ -26,6 +46,14 @@ class BackupInfo:
     backup_path: str
     backup_type: str  # "manual", "auto", "scheduled"
     description: str = ""
+    backup_format: str = "zip"  # "zip", "dedup", "incremental", "tarzst"
+    parent_id: str = ""  # 增量备份的父备份
+    verify_status: str = ""  # "", "ok", "failed"
+    verified_time: str = ""
+    verify_error: str = ""
+    metrics: Dict = field(default_factory=dict)  # 耗时、读取速率、备份期间的MSPT
+    retention_class: str = ""  # 计划备份的保留类别："hourly", "daily", "weekly", "monthly"
+    remote_key: str = ""  # 已卸载到对象存储时的对象键（本地文件可能已删除）
     
     def to_dict(self) -> Dict:
         return {
@@ -36,7 +64,15 @@ class BackupInfo:
             "backup_size": self.backup_size,
             "backup_path": self.backup_path,
             "backup_type": self.backup_type,
-            "description": self.description
+            "description": self.description,
+            "backup_format": self.backup_format,
+            "parent_id": self.parent_id,
+            "verify_status": self.verify_status,
+            "verified_time": self.verified_time,
+            "verify_error": self.verify_error,
+            "metrics": self.metrics,
+            "retention_class": self.retention_class,
+            "remote_key": self.remote_key
         }
     
     @classmethod
@@ -49,63 +85,154 @@ class BackupManager:
     
     def __init__(self, backup_dir: str = "backups"):
         self.backup_dir = backup_dir
-        self.backups_file = os.path.join(backup_dir, "backups.json")
-        self.backups: List[BackupInfo] = []
+        self.backups_file = os.path.join(backup_dir, "backups.json")  # 旧版备份列表，首次启动时迁移
+        self.catalog_file = os.path.join(backup_dir, "catalog.db")
         self.auto_backup_enabled = False
         self.auto_backup_interval = 3600  # 1小时
-        self.auto_backup_thread = None
         self.max_backups_per_server = 10
+        self.retention_file = os.path.join(backup_dir, "retention.json")
+        self.retention_policies: Dict[str, RetentionPolicy] = {}  # 服务器ID -> GFS保留策略
+        self.scheduler = None
+        self.object_storage_file = os.path.join(backup_dir, "object_storage.json")
+        self.object_storage: Optional[ObjectStorage] = None
+        self.default_backup_format = "zip"
+        self.max_incremental_chain = 24  # 增量链达到该长度后重新做完整备份
+        self.scan_workers = 8
+        self.compression_workers = os.cpu_count() or 1
+        self.compression_policy = CompressionPolicy()  # 区块文件等已压缩数据直接存储
+        self.tarzst_level = 3  # tar+zstd 格式的压缩级别
+        self.use_compression_dictionary = True  # ZIP备份中的小JSON/文本文件用每个服务器训练的zstd字典压缩
+        self.dictionary_dir = os.path.join(backup_dir, "dictionaries")
+        self.dictionary_refresh_interval = 7 * 86400  # 字典每周重新训练一次
+        self.incremental_state_dir = os.path.join(backup_dir, "incremental")
+        self.snapshot_dir = os.path.join(backup_dir, "snapshots")
+        self.snapshot_backend = SnapshotBackend()
+        self.keep_snapshots = 1  # 每个服务器保留的最新快照，作为下次硬链接的基准
+        self.save_timeout = 60  # 等待 save-all flush 完成的秒数
+        self._compression_executor: Optional[ThreadPoolExecutor] = None
+        self.restore_workers = min(8, os.cpu_count() or 1)
+        self.io_rate_limit = 100 * 1024 * 1024  # 在线备份的最大读取速率（字节/秒），0 表示不限速
+        self.io_min_rate = 4 * 1024 * 1024  # 自适应限速的下限
+        self.target_mspt = 40.0  # 备份期间MSPT超过该值时降速
+        self.backup_nice = 10
+        self.backup_io_class = "low"  # "low" 或 "idle"
+        self.verify_interval = 86400  # 每天校验一次所有备份
+        self.verify_workers = 2
+        self.verify_bytes_per_second = 50 * 1024 * 1024  # 后台校验的读取限速
+        self.verify_thread = None
+        self._verify_stop = threading.Event()
+        self._snapshot_lock = threading.Lock()
+        self._pending_snapshots = set()  # 尚未压缩完成的快照不能清理
+        self._chunk_store: Optional[ChunkStore] = None
+        self._manifest_cache: Dict[str, Dict] = {}
         
         # 创建备份目录
         os.makedirs(backup_dir, exist_ok=True)
         self.load_backups()
+        self.load_retention_policies()
+        self.load_object_storage()
     
-    def load_backups(self):
-        """加载备份列表"""
-        if os.path.exists(self.backups_file):
-            try:
-                with open(self.backups_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    self.backups = [BackupInfo.from_dict(b) for b in data]
-            except Exception as e:
-                print(f"加载备份列表失败: {e}")
-                self.backups = []
+    @property
+    def chunk_store(self) -> ChunkStore:
+        """去重块存储（所有服务器共享）"""
+        if self._chunk_store is None:
+            self._chunk_store = ChunkStore(os.path.join(self.backup_dir, "store"))
+        return self._chunk_store
     
-    def save_backups(self):
-        """保存备份列表"""
+    def load_backups(self):
+        """打开备份目录，并迁移旧版 backups.json"""
+        self.catalog = BackupCatalog(self.catalog_file, BackupInfo.from_dict)
         try:
-            with open(self.backups_file, 'w', encoding='utf-8') as f:
-                data = [b.to_dict() for b in self.backups]
-                json.dump(data, f, indent=4, ensure_ascii=False)
+            migrated = self.catalog.migrate_from_json(self.backups_file)
+            if migrated:
+                print(f"已把 {migrated} 条备份记录迁移到备份目录")
         except Exception as e:
-            print(f"保存备份列表失败: {e}")
+            print(f"迁移备份列表失败: {e}")
+    
+    @property
+    def backups(self) -> List[BackupInfo]:
+        """所有备份记录（按时间从旧到新）"""
+        return self.catalog.find(newest_first=False)
+    
+    @staticmethod
+    def iter_backup_files(server_directory: str) -> Iterator[Tuple[str, str]]:
+        """遍历需要备份的文件，返回 (文件路径, 归档内路径)"""
+        for root, dirs, files in os.walk(server_directory):
+            # 跳过日志文件和缓存文件
+            dirs[:] = [d for d in dirs if d not in SKIP_DIRECTORIES]
+            
+            for file in files:
+                if file.endswith(SKIP_FILE_SUFFIXES):
+                    continue
+                
+                file_path = os.path.join(root, file)
+                yield file_path, os.path.relpath(file_path, server_directory)
     
     def create_backup(self, server_id: str, server_name: str, server_directory: str, 
-                     backup_type: str = "manual", description: str = "") -> Optional[BackupInfo]:
-        """创建备份"""
+                     backup_type: str = "manual", description: str = "",
+                     backup_format: str = None, throttle: Optional[TokenBucket] = None,
+                     retention_class: str = "") -> Optional[BackupInfo]:
+        """创建备份
+        
+        throttle 为读取限速器；压缩工作进程总是以较低的CPU/I/O优先级运行。
+        """
+        backup_format = backup_format or self.default_backup_format
+        started_at = time.time()
         try:
             # 生成备份ID和文件名
             timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
             backup_id = f"{server_id}_{timestamp}"
-            backup_filename = f"{server_name}_{timestamp}.zip"
-            backup_path = os.path.join(self.backup_dir, backup_filename)
             
-            # 创建ZIP备份
-            with zipfile.ZipFile(backup_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                for root, dirs, files in os.walk(server_directory):
-                    # 跳过日志文件和缓存文件
-                    dirs[:] = [d for d in dirs if d not in ['logs', 'cache', '.git']]
-                    
-                    for file in files:
-                        if file.endswith(('.log', '.log.gz', '.tmp')):
-                            continue
-                        
-                        file_path = os.path.join(root, file)
-                        arc_path = os.path.relpath(file_path, server_directory)
-                        zipf.write(file_path, arc_path)
+            parent_id = ""
+            if backup_format == "incremental":
+                backup_path = os.path.join(self.backup_dir, f"{server_name}_{timestamp}.inc.zip")
+                previous = self._load_incremental_state(server_id)
+                manifest = incremental_backup.create_incremental_archive(
+                    server_directory, backup_path, backup_id, previous,
+                    parent_id=previous["backup_id"] if previous else "",
+                    skip_dirs=SKIP_DIRECTORIES, skip_suffixes=SKIP_FILE_SUFFIXES,
+                    max_workers=self.scan_workers, throttle=throttle
+                )
+                parent_id = manifest["parent_id"]
+                self._save_incremental_state(server_id, manifest)
+                backup_size = os.path.getsize(backup_path)
+            elif backup_format == "dedup":
+                backup_path = self.chunk_store.manifest_path(backup_id)
+                _, backup_size = self.chunk_store.store_files(
+                    backup_id,
+                    self.iter_backup_files(server_directory),
+                    {"server_id": server_id, "server_name": server_name},
+                    throttle
+                )
+            elif backup_format == "tarzst":
+                backup_path = os.path.join(self.backup_dir, f"{server_name}_{timestamp}{seekable_archive.ARCHIVE_SUFFIX}")
+                
+                # tar流按帧并行压缩，末尾带索引，可只解压单个文件
+                with seekable_archive.SeekableTarWriter(backup_path, self.tarzst_level, self.compression_workers,
+                                                        throttle=throttle,
+                                                        priority=(self.backup_nice, self.backup_io_class)) as writer:
+                    writer.write_files(self.iter_backup_files(server_directory))
+                backup_size = os.path.getsize(backup_path)
+            else:
+                backup_filename = f"{server_name}_{timestamp}.zip"
+                backup_path = os.path.join(self.backup_dir, backup_filename)
+                
+                dictionary = None
+                if self.use_compression_dictionary:
+                    dictionary = self.get_compression_dictionary(server_id, server_directory)
+                
+                # 创建ZIP备份（多进程并行压缩）
+                with ParallelZipWriter(backup_path, self.compression_policy, self.compression_workers,
+                                       throttle=throttle,
+                                       priority=(self.backup_nice, self.backup_io_class),
+                                       dictionary=dictionary) as writer:
+                    writer.write_files(self.iter_backup_files(server_directory))
+                
+                # 获取备份大小
+                backup_size = os.path.getsize(backup_path)
             
-            # 获取备份大小
-            backup_size = os.path.getsize(backup_path)
+            metrics = throttle.metrics() if isinstance(throttle, AdaptiveThrottle) else {}
+            metrics["duration_seconds"] = round(time.time() - started_at, 2)
             
             # 创建备份信息
             backup_info = BackupInfo(
@@ -116,12 +243,15 @@ class BackupManager:
                 backup_size=backup_size,
                 backup_path=backup_path,
                 backup_type=backup_type,
-                description=description
+                description=description,
+                backup_format=backup_format,
+                parent_id=parent_id,
+                metrics=metrics,
+                retention_class=retention_class
             )
             
-            # 添加到备份列表
-            self.backups.append(backup_info)
-            self.save_backups()
+            # 添加到备份目录
+            self.catalog.upsert(backup_info)
             
             # 清理旧备份
             self.cleanup_old_backups(server_id)
@@ -132,10 +262,207 @@ class BackupManager:
             print(f"创建备份失败: {e}")
             return None
     
+    def get_compression_dictionary(self, server_id: str, server_directory: str) -> Optional[bytes]:
+        """获取服务器的zstd小文件字典，不存在或过期时从当前小文件重新训练
+        
+        每个ZIP备份都会带一份所用的字典，重新训练不影响旧备份的还原。
+        """
+        dictionary_file = os.path.join(self.dictionary_dir, f"{server_id}.zdict")
+        current = None
+        if os.path.exists(dictionary_file):
+            with open(dictionary_file, 'rb') as f:
+                current = f.read()
+            if time.time() - os.path.getmtime(dictionary_file) < self.dictionary_refresh_interval:
+                return current
+        
+        samples = []
+        for file_path, arc_path in self.iter_backup_files(server_directory):
+            try:
+                size = os.path.getsize(file_path)
+            except OSError:
+                continue
+            if self.compression_policy.uses_dictionary(arc_path, size):
+                samples.append(file_path)
+        
+        dictionary = train_dictionary(samples)
+        if dictionary is None:
+            return current
+        try:
+            os.makedirs(self.dictionary_dir, exist_ok=True)
+            temp_file = dictionary_file + ".tmp"
+            with open(temp_file, 'wb') as f:
+                f.write(dictionary)
+            os.replace(temp_file, dictionary_file)
+        except OSError as e:
+            print(f"保存压缩字典失败: {e}")
+        return dictionary
+    
+    def create_hot_backup(self, server, backup_type: str = "manual", description: str = "",
+                          backup_format: str = None, background: bool = False, retention_class: str = ""):
+        """在线备份运行中的服务器
+        
+        save-off → save-all flush → 等待保存完成 → 写时复制快照 → save-on，
+        自动保存只在快照期间暂停，压缩在恢复自动保存之后从快照进行。
+        background 为 True 时压缩在后台线程执行，返回 Future。
+        """
+        if not server.is_running():
+            return self.create_backup(server.server_id, server.name, server.directory,
+                                      backup_type, description, backup_format, retention_class=retention_class)
+        
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        snapshot_path = os.path.join(self.snapshot_dir, server.server_id, timestamp)
+        try:
+            with self._snapshot_lock:
+                previous = self._latest_snapshot(server.server_id)
+                paused_at = time.time()
+                with server.saves_paused(self.save_timeout):
+                    stats = self.snapshot_directory(server.directory, snapshot_path, previous)
+                self._pending_snapshots.add(snapshot_path)
+            print(f"服务器 {server.name} 自动保存暂停了 {time.time() - paused_at:.1f} 秒 "
+                  f"(reflink {stats.reflinked}, 硬链接 {stats.linked}, 复制 {stats.copied})")
+        except Exception as e:
+            print(f"在线备份失败: {e}")
+            shutil.rmtree(snapshot_path, ignore_errors=True)
+            return None
+        
+        args = (server, snapshot_path, backup_type, description, backup_format, retention_class)
+        if background:
+            if self._compression_executor is None:
+                self._compression_executor = ThreadPoolExecutor(
+                    max_workers=1, initializer=lower_current_priority,
+                    initargs=(self.backup_nice, self.backup_io_class))
+            return self._compression_executor.submit(self._backup_from_snapshot, *args)
+        return self._backup_from_snapshot(*args)
+    
+    def snapshot_directory(self, server_directory: str, snapshot_path: str, previous: Optional[str] = None):
+        """把服务器目录快照到 snapshot_path（保留修改时间，增量备份依赖它判断变化）"""
+        files = ((file_path, arc_path) for file_path, arc_path in self.iter_backup_files(server_directory)
+                 if os.path.basename(file_path) != "session.lock")
+        return self.snapshot_backend.snapshot(server_directory, files, snapshot_path, previous)
+    
+    def _latest_snapshot(self, server_id: str) -> Optional[str]:
+        """服务器最新的快照目录"""
+        server_snapshots = os.path.join(self.snapshot_dir, server_id)
+        if not os.path.isdir(server_snapshots):
+            return None
+        names = sorted(n for n in os.listdir(server_snapshots) if not n.endswith(".tmp"))
+        return os.path.join(server_snapshots, names[-1]) if names else None
+    
+    def _backup_from_snapshot(self, server, snapshot_path: str, backup_type: str, description: str,
+                              backup_format: str, retention_class: str = "") -> Optional[BackupInfo]:
+        """从快照压缩出长期备份（按实例MSPT自适应限速），并清理多余的旧快照"""
+        throttle = None
+        if self.io_rate_limit > 0:
+            throttle = AdaptiveThrottle(server, self.io_rate_limit, self.io_min_rate, self.target_mspt)
+            throttle.start()
+        try:
+            backup_info = self.create_backup(server.server_id, server.name, snapshot_path, backup_type,
+                                             description, backup_format, throttle, retention_class)
+            if backup_info:
+                metrics = backup_info.metrics
+                print(f"服务器 {server.name} 备份耗时 {metrics['duration_seconds']} 秒，"
+                      f"MSPT {metrics.get('mspt_baseline', 0)} → {metrics.get('mspt_average', 0)} ms")
+            return backup_info
+        finally:
+            if throttle:
+                throttle.stop()
+            with self._snapshot_lock:
+                self._pending_snapshots.discard(snapshot_path)
+            self._prune_snapshots(server.server_id)
+    
+    def _prune_snapshots(self, server_id: str):
+        """只保留最新的 keep_snapshots 个快照"""
+        with self._snapshot_lock:
+            server_snapshots = os.path.join(self.snapshot_dir, server_id)
+            if not os.path.isdir(server_snapshots):
+                return
+            names = sorted(os.listdir(server_snapshots))
+            for name in names[:-self.keep_snapshots] if self.keep_snapshots > 0 else names:
+                path = os.path.join(server_snapshots, name)
+                if path not in self._pending_snapshots:
+                    shutil.rmtree(path, ignore_errors=True)
+    
+    def _incremental_state_file(self, server_id: str) -> str:
+        return os.path.join(self.incremental_state_dir, f"{server_id}.json")
+    
+    def _load_incremental_state(self, server_id: str) -> Optional[Dict]:
+        """加载服务器最近一次增量备份的清单，父备份已不存在或链过长时返回None（做完整备份）"""
+        state_file = self._incremental_state_file(server_id)
+        if not os.path.exists(state_file):
+            return None
+        try:
+            with open(state_file, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except Exception as e:
+            print(f"加载增量备份状态失败: {e}")
+            return None
+        
+        if manifest.get("chain_length", 0) + 1 >= self.max_incremental_chain:
+            return None
+        # 链上所有归档都必须仍然存在（本地或对象存储中）
+        for backup_id in incremental_backup.referenced_backups(manifest):
+            backup = self.get_backup_by_id(backup_id)
+            if not backup or not (os.path.exists(backup.backup_path) or backup.remote_key):
+                return None
+        return manifest
+    
+    def _save_incremental_state(self, server_id: str, manifest: Dict):
+        """保存服务器最近一次增量备份的清单"""
+        os.makedirs(self.incremental_state_dir, exist_ok=True)
+        state_file = self._incremental_state_file(server_id)
+        temp_file = state_file + ".tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(temp_file, state_file)
+        self._manifest_cache[manifest["backup_id"]] = manifest
+    
+    def get_incremental_manifest(self, backup_info: BackupInfo) -> Optional[Dict]:
+        """读取增量备份的清单（带缓存）"""
+        manifest = self._manifest_cache.get(backup_info.backup_id)
+        if manifest is None and not os.path.exists(backup_info.backup_path):
+            # 已卸载的归档：使用卸载时保存的清单副本
+            manifest_file = self._offloaded_manifest_file(backup_info.backup_id)
+            if os.path.exists(manifest_file):
+                with open(manifest_file, 'r', encoding='utf-8') as f:
+                    manifest = json.load(f)
+                self._manifest_cache[backup_info.backup_id] = manifest
+        if manifest is None:
+            manifest = incremental_backup.load_archive_manifest(backup_info.backup_path)
+            if manifest is not None:
+                self._manifest_cache[backup_info.backup_id] = manifest
+        return manifest
+    
+    def _restore_paths(self, backup_info: BackupInfo, target_directory: str,
+                       paths: Optional[List[str]] = None) -> bool:
+        """按备份格式多线程还原（全部或 paths 指定的文件），写入时逐文件校验"""
+        if backup_info.backup_format == "dedup":
+            return self.chunk_store.restore(backup_info.backup_id, target_directory, paths, self.restore_workers)
+        
+        if backup_info.backup_format == "incremental":
+            # 增量链可以还原任意时间点
+            manifest = self.get_incremental_manifest(backup_info)
+            if manifest is None:
+                return False
+            chain = {b.backup_id: b for b in self.get_backups_by_server(backup_info.server_id)}
+            for backup_id in incremental_backup.referenced_backups(manifest):
+                if backup_id in chain and not self._ensure_local(chain[backup_id]):
+                    return False
+            archive_paths = {backup_id: b.backup_path for backup_id, b in chain.items()}
+            incremental_backup.restore_incremental(manifest, archive_paths, target_directory, paths,
+                                                   self.restore_workers)
+            return True
+        
+        if backup_info.backup_format == "tarzst":
+            seekable_archive.extract_seekable(backup_info.backup_path, target_directory, paths, self.restore_workers)
+            return True
+        
+        extract_archive(backup_info.backup_path, target_directory, paths, self.restore_workers)
+        return True
+    
     def restore_backup(self, backup_id: str, target_directory: str) -> bool:
         """恢复备份"""
         backup_info = self.get_backup_by_id(backup_id)
-        if not backup_info or not os.path.exists(backup_info.backup_path):
+        if not backup_info or not self._ensure_local(backup_info):
             return False
         
         try:
@@ -145,131 +472,457 @@ class BackupManager:
             os.makedirs(target_directory, exist_ok=True)
             
             # 解压备份
-            with zipfile.ZipFile(backup_info.backup_path, 'r') as zipf:
-                zipf.extractall(target_directory)
-            
-            return True
+            return self._restore_paths(backup_info, target_directory)
             
         except Exception as e:
             print(f"恢复备份失败: {e}")
             return False
     
+    def list_backup_files(self, backup_id: str) -> List[str]:
+        """列出备份中的文件（归档内路径，"/" 分隔），只读取归档的中央目录或清单"""
+        backup_info = self.get_backup_by_id(backup_id)
+        if not backup_info or not self._ensure_local(backup_info):
+            return []
+        
+        try:
+            if backup_info.backup_format == "dedup":
+                manifest = self.chunk_store.load_manifest(backup_id) or {"files": []}
+                return [entry["path"] for entry in manifest["files"]]
+            if backup_info.backup_format == "incremental":
+                manifest = self.get_incremental_manifest(backup_info) or {"files": {}}
+                return sorted(manifest["files"])
+            if backup_info.backup_format == "tarzst":
+                return seekable_archive.list_files(backup_info.backup_path)
+            with zipfile.ZipFile(backup_info.backup_path, 'r') as zipf:
+                return [info.filename for info in zipf.infolist()
+                        if not info.is_dir() and info.filename not in INTERNAL_NAMES]
+        except Exception as e:
+            print(f"读取备份文件列表失败: {e}")
+            return []
+    
+    @staticmethod
+    def match_backup_paths(paths: List[str], patterns: List[str]) -> List[str]:
+        """按通配符筛选归档内路径，模式也可以是目录（如 world_nether/DIM-1）"""
+        patterns = [p.replace('\\', '/').strip('/') for p in patterns]
+        matched = []
+        for path in paths:
+            for pattern in patterns:
+                if fnmatch.fnmatchcase(path, pattern) or path.startswith(pattern + '/'):
+                    matched.append(path)
+                    break
+        return matched
+    
+    def restore_files(self, backup_id: str, patterns: List[str], target_directory: str) -> List[str]:
+        """选择性还原：只还原匹配的文件（区块文件、玩家数据、维度目录等）
+        
+        不清空目标目录，只替换匹配到的文件；target_directory 可以是服务器目录，也可以是旁路目录。
+        返回还原的文件列表。
+        """
+        backup_info = self.get_backup_by_id(backup_id)
+        if not backup_info or not self._ensure_local(backup_info):
+            return []
+        
+        matched = self.match_backup_paths(self.list_backup_files(backup_id), patterns)
+        if not matched:
+            print("没有匹配的备份文件")
+            return []
+        
+        try:
+            os.makedirs(target_directory, exist_ok=True)
+            if not self._restore_paths(backup_info, target_directory, matched):
+                return []
+            return matched
+        except Exception as e:
+            print(f"选择性还原失败: {e}")
+            return []
+    
+    def _open_backup_reader(self, backup_info: BackupInfo) -> backup_diff.BackupReader:
+        manifest, archive_paths = None, None
+        if backup_info.backup_format == "dedup":
+            manifest = self.chunk_store.load_manifest(backup_info.backup_id)
+        elif backup_info.backup_format == "incremental":
+            manifest = self.get_incremental_manifest(backup_info)
+            archive_paths = {b.backup_id: b.backup_path for b in self.get_backups_by_server(backup_info.server_id)}
+        return backup_diff.BackupReader(backup_info.backup_format, backup_info.backup_path, self.chunk_store,
+                                        manifest, archive_paths)
+    
+    def _ensure_chain_local(self, backup_info: BackupInfo) -> bool:
+        """确保备份（增量备份包括它引用的整个链）在本地"""
+        if not self._ensure_local(backup_info):
+            return False
+        if backup_info.backup_format == "incremental":
+            manifest = self.get_incremental_manifest(backup_info)
+            if manifest is None:
+                return False
+            for backup_id in incremental_backup.referenced_backups(manifest):
+                referenced = self.get_backup_by_id(backup_id)
+                if not referenced or not self._ensure_local(referenced):
+                    return False
+        return True
+    
+    def diff_backups(self, old_backup_id: str, new_backup_id: str) -> Optional[Dict]:
+        """比较两个备份（只读清单和区域文件头，不解压文件主体），返回变化的文件和区块"""
+        old_info = self.get_backup_by_id(old_backup_id)
+        new_info = self.get_backup_by_id(new_backup_id)
+        if not old_info or not new_info:
+            return None
+        if not self._ensure_chain_local(old_info) or not self._ensure_chain_local(new_info):
+            return None
+        
+        old_reader = self._open_backup_reader(old_info)
+        new_reader = self._open_backup_reader(new_info)
+        try:
+            report = backup_diff.diff_backups(old_reader, new_reader,
+                                              lambda: self._open_backup_reader(old_info),
+                                              lambda: self._open_backup_reader(new_info),
+                                              self.restore_workers)
+        except Exception as e:
+            print(f"比较备份失败: {e}")
+            return None
+        finally:
+            old_reader.close()
+            new_reader.close()
+        
+        report["old_backup"] = old_backup_id
+        report["new_backup"] = new_backup_id
+        return report
+    
     def delete_backup(self, backup_id: str) -> bool:
         """删除备份"""
+        return self.delete_backups([backup_id]) == 1
+    
+    def delete_backups(self, backup_ids: List[str]) -> int:
+        """批量删除备份，目录在一个事务中更新，返回删除数量"""
+        targets = [b for b in (self.get_backup_by_id(i) for i in backup_ids) if b]
+        targets = self._exclude_referenced_incrementals(targets)
+        if not targets:
+            return 0
+        
+        deleted = set()
+        try:
+            # 去重备份统一释放引用，一次回收无引用的块
+            dedup_ids = [b.backup_id for b in targets if b.backup_format == "dedup"]
+            if dedup_ids:
+                self.chunk_store.release(dedup_ids)
+                deleted.update(dedup_ids)
+            
+            # 删除备份文件
+            for backup_info in targets:
+                if backup_info.backup_format == "dedup":
+                    continue
+                if os.path.exists(backup_info.backup_path):
+                    os.remove(backup_info.backup_path)
+                if backup_info.remote_key and self.object_storage:
+                    self.object_storage.delete(backup_info.remote_key)
+                    manifest_file = self._offloaded_manifest_file(backup_info.backup_id)
+                    if os.path.exists(manifest_file):
+                        os.remove(manifest_file)
+                self._manifest_cache.pop(backup_info.backup_id, None)
+                deleted.add(backup_info.backup_id)
+        except Exception as e:
+            print(f"删除备份失败: {e}")
+        
+        # 从目录中移除（一个事务）
+        if deleted:
+            self.catalog.delete_many(deleted)
+        return len(deleted)
+    
+    def _exclude_referenced_incrementals(self, targets: List[BackupInfo]) -> List[BackupInfo]:
+        """排除仍被保留的增量备份引用的归档（删除它们会破坏增量链）"""
+        if not any(b.backup_format == "incremental" for b in targets):
+            return targets
+        
+        target_ids = {b.backup_id for b in targets}
+        referenced = set()
+        candidates = []
+        for server_id in {b.server_id for b in targets}:
+            candidates.extend(self.catalog.find(server_id=server_id, backup_format="incremental"))
+        for backup in candidates:
+            if backup.backup_id in target_ids:
+                continue
+            manifest = self.get_incremental_manifest(backup)
+            if manifest:
+                referenced |= incremental_backup.referenced_backups(manifest)
+        
+        kept = [b for b in targets if b.backup_id in referenced]
+        for backup in kept:
+            print(f"备份 {backup.backup_id} 仍被增量链引用，暂不删除")
+        return [b for b in targets if b.backup_id not in referenced]
+    
+    def load_object_storage(self):
+        """加载对象存储配置"""
+        if os.path.exists(self.object_storage_file):
+            try:
+                with open(self.object_storage_file, 'r', encoding='utf-8') as f:
+                    config = ObjectStorageConfig.from_dict(json.load(f))
+                self.object_storage = ObjectStorage(config, os.path.join(self.backup_dir, "uploads"))
+            except Exception as e:
+                print(f"加载对象存储配置失败: {e}")
+                self.object_storage = None
+    
+    def configure_object_storage(self, config: Optional[ObjectStorageConfig]):
+        """设置（或用 None 取消）S3兼容的对象存储"""
+        try:
+            if config is None:
+                if os.path.exists(self.object_storage_file):
+                    os.remove(self.object_storage_file)
+                self.object_storage = None
+                return
+            temp_file = self.object_storage_file + ".tmp"
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(config.to_dict(), f, indent=4, ensure_ascii=False)
+            os.replace(temp_file, self.object_storage_file)
+            self.object_storage = ObjectStorage(config, os.path.join(self.backup_dir, "uploads"))
+        except Exception as e:
+            print(f"保存对象存储配置失败: {e}")
+    
+    def offload_backup(self, backup_id: str, keep_local: bool = False) -> bool:
+        """把备份文件上传到对象存储（并行分片，中断后再次调用会续传），默认上传后删除本地文件"""
         backup_info = self.get_backup_by_id(backup_id)
         if not backup_info:
             return False
+        if self.object_storage is None:
+            print("未配置对象存储")
+            return False
+        if backup_info.backup_format == "dedup":
+            print("去重备份的块由所有备份共享，不能单独卸载")
+            return False
         
         try:
-            # 删除备份文件
-            if os.path.exists(backup_info.backup_path):
-                os.remove(backup_info.backup_path)
-            
-            # 从列表中移除
-            self.backups = [b for b in self.backups if b.backup_id != backup_id]
-            self.save_backups()
+            if not backup_info.remote_key:
+                if not os.path.exists(backup_info.backup_path):
+                    print("备份文件不存在")
+                    return False
+                name = f"{backup_info.server_id}/{os.path.basename(backup_info.backup_path)}"
+                backup_info.remote_key = self.object_storage.upload_file(backup_info.backup_path, name)
+                self.catalog.upsert(backup_info)
             
+            if not keep_local and os.path.exists(backup_info.backup_path):
+                ok, error = self._check_remote(backup_info)
+                if not ok:
+                    print(f"远程备份检查失败，保留本地文件: {error}")
+                    return False
+                if backup_info.backup_format == "incremental":
+                    # 保留清单副本，清理和增量链检查不需要下载归档
+                    manifest = self.get_incremental_manifest(backup_info)
+                    if manifest is None:
+                        print("无法读取增量清单，保留本地文件")
+                        return False
+                    manifest_file = self._offloaded_manifest_file(backup_id)
+                    os.makedirs(os.path.dirname(manifest_file), exist_ok=True)
+                    with open(manifest_file + ".tmp", 'w', encoding='utf-8') as f:
+                        json.dump(manifest, f, ensure_ascii=False)
+                    os.replace(manifest_file + ".tmp", manifest_file)
+                os.remove(backup_info.backup_path)
             return True
-            
-        except Exception as e:
-            print(f"删除备份失败: {e}")
+        except (ObjectStorageError, OSError) as e:
+            print(f"上传备份失败: {e}")
+            return False
+    
+    def _offloaded_manifest_file(self, backup_id: str) -> str:
+        return os.path.join(self.incremental_state_dir, "offloaded", f"{backup_id}.json")
+    
+    def _ensure_local(self, backup_info: BackupInfo) -> bool:
+        """确保备份文件在本地，只在对象存储中时并行下载回原路径"""
+        if os.path.exists(backup_info.backup_path):
+            return True
+        if not backup_info.remote_key or self.object_storage is None:
+            return False
+        try:
+            print(f"正在从对象存储下载备份 {backup_info.backup_id}")
+            self.object_storage.download_file(backup_info.remote_key, backup_info.backup_path)
+            return True
+        except (ObjectStorageError, OSError) as e:
+            print(f"下载备份失败: {e}")
             return False
     
+    def evict_local_copy(self, backup_id: str) -> bool:
+        """删除已卸载备份的本地副本（例如还原时下载的文件）"""
+        backup_info = self.get_backup_by_id(backup_id)
+        if not backup_info or not backup_info.remote_key:
+            return False
+        if os.path.exists(backup_info.backup_path):
+            os.remove(backup_info.backup_path)
+        return True
+    
     def get_backup_by_id(self, backup_id: str) -> Optional[BackupInfo]:
         """根据ID获取备份信息"""
-        for backup in self.backups:
-            if backup.backup_id == backup_id:
-                return backup
-        return None
+        return self.catalog.get(backup_id)
     
     def get_backups_by_server(self, server_id: str) -> List[BackupInfo]:
         """获取指定服务器的所有备份"""
-        return [b for b in self.backups if b.server_id == server_id]
+        return self.catalog.find(server_id=server_id)
     
     def get_all_backups(self) -> List[BackupInfo]:
         """获取所有备份"""
-        return sorted(self.backups, key=lambda x: x.backup_time, reverse=True)
+        return self.catalog.find()
     
-    def cleanup_old_backups(self, server_id: str):
-        """清理旧备份"""
-        server_backups = self.get_backups_by_server(server_id)
-        server_backups.sort(key=lambda x: x.backup_time, reverse=True)
-        
-        # 保留最新的N个备份
-        if len(server_backups) > self.max_backups_per_server:
-            old_backups = server_backups[self.max_backups_per_server:]
-            for backup in old_backups:
-                self.delete_backup(backup.backup_id)
+    def load_retention_policies(self):
+        """加载各服务器的保留策略"""
+        if os.path.exists(self.retention_file):
+            try:
+                with open(self.retention_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                self.retention_policies = {k: RetentionPolicy.from_dict(v) for k, v in data.items()}
+            except Exception as e:
+                print(f"加载保留策略失败: {e}")
+                self.retention_policies = {}
+    
+    def set_retention_policy(self, server_id: str, policy: RetentionPolicy):
+        """设置服务器的保留策略"""
+        self.retention_policies[server_id] = policy
+        try:
+            with open(self.retention_file, 'w', encoding='utf-8') as f:
+                data = {k: v.to_dict() for k, v in self.retention_policies.items()}
+                json.dump(data, f, indent=4, ensure_ascii=False)
+        except Exception as e:
+            print(f"保存保留策略失败: {e}")
+    
+    def get_retention_policy(self, server_id: str) -> RetentionPolicy:
+        """获取服务器的保留策略，未设置时只保留最新 max_backups_per_server 个（与原来的数量上限一致）"""
+        policy = self.retention_policies.get(server_id)
+        if policy:
+            return policy
+        return RetentionPolicy(keep_last=self.max_backups_per_server, hourly=0, daily=0, weekly=0, monthly=0)
+    
+    def plan_cleanup(self, server_id: str) -> List[str]:
+        """按GFS策略和磁盘预算计算要删除的备份（不执行删除）"""
+        backups = self.catalog.find(server_id=server_id)
+        has_dedup = any(b.backup_format == "dedup" for b in backups)
+        cost_model = PruneCostModel(
+            backups,
+            self.chunk_store.refcounts_snapshot() if has_dedup else {},
+            self.chunk_store.backup_chunks,
+            self._incremental_references
+        )
+        return plan_prune(backups, self.get_retention_policy(server_id), cost_model)
+    
+    def _incremental_references(self, backup_info: BackupInfo) -> Optional[set]:
+        manifest = self.get_incremental_manifest(backup_info)
+        return incremental_backup.referenced_backups(manifest) if manifest else None
+    
+    def cleanup_old_backups(self, server_id: str) -> int:
+        """按保留策略清理旧备份，所有删除在一次批量操作中完成，返回删除数量"""
+        victims = self.plan_cleanup(server_id)
+        return self.delete_backups(victims) if victims else 0
     
     def get_backup_statistics(self) -> Dict:
         """获取备份统计信息"""
-        total_backups = len(self.backups)
-        total_size = sum(b.backup_size for b in self.backups)
-        
-        # 按服务器统计
-        server_stats = {}
-        for backup in self.backups:
-            if backup.server_id not in server_stats:
-                server_stats[backup.server_id] = {
-                    "count": 0,
-                    "size": 0,
-                    "latest": None
-                }
-            
-            server_stats[backup.server_id]["count"] += 1
-            server_stats[backup.server_id]["size"] += backup.backup_size
-            
-            if (server_stats[backup.server_id]["latest"] is None or 
-                backup.backup_time > server_stats[backup.server_id]["latest"]):
-                server_stats[backup.server_id]["latest"] = backup.backup_time
+        server_stats = self.catalog.server_summary()
+        total_backups = sum(stats["count"] for stats in server_stats.values())
+        total_size = sum(stats["size"] for stats in server_stats.values())
         
-        return {
+        statistics = {
             "total_backups": total_backups,
             "total_size": total_size,
             "total_size_mb": round(total_size / 1024 / 1024, 2),
             "server_stats": server_stats
         }
+        
+        if self.catalog.has_format("dedup"):
+            statistics["dedup_store"] = self.chunk_store.get_statistics()
+        
+        return statistics
+    
+    def verify_backup(self, backup_id: str, throttle: Optional[TokenBucket] = None) -> bool:
+        """校验备份完整性并把结果记录到备份目录"""
+        backup_info = self.get_backup_by_id(backup_id)
+        if not backup_info:
+            return False
+        ok = self._check_backup(backup_info, throttle)
+        self.catalog.upsert(backup_info)
+        return ok
+    
+    def _check_backup(self, backup_info: BackupInfo, throttle: Optional[TokenBucket] = None) -> bool:
+        """校验备份并把结果写入 backup_info（不保存）"""
+        if not os.path.exists(backup_info.backup_path) and backup_info.remote_key:
+            ok, error = self._check_remote(backup_info)
+        elif not os.path.exists(backup_info.backup_path):
+            ok, error = False, "备份文件不存在"
+        elif backup_info.backup_format == "dedup":
+            ok, error = self.chunk_store.verify(backup_info.backup_id, throttle)
+        elif backup_info.backup_format == "incremental":
+            manifest = self.get_incremental_manifest(backup_info)
+            if manifest is None:
+                ok, error = False, "无法读取增量清单"
+            else:
+                ok, error = incremental_backup.verify_incremental_archive(manifest, backup_info.backup_path, throttle)
+        elif backup_info.backup_format == "tarzst":
+            ok, error = seekable_archive.verify_seekable(backup_info.backup_path, throttle)
+        else:
+            ok, error = verify_archive(backup_info.backup_path, throttle)
+        
+        backup_info.verify_status = "ok" if ok else "failed"
+        backup_info.verify_error = error
+        backup_info.verified_time = datetime.datetime.now().isoformat()
+        if not ok:
+            print(f"备份 {backup_info.backup_id} 校验失败: {error}")
+        return ok
+    
+    def _check_remote(self, backup_info: BackupInfo) -> Tuple[bool, str]:
+        """只在对象存储中的备份：检查对象存在且大小一致（不下载内容）"""
+        if self.object_storage is None:
+            return False, "未配置对象存储"
+        try:
+            size = self.object_storage.client.head_object(backup_info.remote_key)
+        except ObjectStorageError as e:
+            return False, str(e)
+        if size is None:
+            return False, "远程对象不存在"
+        if size != backup_info.backup_size:
+            return False, f"远程对象大小不符: {size} != {backup_info.backup_size}"
+        return True, ""
+    
+    def verify_all_backups(self) -> Dict[str, bool]:
+        """并行校验所有备份（共享一个限速器），结果一次写入目录，返回 {备份ID: 是否完好}"""
+        throttle = TokenBucket(self.verify_bytes_per_second)
+        backups = self.catalog.find()
+        with ThreadPoolExecutor(max_workers=self.verify_workers) as executor:
+            results = list(executor.map(lambda b: self._check_backup(b, throttle), backups))
+        self.catalog.upsert_many(backups)
+        return {b.backup_id: ok for b, ok in zip(backups, results)}
+    
+    def start_verify_job(self):
+        """启动定期后台校验"""
+        if self.verify_thread and self.verify_thread.is_alive():
+            return
+        self._verify_stop.clear()
+        self.verify_thread = threading.Thread(target=self._verify_worker, daemon=True)
+        self.verify_thread.start()
+    
+    def stop_verify_job(self):
+        """停止定期后台校验"""
+        self._verify_stop.set()
+        if self.verify_thread:
+            self.verify_thread.join(timeout=5)
+    
+    def _verify_worker(self):
+        """后台校验线程"""
+        while not self._verify_stop.is_set():
+            try:
+                results = self.verify_all_backups()
+                failed = [backup_id for backup_id, ok in results.items() if not ok]
+                print(f"备份校验完成: {len(results) - len(failed)} 个完好, {len(failed)} 个失败")
+            except Exception as e:
+                print(f"备份校验出错: {e}")
+            self._verify_stop.wait(self.verify_interval)
     
     def start_auto_backup(self, multi_server_manager):
-        """启动自动备份"""
+        """启动自动备份（按服务器的计划调度，没有计划的服务器使用全局间隔）"""
         if self.auto_backup_enabled:
             return
         
         self.auto_backup_enabled = True
-        self.auto_backup_thread = threading.Thread(
-            target=self._auto_backup_worker,
-            args=(multi_server_manager,),
-            daemon=True
-        )
-        self.auto_backup_thread.start()
+        if self.scheduler is None:
+            self.scheduler = BackupScheduler(self, multi_server_manager)
+        self.scheduler.ensure_default_schedules(max(1, self.auto_backup_interval // 60))
+        self.scheduler.start()
     
     def stop_auto_backup(self):
         """停止自动备份"""
         self.auto_backup_enabled = False
-        if self.auto_backup_thread:
-            self.auto_backup_thread.join(timeout=5)
-    
-    def _auto_backup_worker(self, multi_server_manager):
-        """自动备份工作线程"""
-        while self.auto_backup_enabled:
-            try:
-                # 为所有服务器创建备份
-                for server in multi_server_manager.get_all_servers():
-                    if not server.is_running():  # 只备份未运行的服务器
-                        self.create_backup(
-                            server.server_id,
-                            server.name,
-                            server.directory,
-                            backup_type="auto",
-                            description="自动备份"
-                        )
-                
-                # 等待下次备份
-                time.sleep(self.auto_backup_interval)
-                
-            except Exception as e:
-                print(f"自动备份出错: {e}")
-                time.sleep(60)  # 出错后等待1分钟再试
+        if self.scheduler:
+            self.scheduler.stop()
     
     def set_auto_backup_interval(self, interval_hours: float):
         """设置自动备份间隔（小时）"""
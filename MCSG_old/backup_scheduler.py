@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按服务器的定时备份调度模块（cron表达式/固定间隔）
+"""
+
+import os
+import json
+import uuid
+import zlib
+import threading
+import datetime
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set
+
+
+RETENTION_CLASSES = ("hourly", "daily", "weekly", "monthly")
+CRON_FIELD_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 6)]
+CRON_ALIASES = {
+    "@hourly": "0 * * * *",
+    "@daily": "0 0 * * *",
+    "@weekly": "0 0 * * 0",
+    "@monthly": "0 0 1 * *"
+}
+
+
+def _parse_cron_field(text: str, low: int, high: int) -> Set[int]:
+    """解析cron的一个字段（支持 *、*/n、a-b、a-b/n 和逗号列表）"""
+    values = set()
+    for part in text.split(','):
+        step = 1
+        if '/' in part:
+            part, step_text = part.split('/', 1)
+            step = int(step_text)
+            if step <= 0:
+                raise ValueError(f"无效的步长: {step_text}")
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start, end = (int(v) for v in part.split('-', 1))
+        else:
+            start = int(part)
+            end = high if step > 1 else start
+        if start < low or end > high or start > end:
+            raise ValueError(f"超出范围的值: {part} (允许 {low}-{high})")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronExpression:
+    """五段式cron表达式：分 时 日 月 周（周日为0，也接受7）"""
+
+    def __init__(self, expression: str):
+        self.expression = expression
+        text = CRON_ALIASES.get(expression.strip(), expression)
+        fields = text.split()
+        if len(fields) != 5:
+            raise ValueError(f"cron表达式需要5个字段: {expression}")
+        if fields[4] != '*':
+            fields[4] = ','.join('0' if v == '7' else v for v in fields[4].split(','))
+        parsed = [_parse_cron_field(f, low, high) for f, (low, high) in zip(fields, CRON_FIELD_RANGES)]
+        self.minutes, self.hours, self.days, self.months, self.weekdays = parsed
+        # 与标准cron一致：日和周都受限时满足其一即可
+        self.day_restricted = fields[2] != '*'
+        self.weekday_restricted = fields[4] != '*'
+
+    def _day_matches(self, moment: datetime.datetime) -> bool:
+        day_ok = moment.day in self.days
+        weekday_ok = (moment.weekday() + 1) % 7 in self.weekdays
+        if self.day_restricted and self.weekday_restricted:
+            return day_ok or weekday_ok
+        return day_ok and weekday_ok
+
+    def next_after(self, moment: datetime.datetime) -> datetime.datetime:
+        """moment 之后（不含）的下一次触发时间"""
+        candidate = moment.replace(second=0, microsecond=0) + datetime.timedelta(minutes=1)
+        limit = candidate + datetime.timedelta(days=366 * 5)
+        while candidate < limit:
+            if candidate.month not in self.months:
+                year = candidate.year + (candidate.month == 12)
+                month = candidate.month % 12 + 1
+                candidate = candidate.replace(year=year, month=month, day=1, hour=0, minute=0)
+            elif not self._day_matches(candidate):
+                candidate = (candidate + datetime.timedelta(days=1)).replace(hour=0, minute=0)
+            elif candidate.hour not in self.hours:
+                candidate = (candidate + datetime.timedelta(hours=1)).replace(minute=0)
+            elif candidate.minute not in self.minutes:
+                candidate += datetime.timedelta(minutes=1)
+            else:
+                return candidate
+        raise ValueError(f"cron表达式没有可触发的时间: {self.expression}")
+
+
+@dataclass
+class BackupSchedule:
+    """备份计划"""
+    schedule_id: str
+    server_id: str
+    cron: str = ""  # 与 interval_minutes 二选一
+    interval_minutes: int = 0
+    retention_class: str = "daily"
+    backup_format: str = ""  # 为空时使用备份管理器的默认格式
+    jitter_seconds: int = 300  # 每个计划固定偏移 [0, jitter) 秒，避免所有服务器同时备份
+    catch_up: bool = True  # 停机期间错过的计划在启动后补做一次
+    enabled: bool = True
+    last_run: str = ""
+    next_run: str = ""  # 不含抖动的计划时间
+
+    def to_dict(self) -> Dict:
+        return {
+            "schedule_id": self.schedule_id,
+            "server_id": self.server_id,
+            "cron": self.cron,
+            "interval_minutes": self.interval_minutes,
+            "retention_class": self.retention_class,
+            "backup_format": self.backup_format,
+            "jitter_seconds": self.jitter_seconds,
+            "catch_up": self.catch_up,
+            "enabled": self.enabled,
+            "last_run": self.last_run,
+            "next_run": self.next_run
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'BackupSchedule':
+        return cls(**data)
+
+    @property
+    def jitter(self) -> datetime.timedelta:
+        """由计划ID决定的固定抖动"""
+        if self.jitter_seconds <= 0:
+            return datetime.timedelta()
+        return datetime.timedelta(seconds=zlib.crc32(self.schedule_id.encode('utf-8')) % self.jitter_seconds)
+
+    def compute_next(self, after: datetime.datetime) -> datetime.datetime:
+        """after 之后的下一次计划时间（不含抖动）"""
+        if self.cron:
+            return CronExpression(self.cron).next_after(after)
+        return after + datetime.timedelta(minutes=max(1, self.interval_minutes))
+
+
+class BackupScheduler:
+    """备份调度器
+
+    每个服务器可以有多个计划（如每小时增量、每天完整），到期的计划进入队列，
+    由固定大小的线程池执行，max_concurrent 限制同时进行的备份数，同一服务器不会并发备份。
+    """
+
+    def __init__(self, backup_manager, multi_server_manager, schedules_file: Optional[str] = None):
+        self.backup_manager = backup_manager
+        self.multi_server_manager = multi_server_manager
+        self.schedules_file = schedules_file or os.path.join(backup_manager.backup_dir, "schedules.json")
+        self.schedules: Dict[str, BackupSchedule] = {}
+        self.max_concurrent = 2
+        self.check_interval = 10
+
+        self.running = False
+        self.scheduler_thread = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._queued: Dict[str, datetime.datetime] = {}  # schedule_id -> 计划时间
+        self._active_servers: Set[str] = set()
+        self._running_count = 0
+        self._lateness: deque = deque(maxlen=100)  # 最近的延迟（秒）
+        self._completed = 0
+        self._failed = 0
+        self._caught_up = 0
+
+        self.load_schedules()
+
+    def load_schedules(self):
+        """加载备份计划"""
+        if os.path.exists(self.schedules_file):
+            try:
+                with open(self.schedules_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                self.schedules = {s["schedule_id"]: BackupSchedule.from_dict(s) for s in data}
+            except Exception as e:
+                print(f"加载备份计划失败: {e}")
+                self.schedules = {}
+
+    def save_schedules(self):
+        """保存备份计划"""
+        try:
+            with self._lock:
+                data = [s.to_dict() for s in self.schedules.values()]
+            with self._save_lock:
+                temp_file = self.schedules_file + ".tmp"
+                with open(temp_file, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, indent=4, ensure_ascii=False)
+                os.replace(temp_file, self.schedules_file)
+        except Exception as e:
+            print(f"保存备份计划失败: {e}")
+
+    def add_schedule(self, server_id: str, cron: str = "", interval_minutes: int = 0,
+                     retention_class: str = "daily", backup_format: str = "",
+                     jitter_seconds: int = 300) -> Optional[str]:
+        """添加备份计划，返回计划ID"""
+        if retention_class not in RETENTION_CLASSES:
+            print(f"无效的保留类别: {retention_class}")
+            return None
+        if not cron and interval_minutes <= 0:
+            print("需要指定cron表达式或备份间隔")
+            return None
+        if cron:
+            try:
+                CronExpression(cron)
+            except ValueError as e:
+                print(f"无效的cron表达式: {e}")
+                return None
+
+        schedule = BackupSchedule(str(uuid.uuid4()), server_id, cron, interval_minutes, retention_class,
+                                  backup_format, jitter_seconds)
+        schedule.next_run = schedule.compute_next(datetime.datetime.now()).isoformat()
+        with self._lock:
+            self.schedules[schedule.schedule_id] = schedule
+        self.save_schedules()
+        return schedule.schedule_id
+
+    def remove_schedule(self, schedule_id: str) -> bool:
+        """删除备份计划"""
+        with self._lock:
+            removed = self.schedules.pop(schedule_id, None) is not None
+        if removed:
+            self.save_schedules()
+        return removed
+
+    def get_server_schedules(self, server_id: str) -> List[BackupSchedule]:
+        """获取服务器的备份计划"""
+        with self._lock:
+            return [s for s in self.schedules.values() if s.server_id == server_id]
+
+    def ensure_default_schedules(self, interval_minutes: int, retention_class: str = "hourly"):
+        """为还没有计划的服务器添加固定间隔计划（兼容原来的全局自动备份间隔）"""
+        with self._lock:
+            scheduled = {s.server_id for s in self.schedules.values()}
+        for server in self.multi_server_manager.get_all_servers():
+            if server.server_id not in scheduled and getattr(server, 'instance_type', "server") == "server":
+                self.add_schedule(server.server_id, interval_minutes=interval_minutes,
+                                  retention_class=retention_class)
+
+    def start(self):
+        """启动调度器"""
+        if self.running:
+            return
+        self.running = True
+        self._stop_event.clear()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrent)
+        self.scheduler_thread = threading.Thread(target=self._schedule_loop, daemon=True)
+        self.scheduler_thread.start()
+
+    def stop(self):
+        """停止调度器（已开始的备份会继续完成）"""
+        self.running = False
+        self._stop_event.set()
+        if self.scheduler_thread:
+            self.scheduler_thread.join(timeout=5)
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        with self._lock:
+            self._queued.clear()
+
+    def _schedule_loop(self):
+        """调度循环"""
+        while self.running:
+            try:
+                self.dispatch_due(datetime.datetime.now())
+            except Exception as e:
+                print(f"备份调度出错: {e}")
+            self._stop_event.wait(self.check_interval)
+
+    def dispatch_due(self, now: datetime.datetime) -> int:
+        """把到期的计划放入执行队列，返回新入队数量
+
+        错过的多次触发只补做一次（catch_up 为 False 时直接跳到下一个时间点）。
+        """
+        dispatched = 0
+        changed = False
+        with self._lock:
+            schedules = [s for s in self.schedules.values() if s.enabled]
+        for schedule in schedules:
+            if not schedule.next_run:
+                schedule.next_run = schedule.compute_next(now).isoformat()
+                changed = True
+                continue
+
+            planned = datetime.datetime.fromisoformat(schedule.next_run)
+            if now < planned + schedule.jitter:
+                continue
+            with self._lock:
+                if schedule.schedule_id in self._queued:
+                    continue
+
+            # 计算下一次时间，跳过停机期间错过的所有触发
+            next_run = schedule.compute_next(planned)
+            missed = 1
+            while next_run <= now:
+                next_run = schedule.compute_next(next_run)
+                missed += 1
+            schedule.next_run = next_run.isoformat()
+            changed = True
+
+            overdue = (now - planned - schedule.jitter).total_seconds() > max(60, 3 * self.check_interval)
+            if overdue:
+                if not schedule.catch_up:
+                    continue
+                with self._lock:
+                    self._caught_up += 1
+                print(f"补做错过的备份计划 {schedule.schedule_id}（错过 {missed} 次）")
+
+            with self._lock:
+                self._queued[schedule.schedule_id] = planned + schedule.jitter
+            self._executor.submit(self._run_schedule, schedule)
+            dispatched += 1
+
+        if changed:
+            self.save_schedules()
+        return dispatched
+
+    def _run_schedule(self, schedule: BackupSchedule):
+        """执行一个计划（在线程池中）"""
+        try:
+            # 同一服务器的另一个备份仍在进行时等待，不并发备份同一个世界
+            while True:
+                with self._lock:
+                    if schedule.server_id not in self._active_servers:
+                        self._active_servers.add(schedule.server_id)
+                        planned = self._queued.get(schedule.schedule_id)
+                        self._running_count += 1
+                        break
+                if self._stop_event.wait(1):
+                    return
+
+            try:
+                if planned:
+                    self._lateness.append((datetime.datetime.now() - planned).total_seconds())
+                server = self.multi_server_manager.get_server(schedule.server_id)
+                if server is None:
+                    print(f"备份计划 {schedule.schedule_id} 的服务器不存在，已跳过")
+                    return
+                if server.is_running() and getattr(server, 'instance_type', "server") != "server":
+                    return  # 代理没有 save-off/save-on
+
+                result = self.backup_manager.create_hot_backup(
+                    server, backup_type="scheduled", description=f"计划备份（{schedule.retention_class}）",
+                    backup_format=schedule.backup_format or None, retention_class=schedule.retention_class
+                )
+                with self._lock:
+                    if result:
+                        self._completed += 1
+                    else:
+                        self._failed += 1
+                schedule.last_run = datetime.datetime.now().isoformat()
+                self.save_schedules()
+            finally:
+                with self._lock:
+                    self._active_servers.discard(schedule.server_id)
+                    self._running_count -= 1
+        except Exception as e:
+            with self._lock:
+                self._failed += 1
+            print(f"执行备份计划出错: {e}")
+        finally:
+            with self._lock:
+                self._queued.pop(schedule.schedule_id, None)
+
+    def get_metrics(self) -> Dict:
+        """调度指标：队列深度、正在执行数、延迟统计"""
+        with self._lock:
+            lateness = list(self._lateness)
+            running = self._running_count
+            queue_depth = len(self._queued) - running
+            completed, failed, caught_up = self._completed, self._failed, self._caught_up
+            next_runs = [datetime.datetime.fromisoformat(s.next_run) + s.jitter
+                         for s in self.schedules.values() if s.enabled and s.next_run]
+        return {
+            "queue_depth": max(queue_depth, 0),
+            "running": running,
+            "max_concurrent": self.max_concurrent,
+            "completed": completed,
+            "failed": failed,
+            "caught_up": caught_up,
+            "lateness_average": round(sum(lateness) / len(lateness), 1) if lateness else 0.0,
+            "lateness_max": round(max(lateness), 1) if lateness else 0.0,
+            "next_run": min(next_runs).isoformat() if next_runs else ""
+        }
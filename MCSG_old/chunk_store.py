@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+内容寻址去重块存储模块
+"""
+
+import os
+import json
+import zlib
+import random
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Iterable, Iterator, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # 没有numpy时使用纯Python分块（较慢）
+    np = None
+
+
+# 内容定义分块参数：最小64KB，平均约256KB，最大1MB
+MIN_CHUNK_SIZE = 64 * 1024
+AVG_CHUNK_BITS = 18
+MAX_CHUNK_SIZE = 1024 * 1024
+READ_BLOCK_SIZE = 8 * 1024 * 1024
+
+# 32位Gear哈希，窗口为最近32字节；判断切分点时使用高位掩码
+_GEAR_RANDOM = random.Random(0x4D435347)
+GEAR_TABLE = [_GEAR_RANDOM.getrandbits(32) for _ in range(256)]
+CUT_MASK = ((1 << AVG_CHUNK_BITS) - 1) << (32 - AVG_CHUNK_BITS)
+
+CHUNK_RAW = b'R'
+CHUNK_ZLIB = b'Z'
+
+
+def _candidate_cut_points(data: bytes) -> List[int]:
+    """计算满足Gear哈希条件的候选切分位置（位置为块结束偏移）"""
+    if np is not None:
+        gear = np.array(GEAR_TABLE, dtype=np.uint32)
+        h = gear[np.frombuffer(data, dtype=np.uint8)]
+        # 倍增求窗口和: H_2w(i) = H_w(i) + (H_w(i-w) << w)，5次即得32字节窗口
+        width = 1
+        while width < 32:
+            shifted = np.zeros_like(h)
+            shifted[width:] = h[:-width] << np.uint32(width)
+            h = h + shifted
+            width *= 2
+        return (np.nonzero((h & np.uint32(CUT_MASK)) == 0)[0] + 1).tolist()
+
+    candidates = []
+    h = 0
+    gear = GEAR_TABLE
+    mask = CUT_MASK
+    for i, byte in enumerate(data):
+        h = ((h << 1) + gear[byte]) & 0xFFFFFFFF
+        if not h & mask:
+            candidates.append(i + 1)
+    return candidates
+
+
+def split_chunks(data: bytes, final: bool = True) -> Tuple[List[int], int]:
+    """对缓冲区做内容定义分块
+
+    返回 (块结束偏移列表, 已消费长度)。final 为 False 时最后一段不足以确定边界的数据留给下一次。
+    """
+    cuts = []
+    start = 0
+    length = len(data)
+    for candidate in _candidate_cut_points(data):
+        while candidate - start > MAX_CHUNK_SIZE:
+            start += MAX_CHUNK_SIZE
+            cuts.append(start)
+        if candidate - start >= MIN_CHUNK_SIZE:
+            cuts.append(candidate)
+            start = candidate
+
+    while length - start > MAX_CHUNK_SIZE:
+        start += MAX_CHUNK_SIZE
+        cuts.append(start)
+
+    if final and start < length:
+        cuts.append(length)
+        start = length
+    return cuts, start
+
+
+def iter_file_chunks(file_path: str, throttle=None) -> Iterator[bytes]:
+    """按内容定义分块读取文件，throttle 为可选的读取限速器"""
+    buffer = b""
+    with open(file_path, 'rb') as f:
+        while True:
+            block = f.read(READ_BLOCK_SIZE)
+            if throttle and block:
+                throttle.consume(len(block))
+            final = not block
+            buffer += block
+            if not buffer:
+                return
+            cuts, consumed = split_chunks(buffer, final=final)
+            previous = 0
+            for cut in cuts:
+                yield buffer[previous:cut]
+                previous = cut
+            buffer = buffer[consumed:]
+            if final:
+                return
+
+
+class ChunkStore:
+    """内容寻址块存储
+
+    块按SHA-256命名保存在 chunks/ 下，所有服务器与备份共享；
+    每个备份一份清单（文件 -> 块哈希列表），块按引用计数回收。
+    """
+
+    def __init__(self, store_dir: str):
+        self.store_dir = store_dir
+        self.chunks_dir = os.path.join(store_dir, "chunks")
+        self.manifests_dir = os.path.join(store_dir, "manifests")
+        self.index_file = os.path.join(store_dir, "chunk_index.json")
+        self.compress_level = 3
+        self.refcounts: Dict[str, List[int]] = {}  # 哈希 -> [引用数, 存储大小]
+        self._active_writers = 0  # 正在写入的备份数，写入期间不能清理孤立块
+        self._deferred: set = set()  # 写入期间引用归零、等写入结束再删除的块
+        self._lock = threading.Lock()
+
+        os.makedirs(self.chunks_dir, exist_ok=True)
+        os.makedirs(self.manifests_dir, exist_ok=True)
+        self.load_index()
+
+    def load_index(self):
+        """加载引用计数索引"""
+        if os.path.exists(self.index_file):
+            try:
+                with open(self.index_file, 'r', encoding='utf-8') as f:
+                    self.refcounts = json.load(f)
+            except Exception as e:
+                print(f"加载块索引失败: {e}")
+                self.refcounts = {}
+
+    def save_index(self):
+        """原子写入引用计数索引"""
+        temp_file = self.index_file + ".tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.refcounts, f)
+        os.replace(temp_file, self.index_file)
+
+    def _chunk_path(self, digest: str) -> str:
+        return os.path.join(self.chunks_dir, digest[:2], digest)
+
+    def manifest_path(self, backup_id: str) -> str:
+        return os.path.join(self.manifests_dir, f"{backup_id}.json")
+
+    def has_chunk(self, digest: str) -> bool:
+        return digest in self.refcounts or os.path.exists(self._chunk_path(digest))
+
+    def put_chunk(self, data: bytes) -> Tuple[str, int]:
+        """写入一个块，返回 (哈希, 新增的存储字节数)"""
+        digest = hashlib.sha256(data).hexdigest()
+        if self.has_chunk(digest):
+            return digest, 0
+
+        compressed = zlib.compress(data, self.compress_level)
+        # 已压缩的数据（如区块文件中的zlib区块、JAR）原样存储
+        payload = CHUNK_ZLIB + compressed if len(compressed) < len(data) * 0.95 else CHUNK_RAW + data
+
+        chunk_path = self._chunk_path(digest)
+        os.makedirs(os.path.dirname(chunk_path), exist_ok=True)
+        temp_path = f"{chunk_path}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(payload)
+        os.replace(temp_path, chunk_path)
+        return digest, len(payload)
+
+    def get_chunk(self, digest: str) -> bytes:
+        """读取一个块并校验"""
+        with open(self._chunk_path(digest), 'rb') as f:
+            payload = f.read()
+        data = zlib.decompress(payload[1:]) if payload[:1] == CHUNK_ZLIB else payload[1:]
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise ValueError(f"块校验失败: {digest}")
+        return data
+
+    def store_files(self, backup_id: str, files: Iterable[Tuple[str, str]], metadata: Dict = None,
+                    throttle=None) -> Tuple[Dict, int]:
+        """把一组文件存入块存储并写入清单
+
+        files 为 (文件路径, 归档内路径) 序列。返回 (清单, 新增存储字节数)。
+        """
+        with self._lock:
+            self._active_writers += 1
+        try:
+            return self._store_files(backup_id, files, metadata, throttle)
+        finally:
+            with self._lock:
+                self._active_writers -= 1
+                if not self._active_writers and self._deferred:
+                    # 写入中的备份可能已经按文件存在与否去重到这些块，只删除仍无引用的
+                    for digest in self._deferred:
+                        if digest not in self.refcounts:
+                            self._remove_chunk(digest)
+                    self._deferred.clear()
+
+    def _store_files(self, backup_id: str, files: Iterable[Tuple[str, str]],
+                     metadata: Optional[Dict], throttle=None) -> Tuple[Dict, int]:
+        entries = []
+        added_bytes = 0
+        stored_sizes: Dict[str, int] = {}
+        for file_path, arc_path in files:
+            try:
+                stat = os.stat(file_path)
+                chunk_hashes = []
+                for data in iter_file_chunks(file_path, throttle):
+                    digest, stored = self.put_chunk(data)
+                    chunk_hashes.append(digest)
+                    if stored:
+                        added_bytes += stored
+                        stored_sizes[digest] = stored
+            except OSError as e:
+                print(f"跳过无法读取的文件 {arc_path}: {e}")
+                continue
+
+            entries.append({
+                "path": arc_path.replace(os.sep, '/'),
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "chunks": chunk_hashes
+            })
+
+        manifest = dict(metadata or {})
+        manifest.update({"backup_id": backup_id, "files": entries})
+
+        with self._lock:
+            # 清单先落盘，再增加引用计数
+            temp_path = self.manifest_path(backup_id) + ".tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, ensure_ascii=False)
+            os.replace(temp_path, self.manifest_path(backup_id))
+
+            for digest in self._unique_chunks(manifest):
+                entry = self.refcounts.get(digest)
+                if entry:
+                    entry[0] += 1
+                else:
+                    size = stored_sizes.get(digest)
+                    if size is None:
+                        size = os.path.getsize(self._chunk_path(digest))
+                    self.refcounts[digest] = [1, size]
+            self.save_index()
+
+        return manifest, added_bytes
+
+    @staticmethod
+    def _unique_chunks(manifest: Dict) -> set:
+        return {digest for entry in manifest.get("files", []) for digest in entry["chunks"]}
+
+    def backup_chunks(self, backup_id: str) -> set:
+        """备份引用的块哈希集合"""
+        manifest = self.load_manifest(backup_id)
+        return self._unique_chunks(manifest) if manifest else set()
+
+    def refcounts_snapshot(self) -> Dict[str, List[int]]:
+        """引用计数的副本（哈希 -> [引用数, 存储大小]）"""
+        with self._lock:
+            return {digest: list(entry) for digest, entry in self.refcounts.items()}
+
+    def load_manifest(self, backup_id: str) -> Optional[Dict]:
+        """加载备份清单"""
+        path = self.manifest_path(backup_id)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def restore_file(self, entry: Dict, target_path: str):
+        """从块还原单个文件（先写临时文件再替换）"""
+        os.makedirs(os.path.dirname(target_path) or ".", exist_ok=True)
+        temp_path = target_path + ".restore.tmp"
+        with open(temp_path, 'wb') as f:
+            for digest in entry["chunks"]:
+                f.write(self.get_chunk(digest))
+        os.replace(temp_path, target_path)
+        try:
+            os.utime(target_path, ns=(entry["mtime_ns"], entry["mtime_ns"]))
+        except (OSError, KeyError):
+            pass
+
+    def restore(self, backup_id: str, target_directory: str, paths: Optional[Iterable[str]] = None,
+                max_workers: int = 4) -> bool:
+        """多线程还原备份（块读取时校验哈希），paths 指定时只还原这些文件"""
+        manifest = self.load_manifest(backup_id)
+        if manifest is None:
+            return False
+        wanted = set(paths) if paths is not None else None
+        entries = [e for e in manifest["files"] if wanted is None or e["path"] in wanted]
+        entries.sort(key=lambda e: e["size"], reverse=True)
+
+        def restore_entry(entry: Dict):
+            self.restore_file(entry, os.path.join(target_directory, *entry["path"].split('/')))
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for _ in executor.map(restore_entry, entries):
+                pass
+        return True
+
+    def verify(self, backup_id: str, throttle=None) -> Tuple[bool, str]:
+        """校验备份引用的所有块存在且内容与哈希一致，返回 (是否完好, 错误信息)"""
+        manifest = self.load_manifest(backup_id)
+        if manifest is None:
+            return False, "清单不存在"
+        for digest in self._unique_chunks(manifest):
+            try:
+                data = self.get_chunk(digest)
+            except (OSError, ValueError, zlib.error) as e:
+                return False, f"块损坏或缺失 {digest}: {e}"
+            if throttle:
+                throttle.consume(len(data))
+        return True, ""
+
+    def _remove_chunk(self, digest: str) -> bool:
+        try:
+            os.remove(self._chunk_path(digest))
+            return True
+        except OSError:
+            return False
+
+    def release(self, backup_ids: List[str]) -> int:
+        """批量释放备份的引用并回收无引用的块，返回回收字节数
+
+        有备份正在写入时只减少引用计数，块文件等所有写入结束后再删除
+        （写入中的备份在结束时才增加引用，可能已经去重到这些块）。
+        """
+        freed = 0
+        with self._lock:
+            for backup_id in backup_ids:
+                manifest = self.load_manifest(backup_id)
+                if manifest is None:
+                    continue
+                for digest in self._unique_chunks(manifest):
+                    entry = self.refcounts.get(digest)
+                    if not entry:
+                        continue
+                    entry[0] -= 1
+                    if entry[0] <= 0:
+                        del self.refcounts[digest]
+                        if self._active_writers:
+                            self._deferred.add(digest)
+                        elif self._remove_chunk(digest):
+                            freed += entry[1]
+                os.remove(self.manifest_path(backup_id))
+            self.save_index()
+        return freed
+
+    def collect_orphans(self) -> int:
+        """清理未被任何清单引用的块（例如备份中途崩溃留下的），返回回收字节数"""
+        freed = 0
+        with self._lock:
+            if self._active_writers:
+                return 0
+            for root, _, file_names in os.walk(self.chunks_dir):
+                for file_name in file_names:
+                    if file_name in self.refcounts:
+                        continue
+                    path = os.path.join(root, file_name)
+                    try:
+                        freed += os.path.getsize(path)
+                        os.remove(path)
+                    except OSError:
+                        pass
+        return freed
+
+    def get_statistics(self) -> Dict:
+        """获取块存储统计"""
+        return {
+            "chunks": len(self.refcounts),
+            "stored_bytes": sum(entry[1] for entry in self.refcounts.values()),
+            "manifests": len([f for f in os.listdir(self.manifests_dir) if f.endswith('.json')])
+        }
@@ -6,6 +6,7 @@ Minecraft Server Manager - GUI界面
 
 import sys
 import os
+import queue
 import threading
 import time
 from typing import Optional
@@ -31,6 +32,8 @@ from server_template import ServerTemplateManager
 from backup_manager import BackupManager
 from plugin_manager import PluginManager
 from performance_monitor import PerformanceMonitor
+from heap_monitor import HeapHistogramMonitor
+from vanilla_profiler import VanillaProfiler, diff_reports
 from player_manager import PlayerManager
 
 
@@ -42,16 +45,22 @@ class ServerOutputThread(QThread):
         super().__init__()
         self.manager = manager
         self.running = False
+        # 标准输出只由实例的读取线程读取，这里通过输出回调接收
+        self.lines: queue.Queue = queue.Queue()
+        self.manager.add_output_callback(self.lines.put)
     
     def run(self):
         """监控服务器输出"""
         self.running = True
-        while self.running and self.manager.is_server_running():
-            output = self.manager.read_server_output()
-            if output:
+        try:
+            while self.running and (self.manager.is_server_running() or not self.lines.empty()):
+                try:
+                    output = self.lines.get(timeout=0.1)
+                except queue.Empty:
+                    continue
                 self.output_received.emit(output.strip())
-            else:
-                time.sleep(0.1)
+        finally:
+            self.manager.remove_output_callback(self.lines.put)
     
     def stop(self):
         """停止监控"""
@@ -70,6 +79,9 @@ class MainWindow(FluentWindow):
             self.template_manager = ServerTemplateManager()
             self.backup_manager = BackupManager()
             self.performance_monitor = PerformanceMonitor()
+            self.heap_monitor = HeapHistogramMonitor(self.multi_server_manager, self.performance_monitor)
+            self.heap_monitor.start_monitoring()
+            self.vanilla_profiler = VanillaProfiler()
             
             # 当前服务器相关管理器
             self.plugin_manager: Optional[PluginManager] = None
@@ -203,6 +215,7 @@ class MainWindow(FluentWindow):
             self.server_list_interface.refresh_server_list()
             
             # 刷新相关界面
+            self.server_interface.refresh_world_stats()
             self.plugin_interface.refresh_plugin_list()
             self.player_interface.refresh_player_list()
             
@@ -924,7 +937,35 @@ class ServerInterface(QWidget):
         control_layout.addStretch()
         
         layout.addWidget(control_card)
+        
+        # 世界统计卡片（只读区域文件头，后台扫描）
+        world_card = HeaderCardWidget(self)
+        world_card.setTitle("世界统计")
+        
+        world_layout = QVBoxLayout()
+        world_buttons = QHBoxLayout()
+        self.world_summary_label = StrongBodyLabel("尚未扫描")
+        world_buttons.addWidget(self.world_summary_label)
+        world_buttons.addStretch()
+        self.world_refresh_button = PushButton("刷新", self)
+        self.world_refresh_button.setIcon(FluentIcon.SYNC)
+        self.world_refresh_button.clicked.connect(lambda: self.refresh_world_stats(force=True))
+        world_buttons.addWidget(self.world_refresh_button)
+        world_layout.addLayout(world_buttons)
+        
+        self.world_stats_label = BodyLabel("")
+        self.world_stats_label.setWordWrap(True)
+        world_layout.addWidget(self.world_stats_label)
+        
+        world_card.viewLayout.addLayout(world_layout)
+        layout.addWidget(world_card)
         layout.addStretch()
+        
+        # 后台扫描完成前定时检查结果
+        self.world_stats_timer = QTimer(self)
+        self.world_stats_timer.timeout.connect(self.poll_world_stats)
+        self._world_stats_since = 0.0
+        self._world_stats_deadline = 0.0
     
     def update_status(self, is_running: bool):
         """更新状态显示"""
@@ -938,6 +979,53 @@ class ServerInterface(QWidget):
             self.status_label.setStyleSheet("color: #d13438;")
             self.start_button.setEnabled(True)
             self.stop_button.setEnabled(False)
+    
+    def refresh_world_stats(self, force: bool = False):
+        """显示世界统计；结果过期（或 force）时在后台重新扫描，完成后自动刷新显示"""
+        server = self.parent.current_server
+        if not server:
+            return
+        stats = server.get_world_stats(max_age=0 if force else 300, block=False)
+        self.show_world_stats(stats)
+        if force or not stats or time.time() - stats.scanned_at >= 300:
+            self._world_stats_since = stats.scanned_at if stats else 0.0
+            self._world_stats_deadline = time.time() + 300
+            self.world_refresh_button.setEnabled(False)
+            if not stats:
+                self.world_summary_label.setText("正在扫描...")
+            self.world_stats_timer.start(500)
+    
+    def poll_world_stats(self):
+        """检查后台扫描是否完成"""
+        server = self.parent.current_server
+        stats = server.get_world_stats(max_age=float('inf'), block=False) if server else None
+        if stats and stats.scanned_at > self._world_stats_since:
+            self.show_world_stats(stats)
+        elif server and time.time() < self._world_stats_deadline:
+            return
+        self.world_stats_timer.stop()
+        self.world_refresh_button.setEnabled(True)
+    
+    def show_world_stats(self, stats):
+        """显示各维度的区块数、占用、碎片率和最后修改时间"""
+        if not stats:
+            self.world_summary_label.setText("尚未扫描")
+            self.world_stats_label.setText("")
+            return
+        
+        self.world_summary_label.setText(
+            f"共 {stats.total_chunks} 个区块，{stats.total_bytes / 1024 / 1024:.1f} MB"
+            f"（扫描于 {time.strftime('%H:%M:%S', time.localtime(stats.scanned_at))}，"
+            f"耗时 {stats.duration_seconds:.1f} 秒）")
+        lines = []
+        for name, dimension in sorted(stats.dimensions.items()):
+            modified = (time.strftime('%Y-%m-%d %H:%M', time.localtime(dimension.newest_timestamp))
+                        if dimension.newest_timestamp else "未知")
+            lines.append(f"• {name}: {dimension.chunks} 个区块，{dimension.file_bytes / 1024 / 1024:.1f} MB，"
+                         f"碎片 {dimension.fragmentation:.1%}，最后修改 {modified}")
+        if stats.errors:
+            lines.append(f"有 {stats.errors} 个区域文件无法读取")
+        self.world_stats_label.setText("\n".join(lines) if lines else "没有找到世界数据")
 
 
 class ConfigInterface(QWidget):
@@ -1708,6 +1796,53 @@ class PerformanceInterface(QWidget):
         suggestions_card.viewLayout.addLayout(self.suggestions_layout)
         layout.addWidget(suggestions_card)
         
+        # 内存泄漏检测卡片（每小时自动采集一次堆直方图）
+        heap_card = HeaderCardWidget(self)
+        heap_card.setTitle("内存泄漏检测")
+        
+        heap_layout = QVBoxLayout()
+        heap_buttons = QHBoxLayout()
+        capture_button = PushButton("立即采集堆直方图", self)
+        capture_button.clicked.connect(self.capture_heap_histogram)
+        heap_buttons.addWidget(capture_button)
+        export_button = PushButton("导出泄漏报告", self)
+        export_button.setIcon(FluentIcon.SAVE)
+        export_button.clicked.connect(self.export_heap_report)
+        heap_buttons.addWidget(export_button)
+        heap_buttons.addStretch()
+        heap_layout.addLayout(heap_buttons)
+        
+        self.heap_label = BodyLabel("至少需要两次采集才能分析增长趋势")
+        self.heap_label.setWordWrap(True)
+        heap_layout.addWidget(self.heap_label)
+        
+        heap_card.viewLayout.addLayout(heap_layout)
+        layout.addWidget(heap_card)
+        
+        # 原版性能分析卡片（/perf、/debug，找出占用tick的维度、实体和方块实体）
+        profile_card = HeaderCardWidget(self)
+        profile_card.setTitle("tick耗时分析")
+        
+        profile_layout = QVBoxLayout()
+        profile_buttons = QHBoxLayout()
+        profile_buttons.addWidget(BodyLabel("采集方式:"))
+        self.profile_type_combo = ComboBox(self)
+        self.profile_type_combo.addItems(list(VanillaProfiler.CAPTURE_TYPES))
+        profile_buttons.addWidget(self.profile_type_combo)
+        self.profile_button = PushButton("采集10秒", self)
+        self.profile_button.clicked.connect(self.capture_profile)
+        profile_buttons.addWidget(self.profile_button)
+        profile_buttons.addStretch()
+        profile_layout.addLayout(profile_buttons)
+        
+        self.profile_text = TextEdit(self)
+        self.profile_text.setReadOnly(True)
+        self.profile_text.setMinimumHeight(160)
+        profile_layout.addWidget(self.profile_text)
+        
+        profile_card.viewLayout.addLayout(profile_layout)
+        layout.addWidget(profile_card)
+        
         layout.addStretch()
     
     def update_performance_data(self, data):
@@ -1748,6 +1883,109 @@ class PerformanceInterface(QWidget):
             suggestion_label = BodyLabel(f"• {suggestion}")
             suggestion_label.setWordWrap(True)
             self.suggestions_layout.addWidget(suggestion_label)
+    
+    def capture_heap_histogram(self):
+        """为当前服务器采集一次堆直方图（会触发一次 Full GC）"""
+        server = self.parent.current_server
+        if not server or not server.is_running():
+            InfoBar.warning(
+                title="无法采集",
+                content="请先启动服务器！",
+                orient=Qt.Horizontal,
+                isClosable=True,
+                position=InfoBarPosition.TOP,
+                duration=3000,
+                parent=self.parent
+            )
+            return
+        
+        def capture_async():
+            snapshot = self.parent.heap_monitor.capture(server, force=True)
+            QTimer.singleShot(100, lambda: self.heap_capture_finished(server, snapshot is not None))
+        
+        threading.Thread(target=capture_async, daemon=True).start()
+    
+    def heap_capture_finished(self, server, success: bool):
+        """采集完成，刷新疑似泄漏列表"""
+        if not success:
+            InfoBar.error(
+                title="采集失败",
+                content="执行 jcmd 失败，请确认已安装JDK（而不只是JRE）",
+                orient=Qt.Horizontal,
+                isClosable=True,
+                position=InfoBarPosition.TOP,
+                duration=5000,
+                parent=self.parent
+            )
+            return
+        
+        suspects = self.parent.heap_monitor.get_suspected_leaks(server)
+        if suspects:
+            lines = [f"• {source}: {entry['bytes_per_hour'] / 1024 / 1024:.1f} MB/小时"
+                     for source, entry in list(suspects.items())[:5]]
+            self.heap_label.setText("疑似泄漏:\n" + "\n".join(lines))
+        else:
+            snapshots = len(self.parent.heap_monitor.get_history(server))
+            self.heap_label.setText(f"已有 {snapshots} 次采集，未发现持续增长的类")
+    
+    def capture_profile(self):
+        """对当前服务器执行一次原版性能分析"""
+        server = self.parent.current_server
+        if not server or not server.is_running():
+            InfoBar.warning(
+                title="无法采集",
+                content="请先启动服务器！",
+                orient=Qt.Horizontal,
+                isClosable=True,
+                position=InfoBarPosition.TOP,
+                duration=3000,
+                parent=self.parent
+            )
+            return
+        
+        capture_type = self.profile_type_combo.currentText()
+        self.profile_button.setEnabled(False)
+        self.profile_text.setPlainText(f"正在采集（{capture_type}，约10秒）...")
+        
+        def capture_async():
+            previous = self.parent.vanilla_profiler.get_reports(server.server_id)
+            report = self.parent.vanilla_profiler.capture(server, capture_type)
+            QTimer.singleShot(100, lambda: self.profile_finished(report, previous[-1] if previous else None))
+        
+        threading.Thread(target=capture_async, daemon=True).start()
+    
+    def profile_finished(self, report, previous):
+        """显示tick消耗大户，以及与上一次采集相比变化最大的项"""
+        self.profile_button.setEnabled(True)
+        if not report:
+            self.profile_text.setPlainText("采集失败：服务器不支持该命令或等待报告超时")
+            return
+        
+        text = self.parent.vanilla_profiler.format_top_consumers(report)
+        if previous:
+            lines = ["", "与上一次采集相比:"]
+            for change in diff_reports(previous, report, top_n=5):
+                lines.append(f"{change['delta_percent']:+6.2f}%  {change['path']}")
+            text += "\n".join(lines)
+        self.profile_text.setPlainText(text)
+    
+    def export_heap_report(self):
+        """导出当前服务器的内存泄漏报告"""
+        server = self.parent.current_server
+        if not server:
+            return
+        file_path, _ = QFileDialog.getSaveFileName(self, "导出泄漏报告", f"{server.name}_heap_report.json",
+                                                   "JSON文件 (*.json)")
+        if file_path and self.parent.heap_monitor.export_report(server, file_path):
+            InfoBar.success(
+                title="导出成功",
+                content=f"报告已保存到 {file_path}",
+                orient=Qt.Horizontal,
+                isClosable=True,
+                position=InfoBarPosition.TOP,
+                duration=3000,
+                parent=self.parent
+            )
 
 
 class PlayerInterface(QWidget):
@@ -0,0 +1,491 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+堆内存直方图监控模块（内存泄漏检测）
+"""
+
+import os
+import re
+import json
+import time
+import zipfile
+import threading
+import subprocess
+from typing import Dict, List, Optional, Tuple
+from dataclasses import dataclass, field
+
+
+# jcmd GC.class_histogram 输出行:  "   1:     123456     12345678  [B (java.base@17)"
+HISTOGRAM_LINE_PATTERN = re.compile(r'^\s*\d+:\s+(\d+)\s+(\d+)\s+(\S+)')
+HISTOGRAM_TOTAL_PATTERN = re.compile(r'^\s*Total\s+(\d+)\s+(\d+)')
+
+# JVM 数组类型描述符中的基础类型
+PRIMITIVE_ARRAY_TYPES = {
+    'B': 'byte[]', 'C': 'char[]', 'D': 'double[]', 'F': 'float[]',
+    'I': 'int[]', 'J': 'long[]', 'S': 'short[]', 'Z': 'boolean[]'
+}
+
+
+@dataclass
+class HeapSnapshot:
+    """堆直方图快照"""
+    timestamp: float
+    server_id: str
+    total_instances: int
+    total_bytes: int
+    classes: Dict[str, List[int]] = field(default_factory=dict)  # 类名 -> [实例数, 字节数]
+    # 只保存了占用最大的类时，未保存的类不超过该字节数（数值未知）；0 表示直方图完整
+    cutoff_bytes: int = 0
+
+    def get(self, class_name: str) -> Optional[List[int]]:
+        """类的 [实例数, 字节数]，类不在截断后的快照中时返回 None（未知）"""
+        entry = self.classes.get(class_name)
+        if entry is None and not self.cutoff_bytes:
+            return [0, 0]
+        return entry
+
+    def to_dict(self) -> Dict:
+        return {
+            "timestamp": self.timestamp,
+            "server_id": self.server_id,
+            "total_instances": self.total_instances,
+            "total_bytes": self.total_bytes,
+            "classes": self.classes,
+            "cutoff_bytes": self.cutoff_bytes
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'HeapSnapshot':
+        data = dict(data)
+        if "cutoff_bytes" not in data:
+            # 旧版本的快照都只保存了前若干个类，缺失的类按未知处理
+            data["cutoff_bytes"] = min((e[1] for e in data.get("classes", {}).values()), default=0)
+        return cls(**data)
+
+
+@dataclass
+class ClassGrowth:
+    """类的内存增长情况"""
+    class_name: str
+    bytes_before: int
+    bytes_after: int
+    instances_before: int
+    instances_after: int
+    bytes_per_hour: float = 0.0
+    growth_ratio: float = 0.0  # 快照间增长的比例（0-1），越接近1趋势越明显
+    source: str = ""  # 所属插件/模组JAR
+
+    @property
+    def bytes_delta(self) -> int:
+        return self.bytes_after - self.bytes_before
+
+    @property
+    def instances_delta(self) -> int:
+        return self.instances_after - self.instances_before
+
+    def to_dict(self) -> Dict:
+        return {
+            "class_name": self.class_name,
+            "bytes_before": self.bytes_before,
+            "bytes_after": self.bytes_after,
+            "bytes_delta": self.bytes_delta,
+            "instances_before": self.instances_before,
+            "instances_after": self.instances_after,
+            "instances_delta": self.instances_delta,
+            "bytes_per_hour": self.bytes_per_hour,
+            "growth_ratio": self.growth_ratio,
+            "source": self.source
+        }
+
+
+def parse_class_histogram(output: str) -> Tuple[Dict[str, List[int]], int, int]:
+    """解析 jcmd GC.class_histogram 的输出"""
+    classes: Dict[str, List[int]] = {}
+    total_instances = 0
+    total_bytes = 0
+
+    for line in output.splitlines():
+        match = HISTOGRAM_LINE_PATTERN.match(line)
+        if match:
+            instances, size, class_name = int(match.group(1)), int(match.group(2)), match.group(3)
+            # 同名类可能由不同类加载器加载，合并统计
+            entry = classes.setdefault(class_name, [0, 0])
+            entry[0] += instances
+            entry[1] += size
+            continue
+
+        match = HISTOGRAM_TOTAL_PATTERN.match(line)
+        if match:
+            total_instances, total_bytes = int(match.group(1)), int(match.group(2))
+
+    if not total_bytes:
+        total_instances = sum(e[0] for e in classes.values())
+        total_bytes = sum(e[1] for e in classes.values())
+
+    return classes, total_instances, total_bytes
+
+
+def normalize_class_name(class_name: str) -> str:
+    """将JVM内部类名（如 [Lcom.foo.Bar;）转换为普通类名"""
+    name = class_name
+    while name.startswith('['):
+        name = name[1:]
+    if name.startswith('L') and name.endswith(';'):
+        name = name[1:-1]
+    elif name in PRIMITIVE_ARRAY_TYPES:
+        name = PRIMITIVE_ARRAY_TYPES[name]
+    return name.replace('/', '.')
+
+
+class JarClassIndex:
+    """插件/模组JAR的包名索引，用于把类名映射到所属JAR"""
+
+    def __init__(self, server_directory: str, search_dirs: Tuple[str, ...] = ("plugins", "mods")):
+        self.server_directory = server_directory
+        self.search_dirs = search_dirs
+        self._packages: Dict[str, str] = {}  # 包名 -> JAR文件名
+        self._jar_mtimes: Dict[str, float] = {}
+
+    def refresh(self):
+        """扫描JAR文件，仅在JAR变化时重建索引"""
+        jar_mtimes = {}
+        for sub_dir in self.search_dirs:
+            directory = os.path.join(self.server_directory, sub_dir)
+            if not os.path.isdir(directory):
+                continue
+            for file_name in os.listdir(directory):
+                if file_name.endswith('.jar'):
+                    jar_path = os.path.join(directory, file_name)
+                    try:
+                        jar_mtimes[jar_path] = os.path.getmtime(jar_path)
+                    except OSError:
+                        continue
+
+        if jar_mtimes == self._jar_mtimes:
+            return
+
+        packages = {}
+        for jar_path in jar_mtimes:
+            jar_name = os.path.basename(jar_path)
+            try:
+                with zipfile.ZipFile(jar_path, 'r') as jar:
+                    for name in jar.namelist():
+                        if not name.endswith('.class') or '/' not in name:
+                            continue
+                        # 跳过多版本JAR和被重定位(shade)的公共依赖目录
+                        if name.startswith('META-INF/'):
+                            continue
+                        package = name.rsplit('/', 1)[0].replace('/', '.')
+                        packages.setdefault(package, jar_name)
+            except Exception as e:
+                print(f"读取JAR失败 {jar_name}: {e}")
+
+        self._packages = packages
+        self._jar_mtimes = jar_mtimes
+
+    def lookup(self, class_name: str) -> str:
+        """查找类所属的JAR，找不到时返回空字符串"""
+        name = normalize_class_name(class_name)
+        # 去掉内部类后缀，逐级向上匹配包名
+        package = name.split('$', 1)[0].rsplit('.', 1)[0] if '.' in name else ""
+        while package:
+            jar_name = self._packages.get(package)
+            if jar_name:
+                return jar_name
+            if '.' not in package:
+                break
+            package = package.rsplit('.', 1)[0]
+        return ""
+
+
+class HeapHistogramMonitor:
+    """堆直方图监控器
+
+    定期（低频）对每个运行中的实例执行 jcmd GC.class_histogram，
+    保存历史快照并按增长量排序，用于发现插件造成的内存泄漏。
+    注意：GC.class_histogram 会触发一次 Full GC，因此TPS下降时自动跳过采集。
+    """
+
+    def __init__(self, multi_server_manager=None, performance_monitor=None,
+                 history_file_name: str = "heap_history.json"):
+        self.multi_server_manager = multi_server_manager
+        self.performance_monitor = performance_monitor
+        self.history_file_name = history_file_name
+        self.jcmd_path = "jcmd"
+        self.capture_interval = 3600  # 1小时
+        self.capture_timeout = 120
+        self.min_tps = 18.0  # TPS低于该值视为性能下降，跳过采集
+        self.stats_max_age = 120  # 实例TPS数据超过该秒数视为过期
+        self.max_snapshots = 720  # 每小时一次约保存30天
+        self.max_classes_per_snapshot = 300
+
+        self.monitoring = False
+        self.monitor_thread = None
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._histories: Dict[str, List[HeapSnapshot]] = {}
+        self._jar_indexes: Dict[str, JarClassIndex] = {}
+
+    def start_monitoring(self):
+        """开始定期采集"""
+        if self.monitoring:
+            return
+
+        self.monitoring = True
+        self._stop_event.clear()
+        self.monitor_thread = threading.Thread(target=self._monitor_loop, daemon=True)
+        self.monitor_thread.start()
+
+    def stop_monitoring(self):
+        """停止定期采集"""
+        self.monitoring = False
+        self._stop_event.set()
+        if self.monitor_thread:
+            self.monitor_thread.join(timeout=5)
+
+    def _monitor_loop(self):
+        """采集循环"""
+        while self.monitoring:
+            try:
+                if self.multi_server_manager:
+                    for server in self.multi_server_manager.get_running_servers():
+                        if not self.monitoring:
+                            break
+                        self.capture(server)
+            except Exception as e:
+                print(f"堆直方图采集出错: {e}")
+
+            self._stop_event.wait(self.capture_interval)
+
+    def _fresh_tps(self, server) -> float:
+        """实例最近解析到的TPS（由输出读取线程更新），过期时发送查询并稍等，未知时返回0"""
+        if not hasattr(server, 'request_tps'):
+            return 0.0
+        if time.time() - server.stats_time > self.stats_max_age:
+            stats_time = server.stats_time
+            if server.request_tps():
+                deadline = time.time() + 3
+                while server.stats_time == stats_time and time.time() < deadline:
+                    time.sleep(0.1)
+        if time.time() - server.stats_time > self.stats_max_age:
+            return 0.0
+        return server.tps
+
+    def is_tps_degraded(self, server) -> bool:
+        """检查服务器TPS是否处于下降状态"""
+        tps = self._fresh_tps(server)
+        if tps > 0:
+            return tps < self.min_tps
+
+        # 实例没有TPS输出时，使用性能监控器（只监控当前选中的服务器）的数据
+        if not self.performance_monitor:
+            return False
+        monitored = getattr(self.performance_monitor, 'server_manager', None)
+        if monitored is not server.manager:
+            return False
+        current = self.performance_monitor.get_current_data()
+        return bool(current and 0 < current.tps < self.min_tps)
+
+    def _get_server_pid(self, server) -> Optional[int]:
+        """获取服务器Java进程PID"""
+        if not server.is_running():
+            return None
+        process = getattr(server.manager, 'server_process', None)
+        return process.pid if process else None
+
+    def capture(self, server, force: bool = False) -> Optional[HeapSnapshot]:
+        """为指定服务器采集一次堆直方图"""
+        if not force and self.is_tps_degraded(server):
+            print(f"服务器 {server.name} TPS下降，跳过堆直方图采集")
+            return None
+
+        pid = self._get_server_pid(server)
+        if not pid:
+            return None
+
+        try:
+            result = subprocess.run(
+                [self.jcmd_path, str(pid), "GC.class_histogram"],
+                capture_output=True,
+                text=True,
+                timeout=self.capture_timeout,
+                creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+            )
+            if result.returncode != 0:
+                print(f"jcmd执行失败: {result.stderr.strip() or result.stdout.strip()}")
+                return None
+        except Exception as e:
+            print(f"采集堆直方图失败: {e}")
+            return None
+
+        classes, total_instances, total_bytes = parse_class_histogram(result.stdout)
+        if not classes:
+            return None
+
+        # 只保留占用最大的类，控制历史文件大小；记录截断线，之后缺失的类视为未知而不是0
+        top_classes = sorted(classes.items(), key=lambda x: x[1][1], reverse=True)
+        kept = top_classes[:self.max_classes_per_snapshot]
+        snapshot = HeapSnapshot(
+            timestamp=time.time(),
+            server_id=server.server_id,
+            total_instances=total_instances,
+            total_bytes=total_bytes,
+            classes=dict(kept),
+            cutoff_bytes=kept[-1][1][1] if len(top_classes) > len(kept) else 0
+        )
+
+        with self._lock:
+            history = self._load_history(server)
+            history.append(snapshot)
+            if len(history) > self.max_snapshots:
+                del history[:len(history) - self.max_snapshots]
+            self._save_history(server, history)
+
+        return snapshot
+
+    def _history_file(self, server) -> str:
+        return os.path.join(server.directory, self.history_file_name)
+
+    def _load_history(self, server) -> List[HeapSnapshot]:
+        """加载历史快照"""
+        if server.server_id in self._histories:
+            return self._histories[server.server_id]
+
+        history = []
+        history_file = self._history_file(server)
+        if os.path.exists(history_file):
+            try:
+                with open(history_file, 'r', encoding='utf-8') as f:
+                    history = [HeapSnapshot.from_dict(s) for s in json.load(f)]
+            except Exception as e:
+                print(f"加载堆直方图历史失败: {e}")
+
+        self._histories[server.server_id] = history
+        return history
+
+    def _save_history(self, server, history: List[HeapSnapshot]):
+        """保存历史快照"""
+        history_file = self._history_file(server)
+        try:
+            temp_file = history_file + ".tmp"
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump([s.to_dict() for s in history], f, ensure_ascii=False)
+            os.replace(temp_file, history_file)
+        except Exception as e:
+            print(f"保存堆直方图历史失败: {e}")
+
+    def get_history(self, server) -> List[HeapSnapshot]:
+        """获取服务器的历史快照"""
+        with self._lock:
+            return list(self._load_history(server))
+
+    def get_total_heap_trend(self, server) -> List[Tuple[float, int]]:
+        """获取堆总占用的时间序列 [(时间戳, 字节数)]"""
+        return [(s.timestamp, s.total_bytes) for s in self.get_history(server)]
+
+    def diff_snapshots(self, before: HeapSnapshot, after: HeapSnapshot) -> List[ClassGrowth]:
+        """对比两个快照，按字节增长量排序（在任一快照中数值未知的类不参与）"""
+        growths = []
+        for class_name in set(before.classes) | set(after.classes):
+            old = before.get(class_name)
+            new = after.get(class_name)
+            if old is None or new is None:
+                continue
+            growths.append(ClassGrowth(
+                class_name=class_name,
+                bytes_before=old[1],
+                bytes_after=new[1],
+                instances_before=old[0],
+                instances_after=new[0]
+            ))
+
+        hours = max((after.timestamp - before.timestamp) / 3600, 1e-6)
+        for growth in growths:
+            growth.bytes_per_hour = growth.bytes_delta / hours
+
+        growths.sort(key=lambda g: g.bytes_delta, reverse=True)
+        return growths
+
+    def get_growth_ranking(self, server, window_hours: float = 0, top_n: int = 20) -> List[ClassGrowth]:
+        """获取增长最快的类
+
+        window_hours 为0时使用全部历史。趋势使用最小二乘斜率（字节/小时），
+        并记录快照间持续增长的比例，多日持续增长的类即为疑似泄漏。
+        类在截断的快照中缺失时该点数值未知，只用已知的点计算。
+        """
+        history = self.get_history(server)
+        if window_hours > 0 and history:
+            since = history[-1].timestamp - window_hours * 3600
+            history = [s for s in history if s.timestamp >= since]
+        if len(history) < 2:
+            return []
+
+        start = history[0].timestamp
+        growths = []
+        for class_name in set().union(*(s.classes for s in history)):
+            points = [((s.timestamp - start) / 3600, entry) for s in history
+                      for entry in (s.get(class_name),) if entry is not None]
+            if len(points) < 2 or points[-1][1][1] <= points[0][1][1]:
+                continue
+            growth = ClassGrowth(class_name, points[0][1][1], points[-1][1][1], points[0][1][0], points[-1][1][0])
+            hours = [h for h, _ in points]
+            series = [entry[1] for _, entry in points]
+            mean_hours = sum(hours) / len(hours)
+            variance = sum((h - mean_hours) ** 2 for h in hours)
+            if variance > 0:
+                mean_bytes = sum(series) / len(series)
+                covariance = sum((h - mean_hours) * (b - mean_bytes) for h, b in zip(hours, series))
+                growth.bytes_per_hour = covariance / variance
+            increases = sum(1 for a, b in zip(series, series[1:]) if b > a)
+            growth.growth_ratio = increases / (len(series) - 1)
+            growths.append(growth)
+
+        growths.sort(key=lambda g: (g.bytes_per_hour * g.growth_ratio, g.bytes_delta), reverse=True)
+        growths = growths[:top_n]
+
+        index = self._get_jar_index(server)
+        for growth in growths:
+            growth.source = index.lookup(growth.class_name)
+
+        return growths
+
+    def _get_jar_index(self, server) -> JarClassIndex:
+        """获取（并刷新）服务器的JAR索引"""
+        index = self._jar_indexes.get(server.server_id)
+        if index is None:
+            index = JarClassIndex(server.directory)
+            self._jar_indexes[server.server_id] = index
+        index.refresh()
+        return index
+
+    def get_suspected_leaks(self, server, window_hours: float = 0,
+                            min_growth_ratio: float = 0.7) -> Dict[str, Dict]:
+        """按插件/模组汇总疑似泄漏"""
+        suspects: Dict[str, Dict] = {}
+        for growth in self.get_growth_ranking(server, window_hours, top_n=50):
+            if growth.growth_ratio < min_growth_ratio:
+                continue
+            source = growth.source or "服务器核心/JDK"
+            entry = suspects.setdefault(source, {"bytes_per_hour": 0.0, "classes": []})
+            entry["bytes_per_hour"] += growth.bytes_per_hour
+            entry["classes"].append(growth.to_dict())
+        return dict(sorted(suspects.items(), key=lambda x: x[1]["bytes_per_hour"], reverse=True))
+
+    def export_report(self, server, file_path: str, window_hours: float = 0) -> bool:
+        """导出内存泄漏分析报告"""
+        try:
+            report = {
+                "report_time": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "server_id": server.server_id,
+                "server_name": server.name,
+                "snapshots": len(self.get_history(server)),
+                "heap_trend": self.get_total_heap_trend(server),
+                "top_growth": [g.to_dict() for g in self.get_growth_ranking(server, window_hours)],
+                "suspected_leaks": self.get_suspected_leaks(server, window_hours)
+            }
+            with open(file_path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=4, ensure_ascii=False)
+            return True
+        except Exception as e:
+            print(f"导出内存泄漏报告失败: {e}")
+            return False
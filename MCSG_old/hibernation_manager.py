@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+空闲服务器休眠模块（连接时唤醒）
+"""
+
+import json
+import time
+import socket
+import threading
+from typing import Dict, Optional, Callable
+
+
+class ProtocolError(Exception):
+    """Minecraft协议数据错误"""
+
+
+def _recv_exact(conn: socket.socket, size: int) -> bytes:
+    """从连接读取指定长度的数据"""
+    data = b""
+    while len(data) < size:
+        chunk = conn.recv(size - len(data))
+        if not chunk:
+            raise ProtocolError("连接已关闭")
+        data += chunk
+    return data
+
+
+def read_varint(conn: socket.socket) -> int:
+    """从连接读取VarInt"""
+    value = 0
+    for i in range(5):
+        byte = _recv_exact(conn, 1)[0]
+        value |= (byte & 0x7F) << (7 * i)
+        if not byte & 0x80:
+            return value
+    raise ProtocolError("VarInt过长")
+
+
+def decode_varint(data: bytes, offset: int = 0):
+    """从字节串解码VarInt，返回 (值, 新偏移)"""
+    value = 0
+    for i in range(5):
+        if offset >= len(data):
+            raise ProtocolError("数据不完整")
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << (7 * i)
+        if not byte & 0x80:
+            return value, offset
+    raise ProtocolError("VarInt过长")
+
+
+def encode_varint(value: int) -> bytes:
+    """编码VarInt"""
+    value &= 0xFFFFFFFF
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def encode_string(text: str) -> bytes:
+    """编码协议字符串（VarInt长度 + UTF-8）"""
+    data = text.encode('utf-8')
+    return encode_varint(len(data)) + data
+
+
+def read_packet(conn: socket.socket, max_length: int = 32767):
+    """读取一个未压缩的数据包，返回 (包ID, 数据)"""
+    length = read_varint(conn)
+    if length <= 0 or length > max_length:
+        raise ProtocolError(f"数据包长度异常: {length}")
+    payload = _recv_exact(conn, length)
+    packet_id, offset = decode_varint(payload)
+    return packet_id, payload[offset:]
+
+
+def send_packet(conn: socket.socket, packet_id: int, data: bytes = b""):
+    """发送一个未压缩的数据包"""
+    payload = encode_varint(packet_id) + data
+    conn.sendall(encode_varint(len(payload)) + payload)
+
+
+class HibernationListener:
+    """休眠监听器
+
+    在服务器停止后占用其端口：响应服务器列表Ping（显示休眠MOTD），
+    收到登录握手时断开该玩家并回调唤醒服务器。
+    """
+
+    def __init__(self, port: int, motd: str, max_players: int = 20,
+                 on_wake: Optional[Callable[[], None]] = None,
+                 kick_message: str = "服务器正在启动，请稍后重新连接",
+                 host: str = ""):
+        self.host = host
+        self.port = port
+        self.motd = motd
+        self.max_players = max_players
+        self.kick_message = kick_message
+        self.on_wake = on_wake
+        self.running = False
+        self.listen_thread = None
+        self._socket: Optional[socket.socket] = None
+        self._wake_triggered = False
+        self._lock = threading.Lock()
+
+    def start(self):
+        """开始监听端口"""
+        if self.running:
+            return
+
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        if hasattr(socket, 'SO_EXCLUSIVEADDRUSE'):
+            self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_EXCLUSIVEADDRUSE, 1)
+        else:
+            self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind((self.host, self.port))
+        self._socket.listen(16)
+        self._socket.settimeout(1.0)
+
+        self._wake_triggered = False
+        self.running = True
+        self.listen_thread = threading.Thread(target=self._accept_loop, daemon=True)
+        self.listen_thread.start()
+
+    def stop(self):
+        """停止监听并释放端口"""
+        self.running = False
+        if self._socket:
+            try:
+                self._socket.close()
+            except OSError:
+                pass
+            self._socket = None
+        if self.listen_thread and self.listen_thread is not threading.current_thread():
+            self.listen_thread.join(timeout=3)
+
+    def _accept_loop(self):
+        """接受连接"""
+        while self.running:
+            try:
+                conn, _ = self._socket.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+
+            threading.Thread(target=self._handle_connection, args=(conn,), daemon=True).start()
+
+    def _status_response(self, protocol: int) -> str:
+        """构造服务器列表Ping响应"""
+        return json.dumps({
+            "version": {"name": "Sleeping", "protocol": protocol},
+            "players": {"max": self.max_players, "online": 0, "sample": []},
+            "description": {"text": self.motd}
+        }, ensure_ascii=False)
+
+    def _handle_connection(self, conn: socket.socket):
+        """处理单个客户端连接"""
+        try:
+            conn.settimeout(5)
+            first = conn.recv(1, socket.MSG_PEEK)
+            if not first or first[0] == 0xFE:
+                # 旧版(1.6及以前)Ping，直接关闭
+                return
+
+            packet_id, data = read_packet(conn)
+            if packet_id != 0x00:
+                return
+
+            # 握手: 协议版本, 服务器地址, 端口, 下一状态
+            protocol, offset = decode_varint(data)
+            address_length, offset = decode_varint(data, offset)
+            offset += address_length + 2
+            next_state, _ = decode_varint(data, offset)
+
+            if next_state == 1:
+                self._handle_status(conn, protocol)
+            elif next_state in (2, 3):
+                self._handle_login(conn)
+        except (ProtocolError, OSError):
+            pass
+        finally:
+            try:
+                conn.close()
+            except OSError:
+                pass
+
+    def _handle_status(self, conn: socket.socket, protocol: int):
+        """处理状态查询"""
+        packet_id, _ = read_packet(conn)
+        if packet_id != 0x00:
+            return
+        send_packet(conn, 0x00, encode_string(self._status_response(protocol)))
+
+        try:
+            packet_id, payload = read_packet(conn)
+        except (ProtocolError, OSError):
+            return
+        if packet_id == 0x01 and len(payload) == 8:
+            send_packet(conn, 0x01, payload)
+
+    def _handle_login(self, conn: socket.socket):
+        """处理登录：断开玩家并唤醒服务器"""
+        try:
+            read_packet(conn)  # Login Start
+        except (ProtocolError, OSError):
+            pass
+
+        message = json.dumps({"text": self.kick_message}, ensure_ascii=False)
+        send_packet(conn, 0x00, encode_string(message))
+
+        with self._lock:
+            if self._wake_triggered:
+                return
+            self._wake_triggered = True
+
+        if self.on_wake:
+            threading.Thread(target=self.on_wake, daemon=True).start()
+
+
+class HibernationManager:
+    """休眠管理器
+
+    定期检查开启休眠的实例，无玩家超过指定分钟数后正常停止服务器，
+    并由休眠监听器接管端口；玩家尝试登录时释放端口并启动真实服务器。
+    """
+
+    def __init__(self, multi_server_manager):
+        self.multi_server_manager = multi_server_manager
+        self.check_interval = 30
+        self.sleeping_motd = "服务器休眠中，加入游戏即可唤醒"
+        self.listeners: Dict[str, HibernationListener] = {}
+        self.monitoring = False
+        self.monitor_thread = None
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+
+    def start_monitoring(self):
+        """开始空闲检查"""
+        if self.monitoring:
+            return
+
+        self.monitoring = True
+        self._stop_event.clear()
+        self.monitor_thread = threading.Thread(target=self._monitor_loop, daemon=True)
+        self.monitor_thread.start()
+
+    def stop_monitoring(self, wake_all: bool = False):
+        """停止空闲检查并关闭所有监听器"""
+        self.monitoring = False
+        self._stop_event.set()
+        if self.monitor_thread:
+            self.monitor_thread.join(timeout=5)
+
+        for server_id in list(self.listeners):
+            server = self.multi_server_manager.get_server(server_id)
+            if wake_all and server:
+                self.wake(server)
+            else:
+                self._close_listener(server_id)
+                if server:
+                    server.hibernating = False
+
+    def _monitor_loop(self):
+        """检查循环"""
+        while self.monitoring:
+            try:
+                for server in self.multi_server_manager.get_all_servers():
+                    if self.should_hibernate(server):
+                        self.hibernate(server)
+            except Exception as e:
+                print(f"休眠检查出错: {e}")
+
+            self._stop_event.wait(self.check_interval)
+
+    def get_idle_seconds(self, server) -> float:
+        """服务器无玩家的持续时间（秒），有玩家在线或没有输出读取线程（无法得知在线人数）时为0"""
+        if not server.is_running() or not server.player_manager:
+            return 0.0
+        if not (server.output_thread and server.output_thread.is_alive()):
+            return 0.0
+        if server.get_online_player_count() > 0:
+            return 0.0
+        return time.time() - server.player_manager.last_activity_time
+
+    def should_hibernate(self, server) -> bool:
+        """判断服务器是否应进入休眠"""
+        if server.hibernate_after_minutes <= 0 or server.hibernating:
+            return False
+        return self.get_idle_seconds(server) >= server.hibernate_after_minutes * 60
+
+    def hibernate(self, server) -> bool:
+        """正常停止服务器并让监听器接管端口"""
+        with self._lock:
+            if server.hibernating:
+                return False
+            print(f"服务器 {server.name} 空闲，进入休眠")
+            if server.is_running() and not server.stop():
+                return False
+
+            server.hibernating = True
+            try:
+                self._open_listener(server)
+            except OSError as e:
+                print(f"休眠监听器启动失败: {e}")
+                server.hibernating = False
+                return False
+            return True
+
+    def wake(self, server) -> bool:
+        """释放端口并启动真实服务器"""
+        with self._lock:
+            if not server.hibernating:
+                return False
+            print(f"唤醒服务器 {server.name}")
+            self._close_listener(server.server_id)
+            server.hibernating = False
+
+            try:
+                started = server.start()
+            except Exception as e:
+                print(f"唤醒服务器失败: {e}")
+                started = False
+
+            if started:
+                return True
+
+            # 启动失败，重新接管端口
+            server.hibernating = True
+            try:
+                self._open_listener(server)
+            except OSError as e:
+                print(f"休眠监听器启动失败: {e}")
+                server.hibernating = False
+            return False
+
+    def _open_listener(self, server):
+        """为服务器打开休眠监听器"""
+        try:
+            max_players = int(server.manager.get_config_value("max_players"))
+        except (TypeError, ValueError):
+            max_players = 20
+
+        listener = HibernationListener(
+            port=server.port,
+            motd=self.sleeping_motd,
+            max_players=max_players,
+            on_wake=lambda: self.wake(server)
+        )
+        listener.start()
+        self.listeners[server.server_id] = listener
+
+    def _close_listener(self, server_id: str):
+        """关闭服务器的休眠监听器"""
+        listener = self.listeners.pop(server_id, None)
+        if listener:
+            listener.stop()
+
+    def get_hibernating_servers(self):
+        """获取休眠中的服务器"""
+        return [s for s in self.multi_server_manager.get_all_servers() if s.hibernating]
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+基于清单的增量备份模块
+"""
+
+import os
+import json
+import hashlib
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, List, Optional, Tuple, Iterable
+
+from parallel_archive import MANIFEST_NAME, ThreadLocalZips
+
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def _scan_one_directory(directory: str, skip_dirs: Iterable[str],
+                        skip_suffixes: Tuple[str, ...]) -> Tuple[List[Tuple[str, int, int]], List[str]]:
+    """扫描单个目录，返回 (文件列表[(路径, 大小, mtime_ns)], 子目录列表)"""
+    files = []
+    sub_dirs = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name not in skip_dirs:
+                            sub_dirs.append(entry.path)
+                    elif entry.is_file():
+                        if entry.name.endswith(skip_suffixes):
+                            continue
+                        stat = entry.stat()
+                        files.append((entry.path, stat.st_size, stat.st_mtime_ns))
+                except OSError:
+                    continue
+    except OSError as e:
+        print(f"扫描目录失败 {directory}: {e}")
+    return files, sub_dirs
+
+
+def scan_directory(server_directory: str, skip_dirs: Iterable[str] = (), skip_suffixes: Tuple[str, ...] = (),
+                   max_workers: int = 8) -> Dict[str, Tuple[str, int, int]]:
+    """并行扫描目录树
+
+    返回 {归档内路径: (文件路径, 大小, mtime_ns)}，归档内路径统一使用 "/" 分隔。
+    """
+    skip_dirs = set(skip_dirs)
+    result = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {executor.submit(_scan_one_directory, server_directory, skip_dirs, skip_suffixes)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                files, sub_dirs = future.result()
+                for path, size, mtime_ns in files:
+                    arc_path = os.path.relpath(path, server_directory).replace(os.sep, '/')
+                    result[arc_path] = (path, size, mtime_ns)
+                for sub_dir in sub_dirs:
+                    pending.add(executor.submit(_scan_one_directory, sub_dir, skip_dirs, skip_suffixes))
+    return result
+
+
+def hash_file(file_path: str) -> str:
+    """计算文件SHA-256"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def write_file_with_hash(zipf: zipfile.ZipFile, file_path: str, arc_path: str, mtime_ns: int,
+                         throttle=None) -> str:
+    """写入ZIP的同时计算哈希，文件只读取一次"""
+    digest = hashlib.sha256()
+    info = zipfile.ZipInfo.from_file(file_path, arc_path)
+    info.compress_type = zipf.compression
+    with open(file_path, 'rb') as src, zipf.open(info, 'w', force_zip64=True) as dst:
+        for block in iter(lambda: src.read(HASH_BLOCK_SIZE), b""):
+            if throttle:
+                throttle.consume(len(block))
+            digest.update(block)
+            dst.write(block)
+    return digest.hexdigest()
+
+
+def load_archive_manifest(archive_path: str) -> Optional[Dict]:
+    """读取归档内的清单"""
+    try:
+        with zipfile.ZipFile(archive_path, 'r') as zipf:
+            with zipf.open(MANIFEST_NAME) as f:
+                return json.loads(f.read().decode('utf-8'))
+    except (KeyError, OSError, zipfile.BadZipFile, ValueError):
+        return None
+
+
+def create_incremental_archive(server_directory: str, archive_path: str, backup_id: str,
+                               previous: Optional[Dict] = None, parent_id: str = "",
+                               skip_dirs: Iterable[str] = (), skip_suffixes: Tuple[str, ...] = (),
+                               max_workers: int = 8, compression: int = zipfile.ZIP_DEFLATED,
+                               throttle=None) -> Dict:
+    """创建增量归档
+
+    previous 为父备份的清单；为 None 时创建完整备份。
+    大小和 mtime_ns 都未变化的文件直接沿用父清单中的哈希和所在归档，只有变化的文件会被读取。
+    """
+    scanned = scan_directory(server_directory, skip_dirs, skip_suffixes, max_workers)
+    previous_files = previous.get("files", {}) if previous else {}
+
+    files = {}
+    changed = 0
+    changed_bytes = 0
+    with zipfile.ZipFile(archive_path, 'w', compression) as zipf:
+        for arc_path in sorted(scanned):
+            file_path, size, mtime_ns = scanned[arc_path]
+            old = previous_files.get(arc_path)
+            if old and old["size"] == size and old["mtime_ns"] == mtime_ns:
+                files[arc_path] = old
+                continue
+
+            try:
+                digest = write_file_with_hash(zipf, file_path, arc_path, mtime_ns, throttle)
+            except OSError as e:
+                print(f"跳过无法读取的文件 {arc_path}: {e}")
+                continue
+
+            files[arc_path] = {
+                "size": size,
+                "mtime_ns": mtime_ns,
+                "hash": digest,
+                "backup_id": backup_id
+            }
+            changed += 1
+            changed_bytes += size
+
+        manifest = {
+            "backup_id": backup_id,
+            "parent_id": parent_id if previous else "",
+            "chain_length": (previous.get("chain_length", 0) + 1) if previous else 0,
+            "changed_files": changed,
+            "changed_bytes": changed_bytes,
+            "files": files
+        }
+        zipf.writestr(MANIFEST_NAME, json.dumps(manifest, ensure_ascii=False))
+
+    return manifest
+
+
+def referenced_backups(manifest: Dict) -> set:
+    """清单引用到的所有归档（包括自身）"""
+    referenced = {entry["backup_id"] for entry in manifest.get("files", {}).values()}
+    referenced.add(manifest["backup_id"])
+    return referenced
+
+
+def _copy_member_checked(zipf: zipfile.ZipFile, arc_path: str, target_path: str, expected_hash: str):
+    """解压单个文件到临时文件，校验SHA-256后替换目标"""
+    os.makedirs(os.path.dirname(target_path) or ".", exist_ok=True)
+    temp_path = target_path + ".restore.tmp"
+    digest = hashlib.sha256()
+    try:
+        with zipf.open(arc_path) as src, open(temp_path, 'wb') as dst:
+            for block in iter(lambda: src.read(HASH_BLOCK_SIZE), b""):
+                digest.update(block)
+                dst.write(block)
+        if digest.hexdigest() != expected_hash:
+            raise zipfile.BadZipFile(f"哈希校验失败: {arc_path}")
+        os.replace(temp_path, target_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def restore_incremental(manifest: Dict, archive_paths: Dict[str, str], target_directory: str,
+                        paths: Optional[Iterable[str]] = None, max_workers: int = 4):
+    """按清单从增量链多线程还原到目标目录，每个文件写入时校验哈希
+
+    archive_paths 为 {备份ID: 归档路径}；paths 指定时只还原这些文件。
+    """
+    wanted = manifest["files"] if paths is None else {p: manifest["files"][p] for p in paths}
+
+    missing = {e["backup_id"] for e in wanted.values()
+               if e["backup_id"] not in archive_paths or not os.path.exists(archive_paths[e["backup_id"]])}
+    if missing:
+        raise FileNotFoundError(f"增量链缺少归档: {', '.join(sorted(missing))}")
+
+    zips = ThreadLocalZips()
+
+    def restore(arc_path: str):
+        entry = wanted[arc_path]
+        target_path = os.path.join(target_directory, *arc_path.split('/'))
+        zipf = zips.get(archive_paths[entry["backup_id"]])
+        _copy_member_checked(zipf, arc_path, target_path, entry["hash"])
+        try:
+            os.utime(target_path, ns=(entry["mtime_ns"], entry["mtime_ns"]))
+        except OSError:
+            pass
+
+    ordered = sorted(wanted, key=lambda p: wanted[p]["size"], reverse=True)
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for _ in executor.map(restore, ordered):
+                pass
+    finally:
+        zips.close()
+
+
+def verify_incremental_archive(manifest: Dict, archive_path: str, throttle=None) -> Tuple[bool, str]:
+    """校验增量归档中本次备份写入的文件，返回 (是否完好, 错误信息)"""
+    own_files = {p: e for p, e in manifest["files"].items() if e["backup_id"] == manifest["backup_id"]}
+    try:
+        with zipfile.ZipFile(archive_path, 'r') as zipf:
+            for arc_path, entry in own_files.items():
+                digest = hashlib.sha256()
+                with zipf.open(arc_path) as src:
+                    for block in iter(lambda: src.read(HASH_BLOCK_SIZE), b""):
+                        digest.update(block)
+                        if throttle:
+                            throttle.consume(len(block))
+                if digest.hexdigest() != entry["hash"]:
+                    return False, f"哈希校验失败: {arc_path}"
+        return True, ""
+    except Exception as e:
+        return False, str(e)
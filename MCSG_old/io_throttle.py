@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+备份I/O限速模块
+"""
+
+import os
+import sys
+import time
+import threading
+import multiprocessing
+from typing import Dict, List
+
+
+THREAD_MODE_BACKGROUND_BEGIN = 0x00010000
+THREAD_PRIORITY_BELOW_NORMAL = -1
+# 依次尝试的TPS查询命令：Paper/Spigot 的 tps，原版1.20.3起的 tick query
+TPS_QUERY_COMMANDS = ("tps", "tick query")
+
+
+class TokenBucket:
+    """令牌桶限速器（多线程共享）
+
+    rate 为每秒字节数，0 表示不限速；capacity 为允许的突发字节数。
+    """
+
+    def __init__(self, rate: float = 0, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1024 * 1024)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def set_rate(self, rate: float):
+        """调整速率"""
+        with self._lock:
+            self._refill()
+            self.rate = rate
+            self.capacity = max(rate, 1024 * 1024)
+            self._tokens = min(self._tokens, self.capacity)
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def consume(self, amount: int):
+        """取走 amount 字节的令牌，不足时阻塞等待"""
+        while True:
+            with self._lock:
+                if self.rate <= 0:
+                    return
+                self._refill()
+                if self._tokens >= amount or self._tokens >= self.capacity:
+                    # 大于桶容量的请求在桶满时放行并透支，避免永远等不到
+                    self._tokens -= amount
+                    return
+                wait = (min(amount, self.capacity) - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def _io_priority_args(io_class: str):
+    """把 "idle"/"low" 转换为 psutil.ionice 参数"""
+    import psutil
+    if hasattr(psutil, "IOPRIO_CLASS_IDLE"):  # Linux
+        if io_class == "idle":
+            return (psutil.IOPRIO_CLASS_IDLE,)
+        return (psutil.IOPRIO_CLASS_BE, 7)
+    return (psutil.IOPRIO_VERYLOW if io_class == "idle" else psutil.IOPRIO_LOW,)  # Windows
+
+
+def _lower_windows_thread_priority():
+    """Windows：把当前线程切换到后台模式（同时降低CPU和I/O优先级），不影响进程内其他线程"""
+    import ctypes
+    kernel32 = ctypes.windll.kernel32
+    thread = kernel32.GetCurrentThread()
+    if not kernel32.SetThreadPriority(thread, THREAD_MODE_BACKGROUND_BEGIN):
+        kernel32.SetThreadPriority(thread, THREAD_PRIORITY_BELOW_NORMAL)
+
+
+def lower_current_priority(nice: int = 10, io_class: str = "low"):
+    """降低当前线程的CPU与I/O优先级（在子工作进程中降低整个进程）
+
+    Linux 下 nice 和 ionice 都是按线程生效的；Windows 下线程池使用线程后台模式。
+    只有在 multiprocessing 子进程中才修改整个进程的优先级，管理器进程（界面和之后
+    启动的服务器会继承它的优先级）不受影响。其他平台的线程池不做调整。
+    """
+    in_worker_process = multiprocessing.parent_process() is not None
+    if sys.platform.startswith("linux"):
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), nice)
+        except OSError as e:
+            print(f"设置备份线程nice失败: {e}")
+    elif not in_worker_process:
+        if sys.platform == "win32":
+            try:
+                _lower_windows_thread_priority()
+            except Exception as e:
+                print(f"设置备份线程优先级失败: {e}")
+        return
+
+    try:
+        import psutil
+        if sys.platform.startswith("linux"):
+            psutil.Process(threading.get_native_id()).ionice(*_io_priority_args(io_class))
+        else:
+            target = psutil.Process()
+            target.nice(psutil.BELOW_NORMAL_PRIORITY_CLASS if hasattr(psutil, "BELOW_NORMAL_PRIORITY_CLASS") else nice)
+            if hasattr(target, "ionice"):
+                target.ionice(*_io_priority_args(io_class))
+    except ImportError:
+        pass
+    except Exception as e:
+        print(f"设置备份I/O优先级失败: {e}")
+
+
+class AdaptiveThrottle(TokenBucket):
+    """根据实例MSPT自动调整速率的限速器
+
+    每隔 interval 秒查询一次TPS/MSPT：MSPT超过 target_mspt 时速率减半（不低于 min_rate），
+    低于目标的80%时速率增加25%（不超过 max_rate）。同时记录备份期间的MSPT用于统计。
+    实例的查询命令连续 max_misses 次没有输出时换用下一个命令（原版没有 tps），
+    全部无效时打印提示并按固定速率限速。
+    """
+
+    def __init__(self, server, max_rate: float, min_rate: float = 4 * 1024 * 1024,
+                 target_mspt: float = 40.0, interval: float = 5.0):
+        super().__init__(max_rate)
+        self.server = server
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.target_mspt = target_mspt
+        self.interval = interval
+        self.max_misses = 3
+        self.adaptive = True
+        self.samples: List[float] = []
+        self.baseline_mspt = 0.0
+        self.consumed = 0
+        self.started_at = 0.0
+        self.finished_at = 0.0
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def current_mspt(self) -> float:
+        """实例当前的MSPT（只有TPS时由TPS换算），没有数据时返回0"""
+        mspt = getattr(self.server, "mspt", 0.0)
+        if mspt > 0:
+            return mspt
+        tps = getattr(self.server, "tps", 0.0)
+        return 1000.0 / tps if tps > 0 else 0.0
+
+    def consume(self, amount: int):
+        self.consumed += amount
+        super().consume(amount)
+
+    def start(self):
+        self.started_at = time.time()
+        self.baseline_mspt = self.current_mspt()
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._adjust_loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.finished_at = time.time()
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=self.interval + 1)
+
+    def _next_tps_command(self, tried: set) -> bool:
+        """换用下一个还没试过的TPS查询命令"""
+        for command in TPS_QUERY_COMMANDS:
+            if command not in tried:
+                self.server.tps_command = command
+                return True
+        return False
+
+    def _adjust_loop(self):
+        tried = {getattr(self.server, "tps_command", "")}
+        misses = 0
+        while not self._stop_event.wait(self.interval):
+            if not self.server.is_running():
+                continue
+            stats_time = getattr(self.server, "stats_time", 0.0)
+            sent = self.server.request_tps()
+            if self._stop_event.wait(1.0):
+                break
+            if not sent or getattr(self.server, "stats_time", 0.0) == stats_time:
+                # 没有拿到新数据
+                misses += 1
+                if misses >= self.max_misses:
+                    misses = 0
+                    if not self._next_tps_command(tried):
+                        self.adaptive = False
+                        print(f"实例 {getattr(self.server, 'name', '')} 没有TPS/MSPT输出"
+                              f"（原版1.20.3以前不支持查询），自适应限速不可用，"
+                              f"按 {self.rate / 1024 / 1024:.1f} MB/s 固定限速")
+                        return
+                    tried.add(self.server.tps_command)
+                continue
+            misses = 0
+
+            mspt = self.current_mspt()
+            self.samples.append(mspt)
+            if mspt > self.target_mspt:
+                self.set_rate(max(self.min_rate, self.rate / 2))
+            elif mspt < self.target_mspt * 0.8 and self.rate < self.max_rate:
+                self.set_rate(min(self.max_rate, self.rate * 1.25))
+
+    def metrics(self) -> Dict:
+        """备份耗时与对tick的影响"""
+        duration = (self.finished_at or time.time()) - self.started_at
+        average = sum(self.samples) / len(self.samples) if self.samples else 0.0
+        return {
+            "duration_seconds": round(duration, 2),
+            "bytes_read": self.consumed,
+            "average_rate": round(self.consumed / duration) if duration > 0 else 0,
+            "final_rate": round(self.rate),
+            "adaptive": self.adaptive,
+            "mspt_baseline": round(self.baseline_mspt, 2),
+            "mspt_average": round(average, 2),
+            "mspt_max": round(max(self.samples), 2) if self.samples else 0.0,
+            "mspt_increase": round(average - self.baseline_mspt, 2) if self.samples and self.baseline_mspt else 0.0
+        }
@@ -8,7 +8,7 @@ import os
 import json
 import subprocess
 import configparser
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List, Callable
 
 
 class MinecraftServerManager:
@@ -17,6 +17,7 @@ class MinecraftServerManager:
     def __init__(self, config_file: str = "server_config.json"):
         self.config_file = config_file
         self.server_process: Optional[subprocess.Popen] = None
+        self.output_callbacks: List[Callable[[str], None]] = []
         self.default_config = {
             "memory": "2G",
             "core": "server.jar",
@@ -274,15 +275,33 @@ class MinecraftServerManager:
             print(f"发送命令失败: {e}")
             return False
     
+    def add_output_callback(self, callback: Callable[[str], None]):
+        """添加服务器输出行回调"""
+        if callback not in self.output_callbacks:
+            self.output_callbacks.append(callback)
+    
+    def remove_output_callback(self, callback: Callable[[str], None]):
+        """移除服务器输出行回调"""
+        if callback in self.output_callbacks:
+            self.output_callbacks.remove(callback)
+    
     def read_server_output(self) -> Optional[str]:
         """读取服务器输出"""
         if not self.is_server_running():
             return None
         
         try:
-            return self.server_process.stdout.readline()
+            line = self.server_process.stdout.readline()
         except Exception:
             return None
+        
+        if line:
+            for callback in list(self.output_callbacks):
+                try:
+                    callback(line)
+                except Exception as e:
+                    print(f"服务器输出回调错误: {e}")
+        return line
 
 
 def main():
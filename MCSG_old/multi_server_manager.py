@@ -6,40 +6,162 @@
 
 import json
 import os
+import re
 import uuid
+import socket
+import time
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 from typing import Dict, List, Optional
 from mc_server_manager import MinecraftServerManager
+from player_manager import PlayerManager
 from server_template import ServerTemplate, ServerTemplateManager
+from world_stats import WorldStats, world_stats_cache
+from hibernation_manager import HibernationManager
+from region_compactor import compact_world, format_compact_report
+from world_pruner import DEFAULT_SPAWN_RADIUS, DEFAULT_THRESHOLD_TICKS, ProtectedArea, format_prune_report, \
+    prune_world
+
+
+# Paper/Spigot "tps" 命令输出:  "TPS from last 1m, 5m, 15m: 20.0, 19.98, 19.95"
+TPS_PATTERN = re.compile(r'TPS from last 1m, 5m, 15m:\s*\*?([\d.]+)')
+# 原版 "tick query" 命令输出:  "Average time per tick: 3.2ms (Target: 50.0ms)"
+MSPT_PATTERN = re.compile(r'Average time per tick:\s*([\d.]+)\s*ms')
+# 启动完成:  "[12:00:00] [Server thread/INFO]: Done (12.345s)! For help, type "help""
+SERVER_READY_PATTERN = re.compile(r'\]:\s+Done \([\d.,]+s\)!')
+COLOR_CODE_PATTERN = re.compile(r'\u00a7[0-9a-fk-or]', re.IGNORECASE)
+SAVE_COMPLETE_PATTERN = re.compile(r'Saved the (?:game|world)')
+REPLACEMENT_SUFFIX_PATTERN = re.compile(r'-r(\d+)$')
+
+# 启动时需要切换工作目录，多线程启动实例时必须串行
+_start_lock = threading.Lock()
+
+
+@dataclass
+class RollingRestartStep:
+    """滚动重启中单个实例的替换结果"""
+    server_id: str
+    server_name: str
+    replacement_id: str = ""  # 替身创建时的ID；remove_old 时替身最终沿用 server_id
+    success: bool = False
+    error: str = ""
+    players_moved: int = 0
+    timings: Dict[str, float] = field(default_factory=dict)  # 步骤 -> 秒
+    
+    def to_dict(self) -> Dict:
+        return {
+            "server_id": self.server_id,
+            "server_name": self.server_name,
+            "replacement_id": self.replacement_id,
+            "success": self.success,
+            "error": self.error,
+            "players_moved": self.players_moved,
+            "timings": self.timings
+        }
+
+
+@dataclass
+class RollingRestartReport:
+    """滚动重启报告"""
+    started_at: float
+    max_unavailable: int
+    total_seconds: float = 0.0
+    steps: List[RollingRestartStep] = field(default_factory=list)
+    
+    @property
+    def success(self) -> bool:
+        return all(step.success for step in self.steps)
+    
+    def to_dict(self) -> Dict:
+        return {
+            "started_at": self.started_at,
+            "max_unavailable": self.max_unavailable,
+            "total_seconds": self.total_seconds,
+            "success": self.success,
+            "steps": [step.to_dict() for step in self.steps]
+        }
 
 
 class ServerInstance:
     """服务器实例类"""
     
-    def __init__(self, server_id: str, name: str, directory: str, config: Dict[str, str]):
+    instance_type = "server"
+    manager_class = MinecraftServerManager
+    
+    def __init__(self, server_id: str, name: str, directory: str, config: Dict[str, str],
+                 hibernate_after_minutes: int = 0, protected_areas: Optional[List[Dict]] = None):
         self.server_id = server_id
         self.name = name
         self.directory = directory
         self.config = config
+        self.hibernate_after_minutes = hibernate_after_minutes  # 0 表示不休眠
+        self.protected_areas = protected_areas or []  # 清理区块时保护的区域（ProtectedArea 字典）
+        self.hibernating = False
+        self.maintenance = ""  # 离线维护的原因，维护期间不允许启动
         self.manager: Optional[MinecraftServerManager] = None
+        self.player_manager: Optional[PlayerManager] = None
+        self.output_thread = None
+        self.tps_command = "tps"  # 原版1.20.3+可改为 "tick query"
+        self.tps = 0.0
+        self.mspt = 0.0
+        self.stats_time = 0.0
+        self.ready = False
+        self._ready_event = threading.Event()
         self._initialize_manager()
     
     def _initialize_manager(self):
         """初始化服务器管理器"""
         config_file = os.path.join(self.directory, "server_config.json")
-        self.manager = MinecraftServerManager(config_file)
+        self.manager = self.manager_class(config_file)
         
         # 应用配置
         for key, value in self.config.items():
             self.manager.set_config_value(key, value)
         self.manager.save_config()
+        
+        # 根据服务器输出跟踪在线玩家
+        self.player_manager = PlayerManager(self.directory, self.manager)
+        self.manager.add_output_callback(self.player_manager.process_output_line)
+        self.manager.add_output_callback(self._process_output_line)
+    
+    def _process_output_line(self, line: str):
+        """从服务器输出中解析启动完成与TPS/MSPT"""
+        line = COLOR_CODE_PATTERN.sub('', line)
+        if not self.ready and SERVER_READY_PATTERN.search(line):
+            self.ready = True
+            self._ready_event.set()
+            return
+        
+        match = TPS_PATTERN.search(line)
+        if match:
+            self.tps = min(float(match.group(1)), 20.0)
+            self.stats_time = time.time()
+            return
+        
+        match = MSPT_PATTERN.search(line)
+        if match:
+            self.mspt = float(match.group(1))
+            if self.mspt > 0:
+                self.tps = min(1000.0 / self.mspt, 20.0)
+            self.stats_time = time.time()
+    
+    def request_tps(self) -> bool:
+        """发送TPS查询命令，结果通过输出解析更新"""
+        return self.send_command(self.tps_command)
     
     def to_dict(self) -> Dict:
         """转换为字典"""
         return {
+            "instance_type": self.instance_type,
             "server_id": self.server_id,
             "name": self.name,
             "directory": self.directory,
-            "config": self.config
+            "config": self.config,
+            "hibernate_after_minutes": self.hibernate_after_minutes,
+            "protected_areas": self.protected_areas
         }
     
     @classmethod
@@ -49,9 +171,19 @@ class ServerInstance:
             server_id=data["server_id"],
             name=data["name"],
             directory=data["directory"],
-            config=data["config"]
+            config=data["config"],
+            hibernate_after_minutes=data.get("hibernate_after_minutes", 0),
+            protected_areas=data.get("protected_areas", [])
         )
     
+    @property
+    def port(self) -> int:
+        """服务器端口"""
+        try:
+            return int(self.config.get("port") or self.manager.get_config_value("port"))
+        except (TypeError, ValueError):
+            return 25565
+    
     def is_running(self) -> bool:
         """检查服务器是否运行"""
         return self.manager.is_server_running() if self.manager else False
@@ -60,14 +192,103 @@ class ServerInstance:
         """启动服务器"""
         if not self.manager:
             return False
+        if self.maintenance:
+            print(f"服务器 {self.name} 正在维护（{self.maintenance}），暂不启动")
+            return False
+        
+        if self.player_manager:
+            self.player_manager.reset_online_status()
+        self.ready = False
+        self._ready_event.clear()
         
         # 切换到服务器目录
-        original_dir = os.getcwd()
+        with _start_lock:
+            original_dir = os.getcwd()
+            try:
+                os.chdir(self.directory)
+                started = self.manager.start_server()
+            finally:
+                os.chdir(original_dir)
+        if started:
+            self.start_output_reader()
+        return started
+    
+    def start_output_reader(self):
+        """启动后台输出读取线程（每个实例只有这一个线程读取标准输出，界面通过输出回调获取）"""
+        if self.output_thread and self.output_thread.is_alive():
+            return
+        
+        self.output_thread = threading.Thread(target=self._output_worker, daemon=True)
+        self.output_thread.start()
+    
+    def _output_worker(self):
+        """输出读取线程，输出行通过管理器回调分发"""
+        while self.is_running():
+            if not self.read_output():
+                time.sleep(0.1)
+    
+    def wait_until_ready(self, timeout: float = 300) -> bool:
+        """等待服务器启动完成（需要有线程读取输出）"""
+        return self._ready_event.wait(timeout) and self.is_running()
+    
+    def wait_for_output(self, pattern, timeout: float = 30, command: str = None) -> Optional[str]:
+        """等待匹配的输出行，可选在开始等待后发送命令，超时返回None"""
+        regex = re.compile(pattern) if isinstance(pattern, str) else pattern
+        matched = threading.Event()
+        result = {}
+        
+        def callback(line: str):
+            if not matched.is_set() and regex.search(line):
+                result["line"] = line
+                matched.set()
+        
+        self.manager.add_output_callback(callback)
+        try:
+            if command and not self.send_command(command):
+                return None
+            if matched.wait(timeout):
+                return result["line"]
+            return None
+        finally:
+            self.manager.remove_output_callback(callback)
+    
+    @contextmanager
+    def saves_paused(self, timeout: float = 60):
+        """关闭自动保存并把世界落盘，退出时保证恢复自动保存
+        
+        在超时内没有看到保存完成的日志时抛出 TimeoutError。
+        """
+        if not self.send_command("save-off"):
+            raise RuntimeError("发送 save-off 命令失败")
+        try:
+            if self.wait_for_output(SAVE_COMPLETE_PATTERN, timeout=timeout, command="save-all flush") is None:
+                raise TimeoutError("等待世界保存完成超时")
+            yield
+        finally:
+            self.send_command("save-on")
+    
+    @contextmanager
+    def maintenance_mode(self, reason: str):
+        """离线维护：要求实例已停止，维护期间 start（包括休眠唤醒）会被拒绝"""
+        if self.is_running():
+            raise RuntimeError(f"服务器 {self.name} 正在运行，请先停止")
+        if self.maintenance:
+            raise RuntimeError(f"服务器 {self.name} 正在维护（{self.maintenance}）")
+        self.maintenance = reason
         try:
-            os.chdir(self.directory)
-            return self.manager.start_server()
+            yield
         finally:
-            os.chdir(original_dir)
+            self.maintenance = ""
+    
+    def get_world_stats(self, max_age: float = 300, block: bool = True) -> Optional[WorldStats]:
+        """世界统计：扫描所有维度的区域文件头（结果缓存 max_age 秒）"""
+        return world_stats_cache.get(self.directory, max_age, block)
+    
+    def get_online_player_count(self) -> int:
+        """获取实时在线玩家数"""
+        if not self.is_running() or not self.player_manager:
+            return 0
+        return self.player_manager.get_online_count()
     
     def stop(self) -> bool:
         """停止服务器"""
@@ -93,7 +314,12 @@ class MultiServerManager:
         self.servers_file = servers_file
         self.servers: Dict[str, ServerInstance] = {}
         self.template_manager = ServerTemplateManager()
+        self._reserved_ports = set()
+        self._port_lock = threading.Lock()
+        self._save_lock = threading.Lock()
         self.load_servers()
+        self.hibernation_manager = HibernationManager(self)
+        self._update_hibernation_monitoring()
     
     def load_servers(self):
         """加载服务器列表"""
@@ -102,19 +328,30 @@ class MultiServerManager:
                 with open(self.servers_file, 'r', encoding='utf-8') as f:
                     data = json.load(f)
                     for server_data in data:
-                        server = ServerInstance.from_dict(server_data)
+                        server = self._instance_from_dict(server_data)
                         self.servers[server.server_id] = server
             except Exception as e:
                 print(f"加载服务器列表失败: {e}")
     
+    @staticmethod
+    def _instance_from_dict(data: Dict) -> ServerInstance:
+        """根据实例类型创建实例"""
+        if data.get("instance_type") == "proxy":
+            from proxy_manager import ProxyInstance
+            return ProxyInstance.from_dict(data)
+        return ServerInstance.from_dict(data)
+    
     def save_servers(self):
-        """保存服务器列表"""
-        try:
-            with open(self.servers_file, 'w', encoding='utf-8') as f:
-                data = [server.to_dict() for server in self.servers.values()]
-                json.dump(data, f, indent=4, ensure_ascii=False)
-        except Exception as e:
-            print(f"保存服务器列表失败: {e}")
+        """保存服务器列表（滚动重启等后台线程也会调用，写入串行进行）"""
+        with self._save_lock:
+            try:
+                data = [server.to_dict() for server in list(self.servers.values())]
+                temp_file = self.servers_file + ".tmp"
+                with open(temp_file, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, indent=4, ensure_ascii=False)
+                os.replace(temp_file, self.servers_file)
+            except Exception as e:
+                print(f"保存服务器列表失败: {e}")
     
     def create_server_advanced(self, name: str, template_name: str = None, directory: str = None, core_file: str = None) -> str:
         """创建新服务器（高级版本）"""
@@ -175,8 +412,8 @@ class MultiServerManager:
         
         return server_id
     
-    def delete_server(self, server_id: str) -> bool:
-        """删除服务器"""
+    def delete_server(self, server_id: str, remove_files: bool = False) -> bool:
+        """删除服务器，remove_files 为 True 时同时删除服务器目录"""
         if server_id not in self.servers:
             return False
         
@@ -190,6 +427,8 @@ class MultiServerManager:
         del self.servers[server_id]
         self.save_servers()
         
+        if remove_files:
+            shutil.rmtree(server.directory, ignore_errors=True)
         return True
     
     def get_server(self, server_id: str) -> Optional[ServerInstance]:
@@ -200,6 +439,32 @@ class MultiServerManager:
         """获取所有服务器"""
         return list(self.servers.values())
     
+    def allocate_port(self, start_port: int = 25565, max_tries: int = 1000) -> int:
+        """分配一个未被已注册服务器占用且可绑定的端口"""
+        with self._port_lock:
+            used_ports = {server.port for server in self.servers.values()} | self._reserved_ports
+            for port in range(start_port, start_port + max_tries):
+                if port in used_ports:
+                    continue
+                try:
+                    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+                        sock.bind(("", port))
+                except OSError:
+                    continue
+                # 在实例注册前保留端口，避免并发分配到同一端口
+                self._reserved_ports.add(port)
+                return port
+        raise RuntimeError(f"没有可用端口 ({start_port}-{start_port + max_tries})")
+    
+    def release_port(self, port: int):
+        """释放保留的端口（实例注册后调用）"""
+        with self._port_lock:
+            self._reserved_ports.discard(port)
+    
+    def get_backend_servers(self) -> List[ServerInstance]:
+        """获取所有游戏服务器（不含代理）"""
+        return [server for server in self.servers.values() if server.instance_type == "server"]
+    
     def get_running_servers(self) -> List[ServerInstance]:
         """获取运行中的服务器"""
         return [server for server in self.servers.values() if server.is_running()]
@@ -218,10 +483,81 @@ class MultiServerManager:
                 "name": server.name,
                 "running": server.is_running(),
                 "port": server.config.get("port", "未知"),
-                "players": server.config.get("max_players", "未知")
+                "players": server.config.get("max_players", "未知"),
+                "online_players": server.get_online_player_count(),
+                "hibernating": server.hibernating
             }
         return status
     
+    def get_world_stats(self, server_id: str, refresh: bool = False) -> Optional[Dict]:
+        """获取服务器的世界统计（各维度区块数、占用、碎片、最后修改时间）"""
+        server = self.servers.get(server_id)
+        if not server:
+            return None
+        stats = server.get_world_stats(max_age=0 if refresh else 300)
+        return stats.to_dict() if stats else None
+    
+    def set_protected_areas(self, server_id: str, areas: List[Dict]) -> bool:
+        """设置清理区块时保护的区域（方块坐标: name, min_x, min_z, max_x, max_z, dimension）"""
+        server = self.servers.get(server_id)
+        if not server:
+            return False
+        try:
+            server.protected_areas = [ProtectedArea.from_dict(area).to_dict() for area in areas]
+        except (KeyError, TypeError, ValueError) as e:
+            print(f"保护区域格式错误: {e}")
+            return False
+        self.save_servers()
+        return True
+    
+    def prune_world(self, server_id: str, threshold_ticks: int = DEFAULT_THRESHOLD_TICKS,
+                    spawn_radius: int = DEFAULT_SPAWN_RADIUS, dry_run: bool = False) -> Optional[Dict]:
+        """删除 InhabitedTime 低于阈值的区块（只能在实例停止时运行），返回清理报告"""
+        server = self.servers.get(server_id)
+        if not server:
+            return None
+        areas = [ProtectedArea.from_dict(area) for area in server.protected_areas]
+        try:
+            with server.maintenance_mode("清理区块"):
+                report = prune_world(server.directory, threshold_ticks, areas, spawn_radius, dry_run=dry_run)
+        except (RuntimeError, OSError) as e:
+            print(f"清理区块失败: {e}")
+            return None
+        
+        print(format_prune_report(report))
+        if not dry_run:
+            server.get_world_stats(max_age=0, block=False)
+        return report.to_dict()
+    
+    def compact_world(self, server_id: str, dry_run: bool = False) -> Optional[Dict]:
+        """整理区域文件：按空间顺序连续重写并去掉空闲扇区（只能在实例停止时运行），返回整理报告"""
+        server = self.servers.get(server_id)
+        if not server:
+            return None
+        try:
+            with server.maintenance_mode("整理区域文件"):
+                report = compact_world(server.directory, dry_run=dry_run)
+        except (RuntimeError, OSError) as e:
+            print(f"整理区域文件失败: {e}")
+            return None
+        
+        print(format_compact_report(report))
+        if not dry_run:
+            server.get_world_stats(max_age=0, block=False)
+        return report.to_dict()
+    
+    def set_hibernation(self, server_id: str, minutes: int):
+        """设置服务器空闲休眠时间（分钟，0表示关闭）"""
+        if server_id in self.servers:
+            self.servers[server_id].hibernate_after_minutes = max(0, int(minutes))
+            self.save_servers()
+            self._update_hibernation_monitoring()
+    
+    def _update_hibernation_monitoring(self):
+        """有实例开启休眠时运行空闲检查"""
+        if any(s.hibernate_after_minutes > 0 for s in self.servers.values()):
+            self.hibernation_manager.start_monitoring()
+    
     def update_server_config(self, server_id: str, config: Dict[str, str]):
         """更新服务器配置"""
         if server_id in self.servers:
@@ -243,6 +579,198 @@ class MultiServerManager:
         source_server = self.servers[source_id]
         return self.create_server(new_name, custom_config=source_server.config.copy())
     
+    def clone_instance(self, source_id: str, new_name: str, config: Dict[str, str]) -> Optional[str]:
+        """从实例目录快照创建新实例（核心文件、eula、插件和世界一起复制），config 为新实例的配置"""
+        server = self.servers.get(source_id)
+        if not server:
+            return None
+        return self._create_replacement(server, new_name, config, "snapshot", None)
+    
+    def create_replacement(self, server_id: str, source: str = "snapshot", template_name: str = None) -> Optional[str]:
+        """为实例创建替身：从目录快照复制，或从模板创建；使用新端口"""
+        server = self.servers.get(server_id)
+        if not server:
+            return None
+        
+        match = REPLACEMENT_SUFFIX_PATTERN.search(server.name)
+        generation = int(match.group(1)) + 1 if match else 1
+        base_name = REPLACEMENT_SUFFIX_PATTERN.sub('', server.name)
+        new_name = f"{base_name}-r{generation}"
+        
+        config = server.config.copy()
+        port = self.allocate_port(server.port + 1)
+        config["port"] = str(port)
+        try:
+            return self._create_replacement(server, new_name, config, source, template_name)
+        finally:
+            self.release_port(port)
+    
+    def _create_replacement(self, server: ServerInstance, new_name: str, config: Dict[str, str],
+                            source: str, template_name: str) -> str:
+        """复制目录或按模板创建替身实例"""
+        if source == "template":
+            # 模板只提供配置，核心文件和 eula.txt 从原实例复制，否则替身无法启动
+            new_id = self.create_server(new_name, template_name, custom_config=config)
+            new_directory = self.servers[new_id].directory
+            core = config.get("core") or server.manager.get_config_value("core")
+            for name in (core, "eula.txt"):
+                source_path = os.path.join(server.directory, name) if name else ""
+                if source_path and not os.path.isabs(name) and os.path.isfile(source_path):
+                    shutil.copy2(source_path, os.path.join(new_directory, name))
+            return new_id
+        
+        new_id = str(uuid.uuid4())
+        new_directory = os.path.join(os.path.dirname(server.directory) or "servers", new_id)
+        ignore = shutil.ignore_patterns('logs', 'cache', 'debug', 'session.lock', '*.log', '*.tmp',
+                                        'server_config.json')
+        
+        if server.is_running():
+            # 关闭自动保存并落盘，保证复制出的世界一致
+            with server.saves_paused():
+                shutil.copytree(server.directory, new_directory, ignore=ignore)
+        else:
+            shutil.copytree(server.directory, new_directory, ignore=ignore)
+        
+        replacement = ServerInstance(new_id, new_name, new_directory, config, server.hibernate_after_minutes,
+                                     list(server.protected_areas))
+        self.servers[new_id] = replacement
+        self.save_servers()
+        return new_id
+    
+    def rolling_restart(self, server_ids: List[str], proxy_manager=None, source: str = "snapshot",
+                        template_name: str = None, max_unavailable_fraction: float = 0.25,
+                        ready_timeout: float = 300, drain_timeout: float = 60,
+                        remove_old: bool = True) -> RollingRestartReport:
+        """滚动重启一组实例
+        
+        每个实例先启动替身并等待就绪，再通过代理把玩家转移过去，最后停止旧实例。
+        同时处于替换中的实例不超过总数的 max_unavailable_fraction（至少1个）。
+        remove_old 为 True 时替身接管旧实例的 server_id（备份计划、备份记录、保留策略、
+        实例池和代理后端都按 server_id 关联，因此保持不变），旧目录（含世界）被删除，
+        需要保留时请先备份；为 False 时只停止旧实例，目录和记录都保留，替身使用新的 server_id。
+        """
+        server_ids = [i for i in server_ids if i in self.servers]
+        max_unavailable = max(1, int(len(server_ids) * max_unavailable_fraction))
+        report = RollingRestartReport(started_at=time.time(), max_unavailable=max_unavailable)
+        start = time.perf_counter()
+        
+        with ThreadPoolExecutor(max_workers=max_unavailable) as executor:
+            futures = [
+                executor.submit(self._replace_instance, server_id, proxy_manager, source,
+                                template_name, ready_timeout, drain_timeout, remove_old)
+                for server_id in server_ids
+            ]
+            report.steps = [future.result() for future in futures]
+        
+        report.total_seconds = time.perf_counter() - start
+        return report
+    
+    def _replace_instance(self, server_id: str, proxy_manager, source: str, template_name: str,
+                          ready_timeout: float, drain_timeout: float, remove_old: bool) -> RollingRestartStep:
+        """替换单个实例并记录每一步耗时"""
+        old = self.servers[server_id]
+        step = RollingRestartStep(server_id=server_id, server_name=old.name)
+        step_start = time.perf_counter()
+        
+        def mark(name: str):
+            nonlocal step_start
+            now = time.perf_counter()
+            step.timings[name] = round(now - step_start, 3)
+            step_start = now
+        
+        new = None
+        old_was_running = old.is_running()
+        try:
+            new_id = self.create_replacement(server_id, source, template_name)
+            if not new_id:
+                raise RuntimeError("创建替身失败")
+            step.replacement_id = new_id
+            new = self.servers[new_id]
+            mark("snapshot")
+            
+            if not new.start():
+                raise RuntimeError("替身启动失败")
+            mark("start")
+            
+            if not new.wait_until_ready(ready_timeout):
+                raise RuntimeError("等待替身就绪超时")
+            mark("ready")
+            
+            if proxy_manager:
+                self._swap_proxy_backend(proxy_manager, server_id, new_id)
+                proxy_manager.sync_all()
+            mark("proxy_sync")
+            
+            if proxy_manager and old.is_running():
+                step.players_moved = self._transfer_players(proxy_manager, old, new, drain_timeout)
+            mark("transfer")
+            
+            if old.is_running():
+                old.stop()
+            mark("stop")
+            
+            if remove_old:
+                self._adopt_server_id(new, server_id)
+                if proxy_manager:
+                    self._swap_proxy_backend(proxy_manager, new_id, server_id)
+                shutil.rmtree(old.directory, ignore_errors=True)
+            if proxy_manager:
+                proxy_manager.sync_all()
+            step.success = True
+        except Exception as e:
+            step.error = str(e)
+            print(f"滚动重启 {old.name} 失败: {e}")
+            # 回滚：保留旧实例，清理替身，并把指向替身的代理配置改回旧实例
+            if new and new.server_id != server_id and server_id in self.servers:
+                if new.is_running():
+                    new.stop()
+                if old_was_running and not old.is_running():
+                    old.start()
+                if proxy_manager:
+                    self._swap_proxy_backend(proxy_manager, new.server_id, server_id)
+                self.delete_server(new.server_id, remove_files=True)
+                if proxy_manager:
+                    proxy_manager.sync_all()
+        
+        step.timings["total"] = round(sum(v for k, v in step.timings.items() if k != "total"), 3)
+        return step
+    
+    def _adopt_server_id(self, new: ServerInstance, server_id: str):
+        """替身接管已停止的旧实例的 server_id，替换旧记录"""
+        with self._save_lock:
+            old_id = new.server_id
+            self.servers[server_id] = new
+            self.servers.pop(old_id, None)
+            new.server_id = server_id
+        self.save_servers()
+    
+    def _swap_proxy_backend(self, proxy_manager, old_id: str, new_id: str):
+        """在显式指定后端的代理中用新实例替换旧实例"""
+        changed = False
+        for proxy in proxy_manager.get_proxies():
+            if old_id in proxy.backend_ids:
+                proxy.backend_ids = [new_id if i == old_id else i for i in proxy.backend_ids]
+                changed = True
+        if changed:
+            self.save_servers()
+    
+    def _transfer_players(self, proxy_manager, old: ServerInstance, new: ServerInstance,
+                          drain_timeout: float) -> int:
+        """通过代理转移玩家，等待旧实例排空"""
+        players = sorted(old.player_manager.online_players) if old.player_manager else []
+        proxies = [p for p in proxy_manager.get_proxies() if p.is_running()]
+        for proxy in proxies:
+            target = proxy_manager.backend_names(proxy).get(new.server_id)
+            if not target:
+                continue
+            for username in players:
+                proxy.transfer_player(username, target)
+        
+        deadline = time.time() + drain_timeout
+        while old.get_online_player_count() > 0 and time.time() < deadline:
+            time.sleep(0.5)
+        return len(players) - old.get_online_player_count()
+    
     def import_from_template(self, name: str, template_name: str) -> str:
         """从模板导入服务器"""
         return self.create_server(name, template_name)
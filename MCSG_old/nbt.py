@@ -0,0 +1,609 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+NBT（Named Binary Tag）读写模块
+
+支持gzip、zlib和未压缩的大端序NBT（level.dat、玩家数据、区块）。
+读取在解压后的缓冲区上按偏移进行：按路径查询（如 Level.InhabitedTime、Data.Version）
+时不需要的子树直接跳过，不会构建对象；打包在长整型数组里的方块状态可用numpy解码。
+"""
+
+import os
+import sys
+import gzip
+import zlib
+import array
+import struct
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+try:
+    import numpy as np
+except ImportError:  # 没有numpy时数组标签用 array.array 表示，打包数组逐个解码
+    np = None
+
+
+TAG_END = 0
+TAG_BYTE = 1
+TAG_SHORT = 2
+TAG_INT = 3
+TAG_LONG = 4
+TAG_FLOAT = 5
+TAG_DOUBLE = 6
+TAG_BYTE_ARRAY = 7
+TAG_STRING = 8
+TAG_LIST = 9
+TAG_COMPOUND = 10
+TAG_INT_ARRAY = 11
+TAG_LONG_ARRAY = 12
+
+TAG_NAMES = {
+    TAG_END: "End", TAG_BYTE: "Byte", TAG_SHORT: "Short", TAG_INT: "Int", TAG_LONG: "Long",
+    TAG_FLOAT: "Float", TAG_DOUBLE: "Double", TAG_BYTE_ARRAY: "ByteArray", TAG_STRING: "String",
+    TAG_LIST: "List", TAG_COMPOUND: "Compound", TAG_INT_ARRAY: "IntArray", TAG_LONG_ARRAY: "LongArray"
+}
+
+_USHORT = struct.Struct(">H")
+_INT = struct.Struct(">i")
+_SCALARS = {
+    TAG_BYTE: struct.Struct(">b"),
+    TAG_SHORT: struct.Struct(">h"),
+    TAG_INT: _INT,
+    TAG_LONG: struct.Struct(">q"),
+    TAG_FLOAT: struct.Struct(">f"),
+    TAG_DOUBLE: struct.Struct(">d")
+}
+_FIXED_SIZES = {tag_type: s.size for tag_type, s in _SCALARS.items()}
+_LIST_FORMATS = {TAG_BYTE: "b", TAG_SHORT: "h", TAG_INT: "i", TAG_LONG: "q", TAG_FLOAT: "f", TAG_DOUBLE: "d"}
+_ARRAY_ITEM_SIZES = {TAG_BYTE_ARRAY: 1, TAG_INT_ARRAY: 4, TAG_LONG_ARRAY: 8}
+_ARRAY_TYPECODES = {TAG_INT_ARRAY: "i", TAG_LONG_ARRAY: "q"}
+_INT_RANGES = {
+    TAG_BYTE: (-2 ** 7, 2 ** 7), TAG_SHORT: (-2 ** 15, 2 ** 15),
+    TAG_INT: (-2 ** 31, 2 ** 31), TAG_LONG: (-2 ** 63, 2 ** 63)
+}
+
+GZIP_MAGIC = b"\x1f\x8b"
+BLOCKS_PER_SECTION = 4096
+
+
+class NBTError(ValueError):
+    """NBT数据格式错误"""
+    pass
+
+
+class NBTCompound(dict):
+    """TAG_Compound：普通字典，另外记录每个键的标签类型以便原样写回"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.types: Dict[str, int] = {}
+
+
+class NBTList(list):
+    """TAG_List：普通列表，另外记录元素的标签类型"""
+
+    def __init__(self, items: Iterable = (), tag_type: int = TAG_END):
+        super().__init__(items)
+        self.tag_type = tag_type
+
+
+# ---------- 压缩 ----------
+
+def decompress(data: bytes) -> bytes:
+    """按文件头识别gzip/zlib并解压，未压缩的NBT原样返回"""
+    if data[:2] == GZIP_MAGIC:
+        return gzip.decompress(data)
+    if data[:1] == b"\x78":
+        return zlib.decompress(data)
+    return data
+
+
+def compress(data: bytes, compression: Optional[str] = "gzip") -> bytes:
+    """compression 为 gzip、zlib 或 None"""
+    if compression == "gzip":
+        # mtime固定为0，相同内容得到相同文件（便于备份去重）
+        return gzip.compress(data, mtime=0)
+    if compression == "zlib":
+        return zlib.compress(data)
+    if compression is None:
+        return data
+    raise ValueError(f"不支持的压缩方式: {compression}")
+
+
+# ---------- 字符串（Java 修改版UTF-8） ----------
+
+def _decode_string(raw: bytes) -> str:
+    try:
+        return raw.decode("utf-8")
+    except UnicodeDecodeError:
+        # 修改版UTF-8：NUL写作 C0 80，补充平面字符写作两个3字节的代理项
+        text = raw.replace(b"\xc0\x80", b"\x00").decode("utf-8", "surrogatepass")
+        return text.encode("utf-16-le", "surrogatepass").decode("utf-16-le", "replace")
+
+
+def _encode_string(text: str) -> bytes:
+    raw = text.encode("utf-8", "surrogatepass")
+    if b"\x00" in raw or (raw and max(raw) >= 0xF0):
+        units = "".join(c if ord(c) < 0x10000 else
+                        chr(0xD800 + ((ord(c) - 0x10000) >> 10)) + chr(0xDC00 + ((ord(c) - 0x10000) & 0x3FF))
+                        for c in text)
+        raw = units.encode("utf-8", "surrogatepass").replace(b"\x00", b"\xc0\x80")
+    if len(raw) > 0xFFFF:
+        raise NBTError(f"字符串过长: {len(raw)} 字节")
+    return raw
+
+
+# ---------- 读取 ----------
+
+def _array_from_bytes(raw: bytes, tag_type: int):
+    if np is not None:
+        return np.frombuffer(raw, dtype=">i4" if tag_type == TAG_INT_ARRAY else ">i8")
+    values = array.array(_ARRAY_TYPECODES[tag_type], raw)
+    if sys.byteorder == "little":
+        values.byteswap()
+    return values
+
+
+class NBTReader:
+    """在未压缩的NBT缓冲区上按偏移读取
+
+    read_payload 构建完整的值，skip_payload 只移动偏移；iter_compound 逐个产出
+    复合标签的条目，调用方可以选择读取或跳过（不读取时自动跳过）。
+    """
+
+    def __init__(self, data: bytes, pos: int = 0):
+        self.data = data
+        self.pos = pos
+
+    def _check(self, end: int):
+        if end > len(self.data):
+            raise NBTError(f"NBT数据不完整（需要 {end} 字节，只有 {len(self.data)} 字节）")
+
+    def read_type(self) -> int:
+        self._check(self.pos + 1)
+        tag_type = self.data[self.pos]
+        self.pos += 1
+        return tag_type
+
+    def read_string(self) -> str:
+        length = _USHORT.unpack_from(self.data, self.pos)[0]
+        start = self.pos + 2
+        self.pos = start + length
+        self._check(self.pos)
+        return _decode_string(bytes(self.data[start:self.pos]))
+
+    def read_root(self) -> Tuple[str, NBTCompound]:
+        """读取根标签，返回 (名称, 值)"""
+        tag_type = self.read_type()
+        if tag_type != TAG_COMPOUND:
+            raise NBTError(f"根标签不是Compound（类型 {tag_type}）")
+        name = self.read_string()
+        return name, self.read_payload(TAG_COMPOUND)
+
+    def read_payload(self, tag_type: int):
+        data = self.data
+        scalar = _SCALARS.get(tag_type)
+        if scalar is not None:
+            value = scalar.unpack_from(data, self.pos)[0]
+            self.pos += scalar.size
+            return value
+        if tag_type == TAG_STRING:
+            return self.read_string()
+        if tag_type == TAG_COMPOUND:
+            result = NBTCompound()
+            types = result.types
+            while True:
+                child_type = self.read_type()
+                if child_type == TAG_END:
+                    return result
+                name = self.read_string()
+                types[name] = child_type
+                result[name] = self.read_payload(child_type)
+        if tag_type == TAG_LIST:
+            item_type = self.read_type()
+            length = _INT.unpack_from(data, self.pos)[0]
+            self.pos += 4
+            if length <= 0:
+                return NBTList((), item_type)
+            fmt = _LIST_FORMATS.get(item_type)
+            if fmt:
+                # 数值列表一次解包
+                end = self.pos + _FIXED_SIZES[item_type] * length
+                self._check(end)
+                values = struct.unpack_from(f">{length}{fmt}", data, self.pos)
+                self.pos = end
+                return NBTList(values, item_type)
+            return NBTList([self.read_payload(item_type) for _ in range(length)], item_type)
+        item_size = _ARRAY_ITEM_SIZES.get(tag_type)
+        if item_size:
+            length = _INT.unpack_from(data, self.pos)[0]
+            start = self.pos + 4
+            self.pos = start + max(length, 0) * item_size
+            self._check(self.pos)
+            raw = bytes(data[start:self.pos])
+            return raw if tag_type == TAG_BYTE_ARRAY else _array_from_bytes(raw, tag_type)
+        raise NBTError(f"未知的标签类型 {tag_type}（偏移 {self.pos}）")
+
+    def skip_payload(self, tag_type: int):
+        """跳过一个标签的载荷，不构建任何对象"""
+        data = self.data
+        size = _FIXED_SIZES.get(tag_type)
+        if size:
+            self.pos += size
+        elif tag_type == TAG_STRING:
+            self.pos += 2 + _USHORT.unpack_from(data, self.pos)[0]
+        elif tag_type == TAG_COMPOUND:
+            pos = self.pos
+            while True:
+                child_type = data[pos]
+                if child_type == TAG_END:
+                    pos += 1
+                    break
+                pos += 3 + _USHORT.unpack_from(data, pos + 1)[0]
+                size = _FIXED_SIZES.get(child_type)
+                if size:
+                    pos += size
+                else:
+                    self.pos = pos
+                    self.skip_payload(child_type)
+                    pos = self.pos
+            self.pos = pos
+        elif tag_type == TAG_LIST:
+            item_type = data[self.pos]
+            length = _INT.unpack_from(data, self.pos + 1)[0]
+            self.pos += 5
+            size = _FIXED_SIZES.get(item_type)
+            if size:
+                self.pos += size * max(length, 0)
+            else:
+                for _ in range(length):
+                    self.skip_payload(item_type)
+        elif tag_type in _ARRAY_ITEM_SIZES:
+            self.pos += 4 + max(_INT.unpack_from(data, self.pos)[0], 0) * _ARRAY_ITEM_SIZES[tag_type]
+        else:
+            raise NBTError(f"未知的标签类型 {tag_type}（偏移 {self.pos}）")
+        self._check(self.pos)
+
+    def iter_compound(self) -> Iterator[Tuple[int, str]]:
+        """逐个产出当前复合标签条目的 (类型, 名称)，调用方没有读取载荷时自动跳过"""
+        while True:
+            tag_type = self.read_type()
+            if tag_type == TAG_END:
+                return
+            name = self.read_string()
+            start = self.pos
+            yield tag_type, name
+            if self.pos == start:
+                self.skip_payload(tag_type)
+
+
+def _reader(data: bytes) -> NBTReader:
+    return NBTReader(decompress(data) if data[:1] != b"\x0a" else data)
+
+
+def loads(data: bytes) -> NBTCompound:
+    """解析NBT（自动识别压缩），返回根复合标签"""
+    try:
+        return _reader(data).read_root()[1]
+    except (struct.error, IndexError) as e:
+        raise NBTError(f"NBT数据不完整: {e}")
+
+
+def load(path: str) -> NBTCompound:
+    """读取NBT文件（level.dat、玩家数据等）"""
+    with open(path, 'rb') as f:
+        return loads(f.read())
+
+
+# ---------- 路径查询 ----------
+
+def parse_path(path: str) -> List[Union[str, int]]:
+    """把 "Data.Version.Name"、"sections[0].Y" 解析为键列表，列表下标为整数"""
+    keys = []
+    for part in path.split('.'):
+        name, *indexes = part.split('[')
+        if name:
+            keys.append(name)
+        for index in indexes:
+            keys.append(int(index.rstrip(']')))
+    if not keys:
+        raise ValueError(f"无效的NBT路径: {path!r}")
+    return keys
+
+
+class _QueryNode:
+    __slots__ = ("paths", "children", "leaves")
+
+    def __init__(self):
+        self.paths: List[str] = []  # 在这个节点结束的查询路径
+        self.children: Dict[Union[str, int], "_QueryNode"] = {}
+        self.leaves = 0  # 子树中的查询路径数
+
+
+def _lookup(value, keys: List[Union[str, int]]):
+    for key in keys:
+        if isinstance(key, int):
+            if not isinstance(value, (list, tuple)) or not -len(value) <= key < len(value):
+                raise KeyError(key)
+        elif not isinstance(value, dict):
+            raise KeyError(key)
+        value = value[key]
+    return value
+
+
+def _collect(value, node: _QueryNode, out: Dict):
+    """子树已经完整读取时，从构建好的值中取出其中所有查询路径"""
+    for path in node.paths:
+        out[path] = value
+    for key, child in node.children.items():
+        try:
+            _collect(_lookup(value, [key]), child, out)
+        except KeyError:
+            pass
+
+
+def _walk(reader: NBTReader, tag_type: int, node: _QueryNode, out: Dict, remaining: List[int]) -> bool:
+    """沿查询树遍历，不在树上的子树跳过；全部路径找到后返回True提前结束"""
+    if tag_type == TAG_COMPOUND:
+        for child_type, name in reader.iter_compound():
+            child = node.children.get(name)
+            if child is not None and _visit(reader, child_type, child, out, remaining):
+                return True
+    elif tag_type == TAG_LIST:
+        item_type = reader.read_type()
+        length = _INT.unpack_from(reader.data, reader.pos)[0]
+        reader.pos += 4
+        last = max((k for k in node.children if isinstance(k, int) and k >= 0), default=-1)
+        for index in range(length):
+            child = node.children.get(index)
+            if child is not None:
+                if _visit(reader, item_type, child, out, remaining):
+                    return True
+            else:
+                reader.skip_payload(item_type)
+            if index >= last:
+                # 后面的元素不再需要，整体跳过
+                for _ in range(index + 1, length):
+                    reader.skip_payload(item_type)
+                break
+    else:
+        reader.skip_payload(tag_type)
+    return False
+
+
+def _visit(reader: NBTReader, tag_type: int, node: _QueryNode, out: Dict, remaining: List[int]) -> bool:
+    if node.paths:
+        _collect(reader.read_payload(tag_type), node, out)
+        remaining[0] -= node.leaves
+    elif _walk(reader, tag_type, node, out, remaining):
+        return True
+    return remaining[0] <= 0
+
+
+def query(data: bytes, paths: Iterable[str]) -> Dict[str, object]:
+    """一次遍历读取多个路径（自动识别压缩），返回 {路径: 值}，不存在的路径不出现在结果中
+
+    路径相对根复合标签，如 "Data.Version.Name"、"Level.InhabitedTime"、"Inventory[0].id"
+    （列表下标不能为负）。只有路径经过的标签会被读取，其余子树直接跳过；所有路径找到后立即停止。
+    """
+    root = _QueryNode()
+    for path in paths:
+        node = root
+        node.leaves += 1
+        for key in parse_path(path):
+            node = node.children.setdefault(key, _QueryNode())
+            node.leaves += 1
+        node.paths.append(path)
+
+    out = {}
+    if not root.leaves:
+        return out
+    reader = _reader(data)
+    try:
+        if reader.read_type() != TAG_COMPOUND:
+            raise NBTError("根标签不是Compound")
+        reader.read_string()
+        _walk(reader, TAG_COMPOUND, root, out, [root.leaves])
+    except (struct.error, IndexError) as e:
+        raise NBTError(f"NBT数据不完整: {e}")
+    return out
+
+
+def get(data: bytes, path: str, default=None):
+    """读取单个路径的值，不存在时返回 default"""
+    return query(data, [path]).get(path, default)
+
+
+def query_file(path: str, paths: Iterable[str]) -> Dict[str, object]:
+    """对NBT文件执行 query"""
+    with open(path, 'rb') as f:
+        return query(f.read(), paths)
+
+
+# ---------- 写入 ----------
+
+def tag_type_of(value) -> int:
+    """按Python类型推断标签类型"""
+    if isinstance(value, NBTList):
+        return TAG_LIST
+    if isinstance(value, bool):
+        return TAG_BYTE
+    if isinstance(value, int):
+        return TAG_INT if -2 ** 31 <= value < 2 ** 31 else TAG_LONG
+    if isinstance(value, float):
+        return TAG_DOUBLE
+    if isinstance(value, str):
+        return TAG_STRING
+    if isinstance(value, (bytes, bytearray)):
+        return TAG_BYTE_ARRAY
+    if isinstance(value, dict):
+        return TAG_COMPOUND
+    if isinstance(value, (list, tuple)):
+        return TAG_LIST
+    if isinstance(value, array.array):
+        return {"b": TAG_BYTE_ARRAY, "B": TAG_BYTE_ARRAY, "i": TAG_INT_ARRAY, "q": TAG_LONG_ARRAY}.get(
+            value.typecode, TAG_LONG_ARRAY if value.itemsize == 8 else TAG_INT_ARRAY)
+    if np is not None:
+        if isinstance(value, np.ndarray):
+            return {1: TAG_BYTE_ARRAY, 4: TAG_INT_ARRAY}.get(value.dtype.itemsize, TAG_LONG_ARRAY)
+        if isinstance(value, np.integer):
+            return tag_type_of(int(value))
+        if isinstance(value, np.floating):
+            return TAG_DOUBLE
+    raise NBTError(f"无法写入的值类型: {type(value).__name__}")
+
+
+def _fits(tag_type: int, value) -> bool:
+    """记录的标签类型是否仍适用于当前值（值被替换成其他类型时重新推断）"""
+    inferred = tag_type_of(value)
+    if inferred == tag_type:
+        return True
+    if tag_type in _INT_RANGES and inferred in (TAG_INT, TAG_LONG, TAG_BYTE):
+        low, high = _INT_RANGES[tag_type]
+        return low <= int(value) < high
+    if tag_type in (TAG_INT_ARRAY, TAG_LONG_ARRAY):
+        return inferred in (TAG_LIST, TAG_INT_ARRAY, TAG_LONG_ARRAY)
+    return tag_type in (TAG_FLOAT, TAG_DOUBLE) and inferred == TAG_DOUBLE
+
+
+def _write_string(out: bytearray, text: str):
+    raw = _encode_string(text)
+    out += _USHORT.pack(len(raw))
+    out += raw
+
+
+def _array_bytes(value, tag_type: int) -> bytes:
+    if tag_type == TAG_BYTE_ARRAY:
+        if np is not None and isinstance(value, np.ndarray):
+            return value.astype(np.int8).tobytes()
+        return bytes(value) if isinstance(value, (bytes, bytearray)) else struct.pack(f">{len(value)}b", *value)
+    if np is not None and isinstance(value, np.ndarray):
+        return value.astype(">i4" if tag_type == TAG_INT_ARRAY else ">i8").tobytes()
+    values = array.array(_ARRAY_TYPECODES[tag_type], value)
+    if sys.byteorder == "little":
+        values.byteswap()
+    return values.tobytes()
+
+
+def _write_payload(out: bytearray, tag_type: int, value):
+    scalar = _SCALARS.get(tag_type)
+    if scalar is not None:
+        out += scalar.pack(value)
+    elif tag_type == TAG_STRING:
+        _write_string(out, value)
+    elif tag_type == TAG_COMPOUND:
+        types = getattr(value, "types", {})
+        for name, child in value.items():
+            child_type = types.get(name)
+            if child_type is None or not _fits(child_type, child):
+                child_type = tag_type_of(child)
+            out.append(child_type)
+            _write_string(out, name)
+            _write_payload(out, child_type, child)
+        out.append(TAG_END)
+    elif tag_type == TAG_LIST:
+        item_type = getattr(value, "tag_type", TAG_END)
+        if value and (item_type == TAG_END or not _fits(item_type, value[0])):
+            item_type = tag_type_of(value[0])
+        out.append(item_type)
+        out += _INT.pack(len(value))
+        fmt = _LIST_FORMATS.get(item_type)
+        if fmt and value:
+            out += struct.pack(f">{len(value)}{fmt}", *value)
+        else:
+            for item in value:
+                _write_payload(out, item_type, item)
+    elif tag_type in _ARRAY_ITEM_SIZES:
+        raw = _array_bytes(value, tag_type)
+        out += _INT.pack(len(raw) // _ARRAY_ITEM_SIZES[tag_type])
+        out += raw
+    else:
+        raise NBTError(f"未知的标签类型 {tag_type}")
+
+
+def dumps(value: Dict, name: str = "", compression: Optional[str] = None) -> bytes:
+    """把根复合标签序列化为NBT，compression 为 gzip、zlib 或 None"""
+    out = bytearray([TAG_COMPOUND])
+    _write_string(out, name)
+    _write_payload(out, TAG_COMPOUND, value)
+    return compress(bytes(out), compression)
+
+
+def save(path: str, value: Dict, name: str = "", compression: Optional[str] = "gzip"):
+    """原子地写入NBT文件（先写临时文件再替换，level.dat 和玩家数据默认gzip）"""
+    data = dumps(value, name, compression)
+    temp_path = path + ".tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+# ---------- 打包数组 ----------
+
+def unpack_packed_array(longs, bits: int, count: int, spanning: bool = False):
+    """解码打包在长整型数组里的定长无符号值（方块状态、生物群系、高度图）
+
+    1.16起每个long只容纳 64 // bits 个值、值不跨越long；更早的版本值连续排列，
+    可以跨越两个long（spanning=True）。有numpy时返回numpy数组，否则返回列表。
+    """
+    mask = (1 << bits) - 1
+    if np is not None:
+        words = np.asarray(longs, dtype=np.int64).view(np.uint64)
+        if not spanning:
+            per_long = 64 // bits
+            shifts = np.arange(per_long, dtype=np.uint64) * np.uint64(bits)
+            values = (words[:, None] >> shifts) & np.uint64(mask)
+            return values.reshape(-1)[:count].astype(np.int64)
+        bit_index = np.arange(count, dtype=np.uint64) * np.uint64(bits)
+        word_index = (bit_index >> np.uint64(6)).astype(np.intp)
+        shift = bit_index & np.uint64(63)
+        padded = np.append(words, np.uint64(0))
+        low = padded[word_index] >> shift
+        crosses = shift + np.uint64(bits) > np.uint64(64)
+        high_shift = np.where(crosses, np.uint64(64) - shift, np.uint64(0))
+        high = np.where(crosses, padded[word_index + 1] << high_shift, np.uint64(0))
+        return ((low | high) & np.uint64(mask)).astype(np.int64)
+
+    words = [int(w) & 0xFFFFFFFFFFFFFFFF for w in longs]
+    if not spanning:
+        per_long = 64 // bits
+        shifts = [i * bits for i in range(per_long)]
+        return [(word >> shift) & mask for word in words for shift in shifts][:count]
+    stream = int.from_bytes(b"".join(w.to_bytes(8, "little") for w in words), "little")
+    return [(stream >> (i * bits)) & mask for i in range(count)]
+
+
+def section_block_states(section: Dict) -> Tuple[List, object]:
+    """返回 (调色板, 4096个调色板下标)，适用于1.18起的 block_states 格式
+
+    只有一种方块的区块段没有 data，下标全为0。
+    """
+    states = section.get("block_states") or {}
+    palette = states.get("palette") or []
+    data = states.get("data")
+    if data is None or len(data) == 0:
+        indexes = np.zeros(BLOCKS_PER_SECTION, dtype=np.int64) if np is not None else [0] * BLOCKS_PER_SECTION
+        return palette, indexes
+    bits = max(4, (len(palette) - 1).bit_length())
+    return palette, unpack_packed_array(data, bits, BLOCKS_PER_SECTION)
+
+
+def to_snbt(value, indent: int = 0) -> str:
+    """把值格式化为SNBT文本（调试和查看用，数组只显示长度）"""
+    pad = "  " * (indent + 1)
+    if isinstance(value, dict):
+        if not value:
+            return "{}"
+        items = [f"{pad}{name}: {to_snbt(child, indent + 1)}" for name, child in value.items()]
+        return "{\n" + ",\n".join(items) + "\n" + "  " * indent + "}"
+    if isinstance(value, (list, tuple)):
+        if not value or not isinstance(value[0], (dict, list, tuple)):
+            return "[" + ", ".join(to_snbt(item, indent + 1) for item in value) + "]"
+        return "[\n" + ",\n".join(pad + to_snbt(item, indent + 1) for item in value) + "\n" + "  " * indent + "]"
+    if isinstance(value, str):
+        return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+    if isinstance(value, (bytes, bytearray)) or (np is not None and isinstance(value, np.ndarray)) \
+            or isinstance(value, array.array):
+        return f"<{type(value).__name__}[{len(value)}]>"
+    return repr(value)
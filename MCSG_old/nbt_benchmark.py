@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+NBT解析性能基准测试脚本
+
+对区块和玩家数据分别测量：仅解压、完整解析、按路径惰性查询，以及方块状态
+打包数组的解码（numpy与纯Python）。指定 --world 时使用真实世界的区域文件和
+playerdata，否则在内存中生成结构接近1.20的模拟数据。
+
+用法: python nbt_benchmark.py [--world 服务器或世界目录] [--chunks 500] [--players 500]
+"""
+
+import os
+import sys
+import time
+import array
+import random
+import argparse
+
+import anvil
+import nbt
+from world_stats import find_region_directories
+
+
+BLOCK_NAMES = ["minecraft:" + name for name in (
+    "stone", "deepslate", "dirt", "grass_block", "water", "air", "cave_air", "andesite", "granite",
+    "diorite", "coal_ore", "iron_ore", "copper_ore", "gravel", "tuff", "oak_log", "oak_leaves", "sand",
+    "lava", "bedrock", "diamond_ore", "redstone_ore", "lapis_ore", "gold_ore", "clay", "moss_block",
+    "glow_lichen", "dripstone_block", "pointed_dripstone", "sculk")]
+ITEM_NAMES = ["minecraft:" + name for name in (
+    "diamond_pickaxe", "torch", "cobblestone", "cooked_beef", "iron_ingot", "oak_planks", "bread",
+    "shield", "bow", "arrow", "ender_pearl", "water_bucket", "crafting_table", "furnace", "netherite_sword")]
+
+
+def random_longs(rng: random.Random, count: int) -> array.array:
+    return array.array('q', (rng.getrandbits(64) - 2 ** 63 for _ in range(count)))
+
+
+def make_chunk(rng: random.Random, x: int, z: int) -> dict:
+    """生成一个结构接近1.20的区块（打包数组内容随机，只用于测量解码速度）
+
+    InhabitedTime 放在最后，查询时需要跳过全部区块段。
+    """
+    sections = []
+    for y in range(-4, 20):
+        size = 1 if y > 10 else rng.choice((3, 6, 9, 17, 24))
+        palette = [{"Name": name} for name in rng.sample(BLOCK_NAMES, size)]
+        for entry in palette[:2]:
+            entry["Properties"] = {"axis": "y", "waterlogged": "false"}
+        block_states = {"palette": palette}
+        if size > 1:
+            bits = max(4, (size - 1).bit_length())
+            block_states["data"] = random_longs(rng, -(-nbt.BLOCKS_PER_SECTION // (64 // bits)))
+        sections.append({
+            "Y": y,
+            "block_states": block_states,
+            "biomes": {"palette": ["minecraft:plains", "minecraft:river"], "data": random_longs(rng, 1)},
+            "BlockLight": os.urandom(2048),
+            "SkyLight": os.urandom(2048)
+        })
+    block_entities = [{
+        "id": "minecraft:chest", "x": x * 16 + i, "y": 64, "z": z * 16, "keepPacked": 0,
+        "Items": [{"Slot": s, "id": rng.choice(ITEM_NAMES), "Count": rng.randint(1, 64)} for s in range(9)]
+    } for i in range(rng.randint(0, 4))]
+    return {
+        "DataVersion": 3700,
+        "xPos": x,
+        "zPos": z,
+        "yPos": -4,
+        "Status": "minecraft:full",
+        "sections": sections,
+        "block_entities": block_entities,
+        "Heightmaps": {name: random_longs(rng, 37) for name in (
+            "MOTION_BLOCKING", "MOTION_BLOCKING_NO_LEAVES", "OCEAN_FLOOR", "WORLD_SURFACE")},
+        "structures": {"References": {}, "starts": {}},
+        "PostProcessing": [[] for _ in range(24)],
+        "block_ticks": [],
+        "fluid_ticks": [],
+        "isLightOn": True,
+        "LastUpdate": rng.randint(0, 10 ** 7),
+        "InhabitedTime": rng.randint(0, 10 ** 6)
+    }
+
+
+def make_player(rng: random.Random) -> dict:
+    """生成一个玩家数据"""
+    def item(slot):
+        return {"Slot": slot, "id": rng.choice(ITEM_NAMES), "Count": rng.randint(1, 64),
+                "tag": {"Damage": rng.randint(0, 200), "Enchantments": [{"id": "minecraft:unbreaking", "lvl": 3}]}}
+    return {
+        "DataVersion": 3700,
+        "Pos": [rng.uniform(-5000, 5000), rng.uniform(-60, 300), rng.uniform(-5000, 5000)],
+        "Motion": [0.0, -0.0784, 0.0],
+        "Rotation": nbt.NBTList([rng.uniform(0, 360), rng.uniform(-90, 90)], nbt.TAG_FLOAT),
+        "Health": 20.0,
+        "XpLevel": rng.randint(0, 100),
+        "Dimension": "minecraft:overworld",
+        "Inventory": [item(slot) for slot in rng.sample(range(36), rng.randint(5, 36))],
+        "EnderItems": [item(slot) for slot in rng.sample(range(27), rng.randint(0, 27))],
+        "abilities": {"flying": False, "mayfly": False, "instabuild": False, "walkSpeed": 0.1, "flySpeed": 0.05},
+        "recipeBook": {"recipes": [f"minecraft:recipe_{i}" for i in range(rng.randint(50, 400))],
+                       "toBeDisplayed": [], "isFilteringCraftable": False},
+        "Attributes": [{"Name": "minecraft:generic.max_health", "Base": 20.0},
+                       {"Name": "minecraft:generic.movement_speed", "Base": 0.1}]
+    }
+
+
+def load_world_samples(world: str, max_chunks: int, max_players: int):
+    """从真实世界读取区块（保持压缩）和玩家数据文件"""
+    chunks, players = [], []
+    for region_directory in find_region_directories(world).values():
+        for name in sorted(os.listdir(region_directory)):
+            if len(chunks) >= max_chunks:
+                break
+            if anvil.REGION_FILE_PATTERN.match(name):
+                for record in anvil.iter_chunks(os.path.join(region_directory, name)):
+                    chunks.append((record.compression, record.payload))
+                    if len(chunks) >= max_chunks:
+                        break
+    for root, dirs, names in os.walk(world):
+        if os.path.basename(root) == "playerdata":
+            for name in names:
+                if name.endswith(".dat") and len(players) < max_players:
+                    with open(os.path.join(root, name), 'rb') as f:
+                        players.append(f.read())
+    return chunks, players
+
+
+def timed(label: str, func, items: list, raw_bytes: int):
+    """对每个元素执行 func 并打印耗时"""
+    start = time.perf_counter()
+    for item in items:
+        func(item)
+    elapsed = time.perf_counter() - start
+    per_item = elapsed / len(items) * 1e6 if items else 0
+    throughput = raw_bytes / elapsed / 1024 / 1024 if elapsed else 0
+    print(f"{label:<34} {elapsed:8.3f} s {per_item:10.1f} µs {throughput:9.1f} MB/s")
+    return elapsed
+
+
+def decode_block_states(data: bytes) -> int:
+    count = 0
+    for section in nbt.loads(data).get("sections", []):
+        palette, indexes = nbt.section_block_states(section)
+        count += len(indexes)
+    return count
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="NBT解析性能基准测试")
+    parser.add_argument("--world", default=None, help="真实的服务器或世界目录（默认生成模拟数据）")
+    parser.add_argument("--chunks", type=int, default=500, help="测试的区块数量")
+    parser.add_argument("--players", type=int, default=500, help="测试的玩家数据数量")
+    args = parser.parse_args()
+
+    if args.world:
+        print(f"=== 读取世界: {args.world} ===")
+        chunks, players = load_world_samples(args.world, args.chunks, args.players)
+    else:
+        print(f"=== 生成 {args.chunks} 个模拟区块和 {args.players} 个玩家数据 ===")
+        rng = random.Random(42)
+        chunks = [(anvil.COMPRESSION_ZLIB, nbt.dumps(make_chunk(rng, i % 32, i // 32), compression="zlib"))
+                  for i in range(args.chunks)]
+        players = [nbt.dumps(make_player(rng), compression="gzip") for _ in range(args.players)]
+
+    chunk_data = [anvil.decompress_chunk(compression, payload) for compression, payload in chunks]
+    chunk_bytes = sum(len(d) for d in chunk_data)
+    player_bytes = sum(len(nbt.decompress(d)) for d in players)
+    print(f"区块: {len(chunks)} 个, 解压后 {chunk_bytes / 1024 / 1024:.1f} MB; "
+          f"玩家数据: {len(players)} 个, 解压后 {player_bytes / 1024 / 1024:.1f} MB")
+    print(f"numpy: {'可用' if nbt.np is not None else '不可用'}")
+
+    print(f"\n{'测试':<34} {'总耗时':>10} {'每个':>13} {'吞吐':>14}")
+    if chunks:
+        timed("区块 解压", lambda c: anvil.decompress_chunk(*c), chunks, chunk_bytes)
+        timed("区块 完整解析", nbt.loads, chunk_data, chunk_bytes)
+        timed("区块 查询 InhabitedTime", lambda d: nbt.query(d, ["InhabitedTime", "Level.InhabitedTime"]),
+              chunk_data, chunk_bytes)
+        timed("区块 查询 DataVersion/xPos/zPos",
+              lambda d: nbt.query(d, ["DataVersion", "xPos", "zPos"]), chunk_data, chunk_bytes)
+        timed("区块 解析+解码方块状态", decode_block_states, chunk_data, chunk_bytes)
+        if nbt.np is not None:
+            saved, nbt.np = nbt.np, None
+            try:
+                timed("区块 解析+解码方块状态（纯Python）", decode_block_states, chunk_data, chunk_bytes)
+            finally:
+                nbt.np = saved
+    if players:
+        timed("玩家 解压+完整解析", nbt.loads, players, player_bytes)
+        timed("玩家 解压+查询 Pos/Health/XpLevel",
+              lambda d: nbt.query(d, ["Pos", "Health", "XpLevel", "Dimension"]), players, player_bytes)
+        parsed = [nbt.loads(d) for d in players]
+        timed("玩家 写入（gzip）", lambda v: nbt.dumps(v, compression="gzip"), parsed, player_bytes)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
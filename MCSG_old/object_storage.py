@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+S3兼容对象存储模块（并行分片上传/断点续传/并行范围下载）
+"""
+
+import os
+import hmac
+import json
+import time
+import math
+import base64
+import hashlib
+import datetime
+import threading
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote, urlsplit
+
+import requests
+
+
+MIN_PART_SIZE = 5 * 1024 * 1024  # S3 要求除最后一片外每片至少5MB
+MAX_PARTS = 10000
+UNSIGNED_PAYLOAD = "UNSIGNED-PAYLOAD"
+EMPTY_SHA256 = hashlib.sha256(b"").hexdigest()
+
+
+class ObjectStorageError(Exception):
+    """对象存储请求失败"""
+
+
+@dataclass
+class ObjectStorageConfig:
+    """对象存储配置（路径风格寻址，兼容 MinIO 等）"""
+    endpoint: str  # 如 https://s3.amazonaws.com 或 http://127.0.0.1:9000
+    bucket: str
+    access_key: str
+    secret_key: str
+    region: str = "us-east-1"
+    prefix: str = "mcsg-backups/"
+    part_size: int = 16 * 1024 * 1024
+    workers: int = 4
+    timeout: int = 60
+
+    def to_dict(self) -> Dict:
+        return {
+            "endpoint": self.endpoint,
+            "bucket": self.bucket,
+            "access_key": self.access_key,
+            "secret_key": self.secret_key,
+            "region": self.region,
+            "prefix": self.prefix,
+            "part_size": self.part_size,
+            "workers": self.workers,
+            "timeout": self.timeout
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'ObjectStorageConfig':
+        return cls(**data)
+
+
+def _strip_namespace(root: ET.Element):
+    for element in root.iter():
+        if '}' in element.tag:
+            element.tag = element.tag.split('}', 1)[1]
+    return root
+
+
+def _hmac(key: bytes, message: str) -> bytes:
+    return hmac.new(key, message.encode('utf-8'), hashlib.sha256).digest()
+
+
+class S3Client:
+    """最小的S3客户端（AWS Signature V4）"""
+
+    def __init__(self, config: ObjectStorageConfig):
+        self.config = config
+        self._local = threading.local()
+
+    @property
+    def session(self) -> requests.Session:
+        """每个线程一个会话（连接复用）"""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            self._local.session = session
+        return session
+
+    def object_key(self, name: str) -> str:
+        return self.config.prefix + name
+
+    def _sign(self, method: str, path: str, query: Dict[str, str], headers: Dict[str, str],
+              payload_hash: str) -> Dict[str, str]:
+        """计算SigV4签名头"""
+        now = datetime.datetime.now(datetime.timezone.utc)
+        amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+        date_stamp = now.strftime("%Y%m%d")
+        host = urlsplit(self.config.endpoint).netloc
+
+        headers = dict(headers)
+        headers.update({"host": host, "x-amz-date": amz_date, "x-amz-content-sha256": payload_hash})
+        signed = sorted(k.lower() for k in headers)
+        lowered = {k.lower(): str(v).strip() for k, v in headers.items()}
+        canonical_headers = "".join(f"{k}:{lowered[k]}\n" for k in signed)
+        canonical_query = "&".join(f"{quote(k, safe='-_.~')}={quote(v, safe='-_.~')}"
+                                   for k, v in sorted(query.items()))
+        canonical_request = "\n".join([method, quote(path, safe='/-_.~'), canonical_query, canonical_headers,
+                                       ";".join(signed), payload_hash])
+
+        scope = f"{date_stamp}/{self.config.region}/s3/aws4_request"
+        string_to_sign = "\n".join(["AWS4-HMAC-SHA256", amz_date, scope,
+                                    hashlib.sha256(canonical_request.encode('utf-8')).hexdigest()])
+        key = _hmac(("AWS4" + self.config.secret_key).encode('utf-8'), date_stamp)
+        for part in (self.config.region, "s3", "aws4_request"):
+            key = _hmac(key, part)
+        signature = hmac.new(key, string_to_sign.encode('utf-8'), hashlib.sha256).hexdigest()
+
+        headers["Authorization"] = (f"AWS4-HMAC-SHA256 Credential={self.config.access_key}/{scope}, "
+                                    f"SignedHeaders={';'.join(signed)}, Signature={signature}")
+        del headers["host"]  # requests 自动添加
+        return headers
+
+    def request(self, method: str, key: str, query: Optional[Dict[str, str]] = None,
+                data: bytes = b"", headers: Optional[Dict[str, str]] = None, payload_hash: str = None,
+                expected=(200,), retries: int = 3) -> requests.Response:
+        """发送签名请求，网络错误和5xx自动重试"""
+        query = query or {}
+        path = f"/{self.config.bucket}/{key}" if key else f"/{self.config.bucket}"
+        if payload_hash is None:
+            payload_hash = hashlib.sha256(data).hexdigest() if data else EMPTY_SHA256
+
+        last_error = None
+        for attempt in range(retries):
+            signed = self._sign(method, path, query, headers or {}, payload_hash)
+            url = self.config.endpoint.rstrip('/') + quote(path, safe='/-_.~')
+            try:
+                response = self.session.request(method, url, params=query, data=data or None, headers=signed,
+                                                timeout=self.config.timeout)
+            except requests.RequestException as e:
+                last_error = str(e)
+            else:
+                if response.status_code in expected:
+                    return response
+                last_error = f"HTTP {response.status_code}: {response.text[:200]}"
+                if response.status_code < 500:
+                    break
+            time.sleep(2 ** attempt)
+        raise ObjectStorageError(f"{method} {key} 失败: {last_error}")
+
+    # ---- 分片上传 ----
+
+    def create_multipart_upload(self, key: str) -> str:
+        response = self.request("POST", key, {"uploads": ""})
+        root = _strip_namespace(ET.fromstring(response.content))
+        return root.findtext("UploadId")
+
+    def upload_part(self, key: str, upload_id: str, part_number: int, data: bytes) -> str:
+        """上传一片并用Content-MD5校验，返回ETag"""
+        md5 = hashlib.md5(data)
+        headers = {"Content-MD5": base64.b64encode(md5.digest()).decode('ascii')}
+        response = self.request("PUT", key, {"partNumber": str(part_number), "uploadId": upload_id},
+                                data, headers, payload_hash=UNSIGNED_PAYLOAD)
+        etag = response.headers.get("ETag", "").strip('"')
+        if etag and etag != md5.hexdigest():
+            raise ObjectStorageError(f"分片 {part_number} 的ETag不匹配")
+        return etag
+
+    def list_parts(self, key: str, upload_id: str) -> Dict[int, Tuple[str, int]]:
+        """列出已上传的分片 {分片号: (ETag, 大小)}"""
+        parts = {}
+        marker = "0"
+        while True:
+            response = self.request("GET", key, {"uploadId": upload_id, "part-number-marker": marker},
+                                    expected=(200, 404))
+            if response.status_code == 404:
+                raise ObjectStorageError("分片上传已失效")
+            root = _strip_namespace(ET.fromstring(response.content))
+            for part in root.findall("Part"):
+                parts[int(part.findtext("PartNumber"))] = (part.findtext("ETag").strip('"'),
+                                                           int(part.findtext("Size")))
+            if root.findtext("IsTruncated") != "true":
+                return parts
+            marker = root.findtext("NextPartNumberMarker")
+
+    def complete_multipart_upload(self, key: str, upload_id: str, etags: Dict[int, str]):
+        parts = "".join(f"<Part><PartNumber>{n}</PartNumber><ETag>\"{etags[n]}\"</ETag></Part>"
+                        for n in sorted(etags))
+        body = f"<CompleteMultipartUpload>{parts}</CompleteMultipartUpload>".encode('utf-8')
+        response = self.request("POST", key, {"uploadId": upload_id}, body)
+        # S3 可能在200响应体中返回错误
+        if b"<Error>" in response.content:
+            raise ObjectStorageError(f"完成分片上传失败: {response.text[:200]}")
+
+    def abort_multipart_upload(self, key: str, upload_id: str):
+        self.request("DELETE", key, {"uploadId": upload_id}, expected=(204, 200, 404))
+
+    # ---- 对象 ----
+
+    def head_object(self, key: str) -> Optional[int]:
+        """返回对象大小，不存在时返回None"""
+        response = self.request("HEAD", key, expected=(200, 404))
+        if response.status_code == 404:
+            return None
+        return int(response.headers.get("Content-Length", 0))
+
+    def get_range(self, key: str, start: int, end: int) -> bytes:
+        """下载 [start, end] 字节"""
+        response = self.request("GET", key, headers={"Range": f"bytes={start}-{end}"}, expected=(206, 200))
+        data = response.content
+        if response.status_code == 200:  # 服务器不支持Range时返回整个对象
+            data = data[start:end + 1]
+        if len(data) != end - start + 1:
+            raise ObjectStorageError(f"范围下载长度不符: {key} {start}-{end}")
+        return data
+
+    def delete_object(self, key: str):
+        self.request("DELETE", key, expected=(204, 200, 404))
+
+
+class ObjectStorage:
+    """备份文件的上传/下载
+
+    上传：按 part_size 分片并行上传，进度保存在状态文件中，中断后再次调用会跳过已确认的分片。
+    下载：按范围并行下载到临时文件，完成后替换目标文件。
+    """
+
+    def __init__(self, config: ObjectStorageConfig, state_dir: str):
+        self.config = config
+        self.client = S3Client(config)
+        self.state_dir = state_dir
+        os.makedirs(state_dir, exist_ok=True)
+
+    def _state_file(self, key: str) -> str:
+        name = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.state_dir, f"{name}.json")
+
+    def _load_state(self, key: str, file_path: str) -> Optional[Dict]:
+        state_file = self._state_file(key)
+        if not os.path.exists(state_file):
+            return None
+        try:
+            with open(state_file, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        stat = os.stat(file_path)
+        if state.get("size") != stat.st_size or state.get("mtime_ns") != stat.st_mtime_ns:
+            # 文件已变化，旧的分片不能用
+            try:
+                self.client.abort_multipart_upload(key, state["upload_id"])
+            except ObjectStorageError:
+                pass
+            return None
+        return state
+
+    def _save_state(self, key: str, state: Dict):
+        state_file = self._state_file(key)
+        temp_file = state_file + ".tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(temp_file, state_file)
+
+    def part_size_for(self, size: int) -> int:
+        return max(self.config.part_size, MIN_PART_SIZE, math.ceil(size / MAX_PARTS))
+
+    def upload_file(self, file_path: str, name: str) -> str:
+        """上传文件（可断点续传），返回对象键"""
+        key = self.client.object_key(name)
+        stat = os.stat(file_path)
+        state = self._load_state(key, file_path)
+        if state is None:
+            state = {
+                "upload_id": self.client.create_multipart_upload(key),
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "part_size": self.part_size_for(stat.st_size),
+                "etags": {}
+            }
+            self._save_state(key, state)
+        else:
+            # 以服务端记录为准
+            try:
+                uploaded = self.client.list_parts(key, state["upload_id"])
+            except ObjectStorageError:
+                os.remove(self._state_file(key))
+                return self.upload_file(file_path, name)
+            state["etags"] = {str(n): etag for n, (etag, _) in uploaded.items()}
+            print(f"继续上传 {name}: 已完成 {len(uploaded)} 个分片")
+
+        part_size = state["part_size"]
+        part_count = max(1, math.ceil(stat.st_size / part_size))
+        lock = threading.Lock()
+
+        def upload(part_number: int):
+            with open(file_path, 'rb') as f:
+                f.seek((part_number - 1) * part_size)
+                data = f.read(part_size)
+            etag = self.client.upload_part(key, state["upload_id"], part_number, data)
+            with lock:
+                state["etags"][str(part_number)] = etag
+                self._save_state(key, state)
+
+        todo = [n for n in range(1, part_count + 1) if str(n) not in state["etags"]]
+        with ThreadPoolExecutor(max_workers=self.config.workers) as executor:
+            for _ in executor.map(upload, todo):
+                pass
+
+        self.client.complete_multipart_upload(key, state["upload_id"],
+                                              {int(n): etag for n, etag in state["etags"].items()})
+        os.remove(self._state_file(key))
+        return key
+
+    def download_file(self, key: str, target_path: str):
+        """并行范围下载对象到 target_path"""
+        size = self.client.head_object(key)
+        if size is None:
+            raise ObjectStorageError(f"远程对象不存在: {key}")
+
+        temp_path = target_path + ".download"
+        os.makedirs(os.path.dirname(target_path) or ".", exist_ok=True)
+        with open(temp_path, 'wb') as f:
+            f.truncate(size)
+
+        part_size = self.part_size_for(size)
+
+        def download(start: int):
+            end = min(start + part_size, size) - 1
+            data = self.client.get_range(key, start, end)
+            with open(temp_path, 'r+b') as f:
+                f.seek(start)
+                f.write(data)
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.config.workers) as executor:
+                for _ in executor.map(download, range(0, size, part_size)):
+                    pass
+            os.replace(temp_path, target_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def delete(self, key: str):
+        self.client.delete_object(key)
+
+    def pending_uploads(self) -> List[str]:
+        """未完成的上传状态文件"""
+        return [f for f in os.listdir(self.state_dir) if f.endswith(".json")]
@@ -0,0 +1,723 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多核并行压缩ZIP写入模块
+"""
+
+import os
+import io
+import zlib
+import json
+import time
+import hashlib
+import threading
+import random
+import struct
+import zipfile
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from io_throttle import lower_current_priority
+
+try:
+    import zstandard
+except ImportError:  # 没有zstandard时zstd策略退回deflate
+    zstandard = None
+
+
+METHOD_STORE = 0
+METHOD_DEFLATE = 8
+METHOD_ZSTD = 93  # APPNOTE 6.3.7 定义的Zstandard压缩方法
+
+CODEC_METHODS = {
+    "store": METHOD_STORE,
+    "deflate": METHOD_DEFLATE,
+    "zstd": METHOD_ZSTD
+}
+
+BLOCK_SIZE = 4 * 1024 * 1024  # 大文件按块并行压缩
+SMALL_FILE_SIZE = 64 * 1024  # 小文件成批提交给工作进程
+SMALL_BATCH_FILES = 128
+SMALL_BATCH_BYTES = 2 * 1024 * 1024
+MANIFEST_NAME = ".mcsg_manifest.json"  # 归档内的逐文件校验清单
+DICTIONARY_NAME = ".mcsg_zstd_dict"  # 归档内的zstd字典（小文件用它压缩）
+INTERNAL_NAMES = (MANIFEST_NAME, DICTIONARY_NAME)
+ZIP64_LIMIT = 0xFFFFFFFF
+ZIP_FLAG_UTF8 = 0x800
+
+# 已经压缩过的文件类型，再压缩只浪费CPU
+COMPRESSED_SUFFIXES = ('.mca', '.mcc', '.jar', '.zip', '.gz', '.png', '.ogg', '.zst', '.xz', '.7z')
+
+# 适合用训练字典压缩的小文件（统计、进度等JSON和文本；玩家数据 .dat 本身是gzip，字典无效）
+DICTIONARY_SUFFIXES = ('.json', '.mcmeta', '.txt', '.yml', '.yaml', '.properties', '.toml', '.snbt',
+                       '.mcfunction')
+DICTIONARY_SIZE = 112640  # zstd 默认字典大小
+
+# 工作进程/线程中可用的字典：字典ID -> 字典数据，压缩器按线程缓存
+_dictionaries: Dict[int, bytes] = {}
+_compressors = threading.local()
+
+
+class CompressionPolicy:
+    """压缩策略：按文件后缀选择编码与级别"""
+
+    def __init__(self, default_codec: str = "deflate", default_level: int = 6,
+                 rules: Optional[Dict[str, Tuple[str, int]]] = None,
+                 dictionary_max_size: int = 64 * 1024, dictionary_level: int = 9):
+        self.default_codec = default_codec
+        self.default_level = default_level
+        self.rules: Dict[str, Tuple[str, int]] = {suffix: ("store", 0) for suffix in COMPRESSED_SUFFIXES}
+        if rules:
+            self.rules.update(rules)
+        self.dictionary_max_size = dictionary_max_size  # 不超过该大小的文件使用字典，0 表示不使用
+        self.dictionary_level = dictionary_level
+
+    def select(self, arc_path: str) -> Tuple[str, int]:
+        """返回文件使用的 (编码, 级别)"""
+        lower = arc_path.lower()
+        for suffix, rule in self.rules.items():
+            if lower.endswith(suffix):
+                return self._available(*rule)
+        return self._available(self.default_codec, self.default_level)
+
+    @staticmethod
+    def _available(codec: str, level: int) -> Tuple[str, int]:
+        if codec == "zstd" and zstandard is None:
+            return "deflate", 6
+        return codec, level
+
+    def uses_dictionary(self, arc_path: str, size: int) -> bool:
+        """是否用训练字典压缩该文件"""
+        return (zstandard is not None and 0 < size <= self.dictionary_max_size
+                and arc_path.lower().endswith(DICTIONARY_SUFFIXES))
+
+    def to_dict(self) -> Dict:
+        return {
+            "default_codec": self.default_codec,
+            "default_level": self.default_level,
+            "rules": {suffix: list(rule) for suffix, rule in self.rules.items()},
+            "dictionary_max_size": self.dictionary_max_size,
+            "dictionary_level": self.dictionary_level
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'CompressionPolicy':
+        rules = {suffix: tuple(rule) for suffix, rule in data.get("rules", {}).items()}
+        return cls(data.get("default_codec", "deflate"), data.get("default_level", 6), rules,
+                   data.get("dictionary_max_size", 64 * 1024), data.get("dictionary_level", 9))
+
+
+def train_dictionary(file_paths: Iterable[str], dict_size: int = DICTIONARY_SIZE, max_samples: int = 4000,
+                     min_samples: int = 64) -> Optional[bytes]:
+    """从一组小文件中抽样训练zstd字典，样本不足或训练失败时返回None"""
+    if zstandard is None:
+        return None
+    paths = list(file_paths)
+    if len(paths) > max_samples:
+        paths = random.sample(paths, max_samples)
+    samples = []
+    for path in paths:
+        try:
+            with open(path, 'rb') as f:
+                samples.append(f.read())
+        except OSError:
+            continue
+    if len(samples) < min_samples:
+        return None
+    try:
+        return zstandard.train_dictionary(dict_size, samples).as_bytes()
+    except zstandard.ZstdError as e:
+        print(f"训练压缩字典失败: {e}")
+        return None
+
+
+def dictionary_id(dictionary: bytes) -> int:
+    return zstandard.ZstdCompressionDict(dictionary).dict_id()
+
+
+def register_dictionary(dictionary: bytes) -> int:
+    """在当前进程中登记字典，返回字典ID"""
+    dict_id = dictionary_id(dictionary)
+    _dictionaries[dict_id] = dictionary
+    return dict_id
+
+
+def init_compression_worker(priority: Optional[Tuple[int, str]] = None, dictionary: Optional[bytes] = None):
+    """压缩工作进程/线程的初始化：降低优先级并登记字典"""
+    if priority:
+        lower_current_priority(*priority)
+    if dictionary:
+        register_dictionary(dictionary)
+
+
+def _dictionary_compressor(dict_id: int, level: int):
+    """线程内缓存的带字典压缩器（加载字典的开销远大于压缩一个小文件）"""
+    cache = _compressors.__dict__.setdefault("cache", {})
+    compressor = cache.get((dict_id, level))
+    if compressor is None:
+        data = zstandard.ZstdCompressionDict(_dictionaries[dict_id])
+        compressor = cache[(dict_id, level)] = zstandard.ZstdCompressor(level=level, dict_data=data)
+    return compressor
+
+
+def compress_data(raw: bytes, codec: str, level: int, last: bool = True, dict_id: int = 0) -> bytes:
+    """按编码压缩一段数据
+
+    deflate 的非末尾块以 Z_FULL_FLUSH 结束，字节对齐后可直接拼接成一个合法的deflate流；
+    zstd 每块为独立帧，多帧拼接仍是合法的zstd流；dict_id 非0时使用已登记的字典。
+    """
+    if codec == "deflate":
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+        return compressor.compress(raw) + compressor.flush(zlib.Z_FINISH if last else zlib.Z_FULL_FLUSH)
+    if codec == "zstd":
+        if dict_id:
+            return _dictionary_compressor(dict_id, level).compress(raw)
+        return zstandard.ZstdCompressor(level=level).compress(raw)
+    return raw
+
+
+def compress_block(file_path: str, offset: int, length: int, codec: str, level: int,
+                   last: bool, dict_id: int = 0) -> Tuple[bytes, int, int, bytes]:
+    """压缩文件的一个块（在工作进程中执行），返回 (压缩数据, CRC32, 原始长度, 块SHA-256)"""
+    with open(file_path, 'rb') as f:
+        f.seek(offset)
+        raw = f.read(length)
+    return (compress_data(raw, codec, level, last, dict_id), zlib.crc32(raw), len(raw),
+            hashlib.sha256(raw).digest())
+
+
+def compress_small_files(items: List[tuple]) -> List[Tuple[bytes, int, int, bytes]]:
+    """在一个任务中压缩一批小文件，items 为 (文件路径, 长度, 编码, 级别, 字典ID)"""
+    return [compress_block(file_path, 0, length, codec, level, True, dict_id)
+            for file_path, length, codec, level, dict_id in items]
+
+
+class _BatchResult:
+    """批量任务中一个文件的结果，和 Future 一样通过 result() 取回"""
+
+    __slots__ = ("future", "index")
+
+    def __init__(self, future, index: int):
+        self.future = future
+        self.index = index
+
+    def result(self):
+        return self.future.result()[self.index]
+
+
+class BlockHasher:
+    """分块哈希：每 BLOCK_SIZE 字节一个SHA-256，文件哈希为所有块摘要拼接后的SHA-256
+
+    压缩时各块在不同进程中计算摘要，还原和校验时流式计算，两者结果一致。
+    """
+
+    def __init__(self):
+        self._digests: List[bytes] = []
+        self._block = hashlib.sha256()
+        self._filled = 0
+
+    def update(self, data: bytes):
+        view = memoryview(data)
+        while view:
+            take = min(BLOCK_SIZE - self._filled, len(view))
+            self._block.update(view[:take])
+            self._filled += take
+            view = view[take:]
+            if self._filled == BLOCK_SIZE:
+                self._digests.append(self._block.digest())
+                self._block = hashlib.sha256()
+                self._filled = 0
+
+    def hexdigest(self) -> str:
+        digests = list(self._digests)
+        if self._filled or not digests:
+            digests.append(self._block.digest())
+        return combine_block_digests(digests)
+
+
+def combine_block_digests(digests: List[bytes]) -> str:
+    """由块摘要计算文件哈希"""
+    return hashlib.sha256(b"".join(digests)).hexdigest()
+
+
+# CRC32 合并（zlib crc32_combine 的Python实现，GF(2)矩阵运算）
+def _gf2_matrix_times(matrix: List[int], vector: int) -> int:
+    total = 0
+    i = 0
+    while vector:
+        if vector & 1:
+            total ^= matrix[i]
+        vector >>= 1
+        i += 1
+    return total
+
+
+def _gf2_matrix_square(matrix: List[int]) -> List[int]:
+    return [_gf2_matrix_times(matrix, matrix[n]) for n in range(32)]
+
+
+def crc32_combine(crc1: int, crc2: int, length2: int) -> int:
+    """合并两段数据的CRC32，length2 为第二段长度"""
+    if length2 <= 0:
+        return crc1
+
+    odd = [0xEDB88320] + [1 << n for n in range(31)]
+    even = _gf2_matrix_square(odd)
+    odd = _gf2_matrix_square(even)
+
+    while True:
+        even = _gf2_matrix_square(odd)
+        if length2 & 1:
+            crc1 = _gf2_matrix_times(even, crc1)
+        length2 >>= 1
+        if not length2:
+            break
+        odd = _gf2_matrix_square(even)
+        if length2 & 1:
+            crc1 = _gf2_matrix_times(odd, crc1)
+        length2 >>= 1
+        if not length2:
+            break
+
+    return crc1 ^ crc2
+
+
+def _dos_datetime(timestamp: float) -> Tuple[int, int]:
+    """转换为ZIP使用的DOS日期与时间"""
+    t = time.localtime(max(timestamp, 315532800))  # 不早于1980年
+    dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+    dos_date = ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    return dos_time, dos_date
+
+
+class _ZipEntry:
+    """已写入条目的中央目录信息"""
+    __slots__ = ("name", "method", "dos_time", "dos_date", "crc", "compress_size",
+                 "file_size", "header_offset", "external_attr")
+
+
+class ParallelZipWriter:
+    """并行压缩的ZIP写入器
+
+    文件（大文件按块）在进程池中压缩，主进程按原顺序写入归档，
+    因此输出与顺序写入等价，可被标准ZIP工具读取（zstd条目需要支持方法93的工具）。
+    """
+
+    def __init__(self, archive_path: str, policy: Optional[CompressionPolicy] = None,
+                 workers: Optional[int] = None, use_processes: bool = True, throttle=None,
+                 priority: Optional[Tuple[int, str]] = None, dictionary: Optional[bytes] = None):
+        self.archive_path = archive_path
+        self.throttle = throttle  # 读取限速器（需要 consume(字节数) 方法）
+        self.priority = priority  # 工作进程的 (nice, I/O类别)，None 表示不调整
+        self.policy = policy or CompressionPolicy()
+        self.workers = workers or os.cpu_count() or 1
+        self.use_processes = use_processes
+        self.max_pending = self.workers * 4  # 限制在途块数量，控制内存
+        self.entries: List[_ZipEntry] = []
+        self.file_hashes: Dict[str, Dict] = {}  # 归档内路径 -> {"size", "hash"}
+        self.total_raw_bytes = 0
+        self.dictionary = dictionary if zstandard is not None else None  # 小文件使用的zstd训练字典
+        self.dict_id = 0
+        self._fp = None
+
+    def __enter__(self):
+        self._fp = open(self.archive_path, 'wb')
+        if self.dictionary:
+            # 字典随归档保存，还原不依赖外部文件
+            self.dict_id = register_dictionary(self.dictionary)
+            future = Future()
+            future.set_result((self.dictionary, zlib.crc32(self.dictionary), len(self.dictionary), b""))
+            now = time.time()
+            stat = os.stat_result((0o100644, 0, 0, 0, 0, 0, len(self.dictionary), now, now, now))
+            self._write_entry(DICTIONARY_NAME, stat, "store", [future])
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self._write_manifest()
+                self._write_central_directory()
+        finally:
+            self._fp.close()
+        return False
+
+    def _make_executor(self):
+        initargs = (self.priority, self.dictionary)
+        if self.use_processes and self.workers > 1:
+            return ProcessPoolExecutor(max_workers=self.workers, initializer=init_compression_worker,
+                                       initargs=initargs)
+        return ThreadPoolExecutor(max_workers=self.workers, initializer=init_compression_worker, initargs=initargs)
+
+    def write_files(self, files: Iterable[Tuple[str, str]]):
+        """并行压缩并按顺序写入文件
+
+        小文件成批提交（逐个提交时进程间调度开销超过压缩本身），
+        pending 中每项为 [归档路径, stat, 编码, 结果列表, 占用的在途任务数]。
+        """
+        pending = deque()
+        self._in_flight = 0
+        self._batch: List[tuple] = []
+        self._batch_entries: List[list] = []
+        self._batch_bytes = 0
+        with self._make_executor() as executor:
+            for file_path, arc_path in files:
+                try:
+                    stat = os.stat(file_path)
+                except OSError as e:
+                    print(f"跳过无法读取的文件 {arc_path}: {e}")
+                    continue
+
+                codec, level = self.policy.select(arc_path)
+                size = stat.st_size
+                dict_id = 0
+                if self.dict_id and self.policy.uses_dictionary(arc_path, size):
+                    codec, level, dict_id = "zstd", self.policy.dictionary_level, self.dict_id
+                if self.throttle:
+                    self.throttle.consume(min(size, BLOCK_SIZE))  # 块在提交后由工作进程读取，提交前限速
+                if size <= SMALL_FILE_SIZE:
+                    entry = [arc_path, stat, codec, [], 0]
+                    pending.append(entry)
+                    self._batch.append((file_path, size, codec, level, dict_id))
+                    self._batch_entries.append(entry)
+                    self._batch_bytes += size
+                    if len(self._batch) >= SMALL_BATCH_FILES or self._batch_bytes >= SMALL_BATCH_BYTES:
+                        self._submit_batch(executor)
+                else:
+                    self._submit_batch(executor)  # 保证未提交的批次总在队尾
+                    offsets = list(range(0, size, BLOCK_SIZE))
+                    futures = []
+                    for offset in offsets:
+                        length = min(BLOCK_SIZE, size - offset)
+                        if self.throttle and offset:
+                            self.throttle.consume(length)
+                        futures.append(executor.submit(compress_block, file_path, offset, length, codec, level,
+                                                       offset == offsets[-1], dict_id))
+                    pending.append([arc_path, stat, codec, futures, len(futures)])
+                    self._in_flight += len(futures)
+
+                while self._in_flight > self.max_pending:
+                    self._write_pending(pending)
+
+            self._submit_batch(executor)
+            while pending:
+                self._write_pending(pending)
+
+    def _submit_batch(self, executor):
+        """提交当前的小文件批次"""
+        if not self._batch:
+            return
+        future = executor.submit(compress_small_files, self._batch)
+        for index, entry in enumerate(self._batch_entries):
+            entry[3].append(_BatchResult(future, index))
+        self._batch_entries[-1][4] = 1
+        self._in_flight += 1
+        self._batch, self._batch_entries, self._batch_bytes = [], [], 0
+
+    def _write_pending(self, pending: deque):
+        arc_path, stat, codec, futures, tasks = pending.popleft()
+        self._write_entry(arc_path, stat, codec, futures)
+        self._in_flight -= tasks
+
+    def _write_entry(self, arc_path: str, stat: os.stat_result, codec: str, futures: list):
+        """按顺序取回压缩块并写入一个条目"""
+        name = arc_path.replace(os.sep, '/').encode('utf-8')
+        entry = _ZipEntry()
+        entry.name = name
+        entry.method = CODEC_METHODS[codec]
+        entry.dos_time, entry.dos_date = _dos_datetime(stat.st_mtime)
+        entry.external_attr = (stat.st_mode & 0xFFFF) << 16
+        entry.header_offset = self._fp.tell()
+        zip64 = stat.st_size >= ZIP64_LIMIT - BLOCK_SIZE
+
+        # 先写占位本地头，写完数据后回填CRC和大小
+        self._fp.write(self._local_header(entry, 0, 0, 0, zip64))
+        crc = 0
+        compress_size = 0
+        file_size = 0
+        digests = []
+        for future in futures:
+            data, block_crc, raw_length, digest = future.result()
+            self._fp.write(data)
+            digests.append(digest)
+            crc = crc32_combine(crc, block_crc, raw_length) if file_size else block_crc
+            compress_size += len(data)
+            file_size += raw_length
+
+        entry.crc = crc
+        entry.compress_size = compress_size
+        entry.file_size = file_size
+        end = self._fp.tell()
+        self._fp.seek(entry.header_offset)
+        self._fp.write(self._local_header(entry, crc, compress_size, file_size, zip64))
+        self._fp.seek(end)
+
+        self.entries.append(entry)
+        self.total_raw_bytes += file_size
+        if arc_path not in INTERNAL_NAMES:
+            self.file_hashes[name.decode('utf-8')] = {"size": file_size, "hash": combine_block_digests(digests)}
+
+    def _write_manifest(self):
+        """在归档末尾写入逐文件哈希清单"""
+        manifest = {"hash_block_size": BLOCK_SIZE, "zstd_dict_id": self.dict_id, "files": self.file_hashes}
+        raw = json.dumps(manifest, ensure_ascii=False).encode('utf-8')
+        future = Future()
+        future.set_result((compress_data(raw, "deflate", 6), zlib.crc32(raw), len(raw), b""))
+        stat = os.stat_result((0o100644, 0, 0, 0, 0, 0, len(raw), time.time(), time.time(), time.time()))
+        self._write_entry(MANIFEST_NAME, stat, "deflate", [future])
+
+    @staticmethod
+    def _version_needed(method: int, zip64: bool) -> int:
+        if method == METHOD_ZSTD:
+            return 63
+        return 45 if zip64 else 20
+
+    def _local_header(self, entry: _ZipEntry, crc: int, compress_size: int, file_size: int,
+                      zip64: bool) -> bytes:
+        extra = b""
+        if zip64:
+            extra = struct.pack('<HHQQ', 0x0001, 16, file_size, compress_size)
+            compress_size = file_size = ZIP64_LIMIT
+        return struct.pack(
+            '<4sHHHHHLLLHH', b'PK\x03\x04', self._version_needed(entry.method, zip64), ZIP_FLAG_UTF8,
+            entry.method, entry.dos_time, entry.dos_date, crc, compress_size, file_size,
+            len(entry.name), len(extra)
+        ) + entry.name + extra
+
+    def _write_central_directory(self):
+        """写入中央目录与结束记录（必要时使用ZIP64）"""
+        start = self._fp.tell()
+        for entry in self.entries:
+            values = []
+            file_size, compress_size, header_offset = entry.file_size, entry.compress_size, entry.header_offset
+            if file_size >= ZIP64_LIMIT:
+                values.append(file_size)
+                file_size = ZIP64_LIMIT
+            if compress_size >= ZIP64_LIMIT:
+                values.append(compress_size)
+                compress_size = ZIP64_LIMIT
+            if header_offset >= ZIP64_LIMIT:
+                values.append(header_offset)
+                header_offset = ZIP64_LIMIT
+            extra = struct.pack('<HH', 0x0001, 8 * len(values)) + struct.pack(f'<{len(values)}Q', *values) \
+                if values else b""
+            version = self._version_needed(entry.method, bool(values))
+            self._fp.write(struct.pack(
+                '<4sBBHHHHHLLLHHHHHLL', b'PK\x01\x02', version, 3, version, ZIP_FLAG_UTF8,
+                entry.method, entry.dos_time, entry.dos_date, entry.crc, compress_size, file_size,
+                len(entry.name), len(extra), 0, 0, 0, entry.external_attr, header_offset
+            ) + entry.name + extra)
+
+        end = self._fp.tell()
+        count = len(self.entries)
+        size = end - start
+        if count >= 0xFFFF or start >= ZIP64_LIMIT or size >= ZIP64_LIMIT:
+            self._fp.write(struct.pack('<4sQHHLLQQQQ', b'PK\x06\x06', 44, 45, 45, 0, 0,
+                                       count, count, size, start))
+            self._fp.write(struct.pack('<4sLQL', b'PK\x06\x07', 0, end, 1))
+            self._fp.write(struct.pack('<4sHHHHLLH', b'PK\x05\x06', 0, 0, 0xFFFF, 0xFFFF,
+                                       ZIP64_LIMIT, ZIP64_LIMIT, 0))
+        else:
+            self._fp.write(struct.pack('<4sHHHHLLH', b'PK\x05\x06', 0, 0, count, count, size, start, 0))
+
+
+class _BoundedReader(io.RawIOBase):
+    """只读取底层文件中一段区域的读取器"""
+
+    def __init__(self, fp, remaining: int):
+        self._fp = fp
+        self._remaining = remaining
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if self._remaining <= 0:
+            return 0
+        data = self._fp.read(min(len(buffer), self._remaining))
+        self._remaining -= len(data)
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def zip_dictionary(zipf: zipfile.ZipFile) -> Optional[bytes]:
+    """读取归档内保存的zstd字典（缓存在ZipFile对象上），没有时返回None"""
+    dictionary = getattr(zipf, "_mcsg_dictionary", False)
+    if dictionary is False:
+        try:
+            dictionary = zipf.read(DICTIONARY_NAME)
+        except KeyError:
+            dictionary = None
+        zipf._mcsg_dictionary = dictionary
+    return dictionary
+
+
+def open_zip_member(zipf: zipfile.ZipFile, info: zipfile.ZipInfo):
+    """打开ZIP条目，额外支持标准库不支持的zstd(93)方法和归档内的zstd字典"""
+    if info.compress_type != METHOD_ZSTD:
+        return zipf.open(info)
+    dictionary = zip_dictionary(zipf)
+    if dictionary is None and getattr(zipfile, 'ZIP_ZSTANDARD', None) == METHOD_ZSTD:
+        return zipf.open(info)
+
+    if zstandard is None:
+        raise RuntimeError("读取zstd压缩的备份需要安装 zstandard")
+
+    fp = zipf.fp
+    fp.seek(info.header_offset)
+    header = fp.read(30)
+    if header[:4] != b'PK\x03\x04':
+        raise zipfile.BadZipFile(f"本地文件头损坏: {info.filename}")
+    name_length, extra_length = struct.unpack('<HH', header[26:30])
+    fp.seek(info.header_offset + 30 + name_length + extra_length)
+    raw = _BoundedReader(fp, info.compress_size)
+    # 带字典的解压器也能解压不使用字典的帧
+    decompressor = zstandard.ZstdDecompressor(
+        dict_data=zstandard.ZstdCompressionDict(dictionary) if dictionary else None)
+    return decompressor.stream_reader(raw, read_across_frames=True)
+
+
+class ThreadLocalZips:
+    """每个线程各自打开的ZipFile，并行读取同一归档时互不干扰"""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._opened: List[zipfile.ZipFile] = []
+        self._lock = threading.Lock()
+
+    def get(self, archive_path: str) -> zipfile.ZipFile:
+        cache = self._local.__dict__.setdefault("zips", {})
+        zipf = cache.get(archive_path)
+        if zipf is None:
+            zipf = zipfile.ZipFile(archive_path, 'r')
+            cache[archive_path] = zipf
+            with self._lock:
+                self._opened.append(zipf)
+        return zipf
+
+    def close(self):
+        with self._lock:
+            for zipf in self._opened:
+                zipf.close()
+            self._opened.clear()
+
+
+def load_zip_manifest(zipf: zipfile.ZipFile) -> Optional[Dict]:
+    """读取归档内的逐文件哈希清单，旧备份没有清单时返回None"""
+    try:
+        with zipf.open(MANIFEST_NAME) as f:
+            return json.loads(f.read().decode('utf-8'))
+    except (KeyError, ValueError):
+        return None
+
+
+def read_member_checked(zipf: zipfile.ZipFile, info: zipfile.ZipInfo, expected_hash: Optional[str] = None,
+                        block_size: int = 1024 * 1024):
+    """逐块读取条目并在末尾校验CRC32和清单哈希，校验失败抛出 zipfile.BadZipFile"""
+    crc = 0
+    hasher = BlockHasher() if expected_hash else None
+    with open_zip_member(zipf, info) as src:
+        while True:
+            block = src.read(block_size)
+            if not block:
+                break
+            crc = zlib.crc32(block, crc)
+            if hasher:
+                hasher.update(block)
+            yield block
+    if crc != info.CRC:
+        raise zipfile.BadZipFile(f"CRC校验失败: {info.filename}")
+    if hasher and hasher.hexdigest() != expected_hash:
+        raise zipfile.BadZipFile(f"哈希校验失败: {info.filename}")
+
+
+def extract_member(zipf: zipfile.ZipFile, info: zipfile.ZipInfo, target_path: str,
+                   expected_hash: Optional[str] = None):
+    """流式解压单个条目到目标路径
+
+    先写临时文件，校验通过后再替换目标，不会留下半个或损坏的文件。
+    """
+    os.makedirs(os.path.dirname(target_path) or ".", exist_ok=True)
+    temp_path = target_path + ".restore.tmp"
+    try:
+        with open(temp_path, 'wb') as dst:
+            for block in read_member_checked(zipf, info, expected_hash):
+                dst.write(block)
+        os.replace(temp_path, target_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def member_target_path(target_directory: str, name: str) -> Optional[str]:
+    """计算条目的解压路径，拒绝绝对路径和跳出目标目录的条目"""
+    parts = [p for p in name.replace('\\', '/').split('/') if p not in ('', '.')]
+    if not parts or '..' in parts or os.path.isabs(name) or ':' in parts[0]:
+        return None
+    return os.path.join(target_directory, *parts)
+
+
+def extract_archive(archive_path: str, target_directory: str, paths: Optional[Iterable[str]] = None,
+                    max_workers: int = 4) -> int:
+    """多线程解压备份归档（支持zstd条目），边写边校验，返回解压的文件数
+
+    paths 指定时只解压这些条目。
+    """
+    with zipfile.ZipFile(archive_path, 'r') as zipf:
+        manifest = load_zip_manifest(zipf) or {"files": {}}
+        wanted = set(paths) if paths is not None else None
+        infos = []
+        for info in zipf.infolist():
+            if info.filename in INTERNAL_NAMES or (wanted is not None and info.filename not in wanted):
+                continue
+            target_path = member_target_path(target_directory, info.filename)
+            if target_path is None:
+                print(f"跳过不安全的条目: {info.filename}")
+                continue
+            if info.is_dir():
+                os.makedirs(target_path, exist_ok=True)
+                continue
+            infos.append((info, target_path))
+
+    # 大文件先开始，线程负载更均衡
+    infos.sort(key=lambda item: item[0].file_size, reverse=True)
+    zips = ThreadLocalZips()
+
+    def extract(item):
+        info, target_path = item
+        expected = manifest["files"].get(info.filename, {}).get("hash")
+        extract_member(zips.get(archive_path), info, target_path, expected)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for _ in executor.map(extract, infos):
+                pass
+    finally:
+        zips.close()
+    return len(infos)
+
+
+def verify_archive(archive_path: str, throttle=None) -> Tuple[bool, str]:
+    """校验归档内所有条目的CRC32和清单哈希，返回 (是否完好, 错误信息)
+
+    throttle 为限速器（需要 consume(字节数) 方法），用于后台校验时限制I/O。
+    """
+    try:
+        with zipfile.ZipFile(archive_path, 'r') as zipf:
+            manifest = load_zip_manifest(zipf) or {"files": {}}
+            names = set()
+            for info in zipf.infolist():
+                if info.is_dir() or info.filename in INTERNAL_NAMES:
+                    continue
+                names.add(info.filename)
+                expected = manifest["files"].get(info.filename, {}).get("hash")
+                for block in read_member_checked(zipf, info, expected):
+                    if throttle:
+                        throttle.consume(len(block))
+            missing = set(manifest["files"]) - names
+            if missing:
+                return False, f"清单中的文件缺失: {', '.join(sorted(missing)[:5])}"
+        return True, ""
+    except Exception as e:  # 包括 zstandard.ZstdError 等解压错误
+        return False, str(e)
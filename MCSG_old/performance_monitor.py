@@ -4,6 +4,7 @@
 性能监控模块
 """
 
+import os
 import psutil
 import time
 import threading
@@ -12,6 +13,8 @@ from typing import Dict, List, Optional, Callable
 from dataclasses import dataclass
 from collections import deque
 
+from world_stats import world_stats_cache
+
 
 @dataclass
 class PerformanceData:
@@ -22,7 +25,7 @@ class PerformanceData:
     memory_percent: float
     tps: float = 0.0
     online_players: int = 0
-    chunks_loaded: int = 0
+    world_chunks: int = 0  # 世界中已生成的区块数（扫描区域文件头）
     entities_count: int = 0
     
     def to_dict(self) -> Dict:
@@ -33,7 +36,7 @@ class PerformanceData:
             "memory_percent": self.memory_percent,
             "tps": self.tps,
             "online_players": self.online_players,
-            "chunks_loaded": self.chunks_loaded,
+            "world_chunks": self.world_chunks,
             "entities_count": self.entities_count
         }
 
@@ -115,7 +118,7 @@ class PerformanceMonitor:
         # 服务器特定数据
         tps = self._get_server_tps()
         online_players = self._get_online_players()
-        chunks_loaded = self._get_chunks_loaded()
+        world_chunks = self._get_world_chunks()
         entities_count = self._get_entities_count()
         
         return PerformanceData(
@@ -125,7 +128,7 @@ class PerformanceMonitor:
             memory_percent=memory_percent,
             tps=tps,
             online_players=online_players,
-            chunks_loaded=chunks_loaded,
+            world_chunks=world_chunks,
             entities_count=entities_count
         )
     
@@ -177,14 +180,14 @@ class PerformanceMonitor:
         
         return 0
     
-    def _get_chunks_loaded(self) -> int:
-        """获取已加载区块数"""
+    def _get_world_chunks(self) -> int:
+        """获取世界中已生成的区块数（后台扫描区域文件头，每5分钟刷新）"""
         try:
-            # 可以通过服务器API或日志获取
-            # 目前返回模拟数据
-            if self.server_manager and self.server_manager.is_server_running():
-                import random
-                return random.randint(100, 500)
+            if self.server_manager:
+                directory = os.path.dirname(os.path.abspath(self.server_manager.config_file))
+                stats = world_stats_cache.get(directory, max_age=300, block=False)
+                if stats:
+                    return stats.total_chunks
         except Exception:
             pass
         
@@ -233,7 +236,7 @@ class PerformanceMonitor:
                 "memory_percent": 0.0,
                 "tps": 0.0,
                 "online_players": 0,
-                "chunks_loaded": 0,
+                "world_chunks": 0,
                 "entities_count": 0
             }
         
@@ -243,7 +246,7 @@ class PerformanceMonitor:
             "memory_percent": sum(d.memory_percent for d in history) / len(history),
             "tps": sum(d.tps for d in history) / len(history),
             "online_players": sum(d.online_players for d in history) / len(history),
-            "chunks_loaded": sum(d.chunks_loaded for d in history) / len(history),
+            "world_chunks": sum(d.world_chunks for d in history) / len(history),
             "entities_count": sum(d.entities_count for d in history) / len(history)
         }
     
@@ -13,6 +13,13 @@ from dataclasses import dataclass
 from datetime import datetime, timedelta
 
 
+# 服务器日志中的玩家进出消息
+PLAYER_JOIN_PATTERN = re.compile(r'\]:\s+(\w{1,16})(?:\[[^\]]*\])? joined the game')
+PLAYER_LEAVE_PATTERN = re.compile(r'\]:\s+(\w{1,16})(?:\[[^\]]*\])? left the game')
+PLAYER_UUID_PATTERN = re.compile(r'UUID of player (\w{1,16}) is ([0-9a-fA-F-]{32,36})')
+SERVER_STOPPING_PATTERN = re.compile(r'\]:\s+Stopping (?:the )?server')
+
+
 @dataclass
 class PlayerInfo:
     """玩家信息"""
@@ -74,6 +81,7 @@ class PlayerManager:
         
         self.players: Dict[str, PlayerInfo] = {}
         self.online_players: Set[str] = set()
+        self.last_activity_time = time.time()  # 最近一次有玩家进出的时间
         
         self.load_player_data()
     
@@ -194,6 +202,43 @@ class PlayerManager:
         else:
             self.online_players.discard(username)
             self.players[username].last_seen = datetime.now().isoformat()
+        self.last_activity_time = time.time()
+    
+    def reset_online_status(self):
+        """将所有玩家标记为离线（服务器启动或停止时调用）"""
+        for username in list(self.online_players):
+            self.update_player_online_status(username, False)
+        for player in self.players.values():
+            player.is_online = False
+        self.online_players.clear()
+        self.last_activity_time = time.time()
+    
+    def get_online_count(self) -> int:
+        """获取实时在线玩家数"""
+        return len(self.online_players)
+    
+    def process_output_line(self, line: str):
+        """根据服务器输出行跟踪玩家在线状态"""
+        if not line:
+            return
+        
+        match = PLAYER_JOIN_PATTERN.search(line)
+        if match:
+            self.update_player_online_status(match.group(1), True)
+            return
+        
+        match = PLAYER_LEAVE_PATTERN.search(line)
+        if match:
+            self.update_player_online_status(match.group(1), False)
+            return
+        
+        match = PLAYER_UUID_PATTERN.search(line)
+        if match:
+            self.add_player(match.group(1), match.group(2)).uuid = match.group(2)
+            return
+        
+        if SERVER_STOPPING_PATTERN.search(line):
+            self.reset_online_status()
     
     def kick_player(self, username: str, reason: str = "被管理员踢出") -> bool:
         """踢出玩家"""
@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+代理（Velocity/BungeeCord）网络编排模块
+"""
+
+import os
+import re
+import time
+import uuid
+import hashlib
+import threading
+from collections import Counter
+from typing import Dict, List, Optional
+
+from mc_server_manager import MinecraftServerManager
+from multi_server_manager import ServerInstance
+
+
+PROXY_TYPES = ("velocity", "bungeecord")
+PROXY_RELOAD_COMMANDS = {
+    "velocity": "velocity reload",
+    "bungeecord": "greload"
+}
+PROXY_CONFIG_FILES = {
+    "velocity": "velocity.toml",
+    "bungeecord": "config.yml"
+}
+TOML_TABLE_PATTERN = re.compile(r'^\s*\[([^\[\]]+)\]\s*$')
+
+
+class ProxyServerManager(MinecraftServerManager):
+    """代理进程管理器（代理不使用 server.properties）"""
+
+    def create_server_properties(self) -> None:
+        """代理无需生成 server.properties"""
+        return None
+
+
+def backend_name(server) -> str:
+    """生成代理配置中使用的后端名称"""
+    name = re.sub(r'[^a-z0-9_-]+', '-', server.name.lower()).strip('-')
+    return name or f"server-{server.server_id[:8]}"
+
+
+def unique_backend_names(servers) -> Dict[str, str]:
+    """一组后端的配置名称（server_id -> 名称），规范化后重名的后端追加 server_id 前8位"""
+    names = {s.server_id: backend_name(s) for s in servers}
+    counts = Counter(names.values())
+    return {server_id: name if counts[name] == 1 else f"{name}-{server_id[:8]}"
+            for server_id, name in names.items()}
+
+
+class ProxyInstance(ServerInstance):
+    """代理实例
+
+    backend_ids 为空时代理所有已注册的游戏服务器。
+    """
+
+    instance_type = "proxy"
+    manager_class = ProxyServerManager
+
+    def __init__(self, server_id: str, name: str, directory: str, config: Dict[str, str],
+                 proxy_type: str = "velocity", backend_ids: Optional[List[str]] = None,
+                 routing_policy: str = "least_loaded", backend_host: str = "127.0.0.1"):
+        if proxy_type not in PROXY_TYPES:
+            raise ValueError(f"不支持的代理类型: {proxy_type}")
+        self.proxy_type = proxy_type
+        self.backend_ids = backend_ids or []
+        self.routing_policy = routing_policy  # "least_loaded" 或 "static"
+        self.backend_host = backend_host
+        super().__init__(server_id, name, directory, config)
+        self.tps_command = ""
+
+    def to_dict(self) -> Dict:
+        """转换为字典"""
+        data = super().to_dict()
+        data.update({
+            "proxy_type": self.proxy_type,
+            "backend_ids": self.backend_ids,
+            "routing_policy": self.routing_policy,
+            "backend_host": self.backend_host
+        })
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'ProxyInstance':
+        """从字典创建实例"""
+        return cls(
+            server_id=data["server_id"],
+            name=data["name"],
+            directory=data["directory"],
+            config=data["config"],
+            proxy_type=data.get("proxy_type", "velocity"),
+            backend_ids=data.get("backend_ids", []),
+            routing_policy=data.get("routing_policy", "least_loaded"),
+            backend_host=data.get("backend_host", "127.0.0.1")
+        )
+
+    @property
+    def config_file(self) -> str:
+        """代理配置文件路径"""
+        return os.path.join(self.directory, PROXY_CONFIG_FILES[self.proxy_type])
+
+    def request_tps(self) -> bool:
+        """代理没有TPS"""
+        return False
+
+    def reload_config(self) -> bool:
+        """让代理重新加载配置"""
+        return self.send_command(PROXY_RELOAD_COMMANDS[self.proxy_type])
+
+    def transfer_player(self, username: str, target_backend: str) -> bool:
+        """通过代理把玩家转移到指定后端"""
+        return self.send_command(f"send {username} {target_backend}")
+
+
+def render_velocity_servers(servers: Dict[str, str], try_order: List[str]) -> List[str]:
+    """生成 velocity.toml 的 [servers] 表"""
+    lines = ["[servers]"]
+    for name, address in servers.items():
+        lines.append(f'{name} = "{address}"')
+    lines.append("try = [" + ", ".join(f'"{name}"' for name in try_order) + "]")
+    lines.append("")
+    return lines
+
+
+def update_velocity_config(text: str, servers: Dict[str, str], try_order: List[str]) -> str:
+    """替换 velocity.toml 中的 [servers] 表，保留其他内容"""
+    lines = text.splitlines()
+    output = []
+    in_servers = False
+    replaced = False
+    for line in lines:
+        match = TOML_TABLE_PATTERN.match(line)
+        if match:
+            in_servers = match.group(1).strip() == "servers"
+            if in_servers:
+                output.extend(render_velocity_servers(servers, try_order))
+                replaced = True
+                continue
+        if not in_servers:
+            output.append(line)
+
+    if not replaced:
+        if output and output[-1].strip():
+            output.append("")
+        output.extend(render_velocity_servers(servers, try_order))
+
+    return "\n".join(output).rstrip("\n") + "\n"
+
+
+def update_bungeecord_config(text: str, servers: Dict[str, str], try_order: List[str]) -> str:
+    """更新 BungeeCord config.yml 的 servers 与 priorities"""
+    import yaml
+
+    data = yaml.safe_load(text) if text.strip() else {}
+    data = data or {}
+    old_servers = data.get("servers") or {}
+
+    new_servers = {}
+    for name, address in servers.items():
+        entry = dict(old_servers.get(name) or {})
+        entry.setdefault("motd", name)
+        entry.setdefault("restricted", False)
+        entry["address"] = address
+        new_servers[name] = entry
+    data["servers"] = new_servers
+
+    listeners = data.get("listeners") or [{"host": "0.0.0.0:25577"}]
+    for listener in listeners:
+        listener["priorities"] = list(try_order)
+    data["listeners"] = listeners
+
+    return yaml.safe_dump(data, sort_keys=False, allow_unicode=True)
+
+
+class ProxyManager:
+    """代理编排管理器
+
+    根据 MultiServerManager 中注册的实例生成代理的后端列表并推送重载；
+    least_loaded 路由策略按实时在线人数和TPS排序后端，使新加入的玩家进入最健康的后端。
+    """
+
+    def __init__(self, multi_server_manager, pool_manager=None):
+        self.multi_server_manager = multi_server_manager
+        self.pool_manager = pool_manager
+        self.min_tps = 15.0  # 低于该TPS的后端不参与新玩家分配
+        self.stats_max_age = 120  # TPS数据超过该秒数视为未知
+        self.sync_interval = 30
+        self.min_reload_interval = 10
+        self.syncing = False
+        self.sync_thread = None
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._config_hashes: Dict[str, str] = {}
+        self._last_reload: Dict[str, float] = {}
+        self._pending_reload = set()  # 配置已写入但还没有重载的代理
+
+    def create_proxy(self, name: str, proxy_type: str = "velocity", core_file: str = "",
+                     port: int = 25577, backend_ids: Optional[List[str]] = None) -> str:
+        """创建代理实例"""
+        server_id = str(uuid.uuid4())
+        directory = os.path.join("servers", server_id)
+        os.makedirs(directory, exist_ok=True)
+
+        config = {"port": str(port), "memory": "512M", "server_args": ""}
+        if core_file and os.path.exists(core_file):
+            import shutil
+            core_filename = os.path.basename(core_file)
+            shutil.copy2(core_file, os.path.join(directory, core_filename))
+            config["core"] = core_filename
+
+        proxy = ProxyInstance(server_id, name, directory, config, proxy_type, backend_ids)
+        self.multi_server_manager.servers[server_id] = proxy
+        self.multi_server_manager.save_servers()
+        return server_id
+
+    def get_proxies(self) -> List[ProxyInstance]:
+        """获取所有代理实例"""
+        return [s for s in self.multi_server_manager.get_all_servers() if isinstance(s, ProxyInstance)]
+
+    def get_backends(self, proxy: ProxyInstance) -> List[ServerInstance]:
+        """获取代理的后端实例"""
+        if proxy.backend_ids:
+            servers = [self.multi_server_manager.get_server(i) for i in proxy.backend_ids]
+            return [s for s in servers if s and s.instance_type == "server"]
+        return self.multi_server_manager.get_backend_servers()
+
+    def is_healthy(self, server) -> bool:
+        """后端是否可以接收新玩家"""
+        if not server.is_running() or getattr(server, 'hibernating', False):
+            return False
+        if self.pool_manager and self.pool_manager.is_draining(server.server_id):
+            return False
+        if self._has_fresh_stats(server) and 0 < server.tps < self.min_tps:
+            return False
+        return True
+
+    def _has_fresh_stats(self, server) -> bool:
+        return time.time() - getattr(server, 'stats_time', 0) <= self.stats_max_age
+
+    def load_score(self, server) -> float:
+        """负载分数，越小越空闲
+
+        以在线人数占容量的比例为主，TPS每低于20一点增加相当于5%容量的惩罚。
+        """
+        try:
+            max_players = int(server.manager.get_config_value("max_players")) or 1
+        except (TypeError, ValueError, AttributeError):
+            max_players = 20
+
+        score = server.get_online_player_count() / max_players
+        if self._has_fresh_stats(server) and server.tps > 0:
+            score += (20.0 - server.tps) * 0.05
+        return score
+
+    def rank_backends(self, proxy: ProxyInstance) -> List[ServerInstance]:
+        """按路由策略排序后端，不健康的后端排在最后"""
+        backends = self.get_backends(proxy)
+        if proxy.routing_policy != "least_loaded":
+            return backends
+
+        healthy = [s for s in backends if self.is_healthy(s)]
+        unhealthy = [s for s in backends if s not in healthy]
+        healthy.sort(key=self.load_score)
+        return healthy + unhealthy
+
+    def backend_names(self, proxy: ProxyInstance) -> Dict[str, str]:
+        """代理配置中各后端的名称（server_id -> 名称）"""
+        return unique_backend_names(self.get_backends(proxy))
+
+    def select_backend(self, proxy: ProxyInstance) -> Optional[ServerInstance]:
+        """选择最空闲的健康后端"""
+        for server in self.rank_backends(proxy):
+            if self.is_healthy(server):
+                return server
+        return None
+
+    def render_config(self, proxy: ProxyInstance) -> str:
+        """根据已注册实例生成代理配置内容"""
+        ranked = self.rank_backends(proxy)
+        names = unique_backend_names(ranked)
+        servers = {names[s.server_id]: f"{proxy.backend_host}:{s.port}" for s in ranked}
+        try_order = [names[s.server_id] for s in ranked if self.is_healthy(s)]
+        if not try_order:
+            try_order = list(servers)
+
+        text = ""
+        if os.path.exists(proxy.config_file):
+            with open(proxy.config_file, 'r', encoding='utf-8') as f:
+                text = f.read()
+
+        if proxy.proxy_type == "velocity":
+            return update_velocity_config(text, servers, try_order)
+        return update_bungeecord_config(text, servers, try_order)
+
+    def sync_proxy(self, proxy: ProxyInstance, refresh_stats: bool = False) -> bool:
+        """重新生成代理配置，内容变化时写入并推送重载（受最小重载间隔限制），返回是否有变化"""
+        with self._lock:
+            if refresh_stats:
+                for server in self.get_backends(proxy):
+                    if server.is_running():
+                        server.request_tps()
+
+            try:
+                content = self.render_config(proxy)
+            except Exception as e:
+                print(f"生成代理配置失败: {e}")
+                return False
+
+            digest = hashlib.sha1(content.encode('utf-8')).hexdigest()
+            changed = self._config_hashes.get(proxy.server_id) != digest
+            if changed:
+                try:
+                    temp_file = proxy.config_file + ".tmp"
+                    with open(temp_file, 'w', encoding='utf-8') as f:
+                        f.write(content)
+                    os.replace(temp_file, proxy.config_file)
+                except Exception as e:
+                    print(f"写入代理配置失败: {e}")
+                    return False
+                self._config_hashes[proxy.server_id] = digest
+                self._pending_reload.add(proxy.server_id)
+
+            # 因重载间隔被推迟的重载在之后的同步中补上；未运行的代理启动时会读取新配置
+            if proxy.server_id in self._pending_reload:
+                if not proxy.is_running():
+                    self._pending_reload.discard(proxy.server_id)
+                elif time.time() - self._last_reload.get(proxy.server_id, 0) >= self.min_reload_interval:
+                    if proxy.reload_config():
+                        self._pending_reload.discard(proxy.server_id)
+                        self._last_reload[proxy.server_id] = time.time()
+            return changed
+
+    def sync_all(self, refresh_stats: bool = False):
+        """同步所有代理"""
+        for proxy in self.get_proxies():
+            self.sync_proxy(proxy, refresh_stats)
+
+    def start_auto_sync(self):
+        """定期刷新后端状态并同步代理配置"""
+        if self.syncing:
+            return
+
+        self.syncing = True
+        self._stop_event.clear()
+        self.sync_thread = threading.Thread(target=self._sync_loop, daemon=True)
+        self.sync_thread.start()
+
+    def stop_auto_sync(self):
+        """停止自动同步"""
+        self.syncing = False
+        self._stop_event.set()
+        if self.sync_thread:
+            self.sync_thread.join(timeout=5)
+
+    def _sync_loop(self):
+        """同步循环"""
+        while self.syncing:
+            try:
+                self.sync_all(refresh_stats=True)
+            except Exception as e:
+                print(f"代理同步出错: {e}")
+            self._stop_event.wait(self.sync_interval)
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地替身进程（用于在没有Java和真实服务端的环境下测试代理编排）
+
+backend 模式模拟原版/Paper服务器：在端口上响应服务器列表Ping，控制台输出启动完成、
+玩家进出、TPS和保存完成等日志；join/leave 命令模拟玩家进出。
+proxy 模式模拟 Velocity/BungeeCord 控制台：响应重载和 send 命令。
+用法: python proxy_standin.py backend|proxy [端口]
+"""
+
+import sys
+import json
+import socket
+import threading
+import time
+
+from hibernation_manager import ProtocolError, decode_varint, encode_string, read_packet, send_packet
+
+
+STANDIN_SCRIPT = __file__
+
+
+class StandinState:
+    """替身进程的状态"""
+
+    def __init__(self, mode: str, port: int):
+        self.mode = mode
+        self.port = port
+        self.players = set()
+        self.tps = 20.0
+        self.reloads = 0
+        self.lock = threading.Lock()
+
+
+def log(message: str, thread: str = "Server thread"):
+    print(f"[{time.strftime('%H:%M:%S')}] [{thread}/INFO]: {message}", flush=True)
+
+
+def _handle_ping(conn: socket.socket, state: StandinState):
+    """响应服务器列表Ping（握手 + 状态请求 + Ping）"""
+    try:
+        conn.settimeout(5)
+        packet_id, data = read_packet(conn)
+        protocol, _ = decode_varint(data)
+        if packet_id != 0x00 or read_packet(conn)[0] != 0x00:
+            return
+        with state.lock:
+            status = {
+                "version": {"name": "Standin", "protocol": protocol},
+                "players": {"max": 20, "online": len(state.players),
+                            "sample": [{"name": name, "id": "00000000-0000-0000-0000-000000000000"}
+                                       for name in sorted(state.players)]},
+                "description": {"text": f"standin {state.mode}"}
+            }
+        send_packet(conn, 0x00, encode_string(json.dumps(status)))
+        packet_id, payload = read_packet(conn)
+        if packet_id == 0x01:
+            send_packet(conn, 0x01, payload)
+    except (ProtocolError, OSError):
+        pass
+    finally:
+        conn.close()
+
+
+def serve_ping(state: StandinState) -> socket.socket:
+    """在后台线程监听端口"""
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(("127.0.0.1", state.port))
+    listener.listen(16)
+
+    def accept_loop():
+        while True:
+            try:
+                conn, _ = listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=_handle_ping, args=(conn, state), daemon=True).start()
+
+    threading.Thread(target=accept_loop, daemon=True).start()
+    return listener
+
+
+def handle_command(state: StandinState, line: str) -> bool:
+    """执行一条控制台命令，返回是否继续运行"""
+    parts = line.split()
+    if not parts:
+        return True
+    command, args = parts[0], parts[1:]
+
+    if command in ("stop", "end", "shutdown"):
+        log("Stopping the server" if state.mode == "backend" else "Shutting down the proxy...")
+        return False
+
+    if state.mode == "proxy":
+        if line in ("velocity reload", "greload"):
+            state.reloads += 1
+            log(f"Configuration reloaded ({state.reloads})", "main")
+        elif command == "send" and len(args) == 2:
+            log(f"Sent {args[0]} to {args[1]}", "main")
+        else:
+            log(f"Unknown command: {line}", "main")
+        return True
+
+    if command == "join" and args:
+        with state.lock:
+            state.players.add(args[0])
+        log(f"{args[0]} joined the game")
+    elif command == "leave" and args:
+        with state.lock:
+            state.players.discard(args[0])
+        log(f"{args[0]} left the game")
+    elif command == "settps" and args:
+        state.tps = float(args[0])
+    elif command == "tps":
+        log(f"TPS from last 1m, 5m, 15m: {state.tps:.1f}, {state.tps:.1f}, {state.tps:.1f}")
+    elif line == "tick query":
+        log(f"Average time per tick: {1000.0 / max(state.tps, 0.1):.1f}ms (Target: 50.0ms)")
+    elif command == "list":
+        with state.lock:
+            names = sorted(state.players)
+        log(f"There are {len(names)} of a max of 20 players online: {', '.join(names)}")
+    elif command == "save-all":
+        log("Saving the game (this may take a moment!)")
+        log("Saved the game")
+    elif command in ("save-off", "save-on"):
+        log("Automatic saving is now " + ("disabled" if command == "save-off" else "enabled"))
+    else:
+        log("Unknown or incomplete command, see below for error")
+    return True
+
+
+def standin_command(mode: str, port: int) -> list:
+    """启动替身进程的命令"""
+    return [sys.executable, "-u", STANDIN_SCRIPT, mode, str(port)]
+
+
+def use_standin(instance, mode: str = "backend"):
+    """让实例以替身进程代替Java服务端启动（instance.start() 照常使用）"""
+    instance.config["core"] = STANDIN_SCRIPT
+    instance.manager.set_config_value("core", STANDIN_SCRIPT)
+    instance.manager.get_java_command = lambda: standin_command(mode, instance.port)
+
+
+def main():
+    """主函数"""
+    mode = sys.argv[1] if len(sys.argv) > 1 else "backend"
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else 25565
+    if mode not in ("backend", "proxy"):
+        print(f"未知模式: {mode}")
+        return 1
+
+    state = StandinState(mode, port)
+    listener = serve_ping(state)
+    if mode == "backend":
+        log("Starting minecraft server version Standin")
+        log(f"Starting Minecraft server on *:{port}")
+        log('Done (0.100s)! For help, type "help"')
+    else:
+        log(f"Listening on /127.0.0.1:{port}", "main")
+        log('Done (0.10s)!', "main")
+
+    for line in sys.stdin:
+        if not handle_command(state, line.strip()):
+            break
+    listener.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
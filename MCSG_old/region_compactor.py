@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+区域文件整理模块
+
+区块变大或移动后旧的扇区不会被回收，区域文件里会积累空洞，读取也变得分散。
+整理时按Z序把区块连续写入新文件并原子替换，去掉所有空闲扇区；区块数据不解压、
+不修改。只能在实例停止时运行（与区块清理一样持有 session.lock）。
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import anvil
+from world_pruner import RELATED_REGION_DIRECTORIES, world_locked, world_roots
+from world_stats import find_region_directories
+
+
+@dataclass
+class RegionCompactResult:
+    """单个区域文件的整理结果"""
+    path: str
+    before: Optional[anvil.RegionStats] = None
+    after: Optional[anvil.RegionStats] = None
+    skipped: bool = False  # 已经是紧凑的，没有重写
+    error: str = ""
+
+    def to_dict(self) -> Dict:
+        return {
+            "path": self.path,
+            "before": self.before.to_dict() if self.before else None,
+            "after": self.after.to_dict() if self.after else None,
+            "skipped": self.skipped,
+            "error": self.error
+        }
+
+
+def _fragmentation(stats: List[anvil.RegionStats]) -> float:
+    used = sum(s.used_sectors for s in stats)
+    free = sum(s.free_sectors for s in stats)
+    return free / (used + free) if used + free else 0.0
+
+
+@dataclass
+class CompactReport:
+    """整理报告"""
+    directory: str
+    dry_run: bool
+    started_at: float = 0.0
+    duration_seconds: float = 0.0
+    regions: List[RegionCompactResult] = field(default_factory=list)
+
+    def _stats(self, attr: str) -> List[anvil.RegionStats]:
+        return [getattr(r, attr) for r in self.regions if getattr(r, attr) is not None]
+
+    @property
+    def bytes_before(self) -> int:
+        return sum(s.file_size for s in self._stats("before"))
+
+    @property
+    def bytes_after(self) -> int:
+        return sum(s.file_size for s in self._stats("after"))
+
+    def to_dict(self) -> Dict:
+        before, after = self._stats("before"), self._stats("after")
+        return {
+            "directory": self.directory,
+            "dry_run": self.dry_run,
+            "started_at": self.started_at,
+            "duration_seconds": self.duration_seconds,
+            "regions_scanned": len(self.regions),
+            "regions_rewritten": sum(1 for r in self.regions if not r.skipped and not r.error),
+            "bytes_before": self.bytes_before,
+            "bytes_after": self.bytes_after,
+            "bytes_reclaimed": self.bytes_before - self.bytes_after,
+            "fragmentation_before": round(_fragmentation(before), 4),
+            "fragmentation_after": round(_fragmentation(after), 4),
+            "gaps_before": sum(s.gaps for s in before),
+            "gaps_after": sum(s.gaps for s in after),
+            "errors": [r.to_dict() for r in self.regions if r.error]
+        }
+
+
+def _estimate_compacted(stats: anvil.RegionStats) -> anvil.RegionStats:
+    """演练时估算整理后的统计（按头部记录的扇区数，实际可能更小）"""
+    size = anvil.HEADER_SIZE + stats.used_sectors * anvil.SECTOR_SIZE if stats.chunk_count else stats.file_size
+    return anvil.RegionStats(stats.path, stats.region_x, stats.region_z, size, stats.chunk_count,
+                             stats.used_sectors, 0, 0, stats.oldest_timestamp, stats.newest_timestamp)
+
+
+def compact_region(path: str, dry_run: bool = False, force: bool = False) -> RegionCompactResult:
+    """按Z序连续重写一个区域文件，已经紧凑的文件跳过（force 时仍重写）
+
+    有损坏区块时不改动文件，避免丢失数据。
+    """
+    result = RegionCompactResult(path)
+    try:
+        result.before = anvil.scan_region_file(path)
+        header = anvil.read_region_header(path)
+        if result.before.file_size < anvil.HEADER_SIZE or (not force and anvil.is_compact(header,
+                                                                                           result.before.file_size)):
+            result.skipped = True
+            result.after = result.before
+            return result
+        if dry_run:
+            result.after = _estimate_compacted(result.before)
+            return result
+
+        errors = []
+        records = list(anvil.iter_chunks(path, errors))
+        if errors:
+            result.error = f"有 {len(errors)} 个区块损坏，跳过"
+            result.after = result.before
+            return result
+        anvil.write_region(path, anvil.spatial_order(records))
+        result.after = anvil.scan_region_file(path)
+    except (OSError, ValueError) as e:
+        result.error = str(e)
+        if result.after is None:
+            result.after = result.before
+    return result
+
+
+def _remove_stale_temp_files(directory: str):
+    """删除上次中断留下的临时文件（原文件在替换前始终完整）"""
+    for name in os.listdir(directory):
+        if name.endswith(".mca.tmp"):
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError as e:
+                print(f"删除临时文件失败 {name}: {e}")
+
+
+def compact_world(directory: str, dry_run: bool = False, force: bool = False,
+                  max_workers: int = 4) -> CompactReport:
+    """并行整理服务器目录下所有维度的区域、实体和兴趣点文件
+
+    必须在服务器停止时调用：运行期间锁住 session.lock，服务器正在运行时抛出 RuntimeError。
+    """
+    report = CompactReport(directory, dry_run, time.time())
+    dimensions = find_region_directories(directory)
+    region_directories = []
+    for region_directory in dimensions.values():
+        region_directories.append(region_directory)
+        parent = os.path.dirname(region_directory)
+        region_directories.extend(os.path.join(parent, sub) for sub in RELATED_REGION_DIRECTORIES
+                                  if os.path.isdir(os.path.join(parent, sub)))
+
+    with world_locked(world_roots(directory, dimensions)):
+        paths = []
+        for region_directory in region_directories:
+            if not dry_run:
+                _remove_stale_temp_files(region_directory)
+            paths.extend(os.path.join(region_directory, name) for name in sorted(os.listdir(region_directory))
+                         if anvil.REGION_FILE_PATTERN.match(name))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            report.regions = list(executor.map(lambda p: compact_region(p, dry_run, force), paths))
+
+    report.duration_seconds = round(time.time() - report.started_at, 3)
+    return report
+
+
+def format_compact_report(report: CompactReport) -> str:
+    """把整理报告格式化为文本"""
+    data = report.to_dict()
+    lines = [
+        f"区域文件整理{'（演练，未修改文件）' if report.dry_run else ''}: {report.directory}",
+        f"文件: {data['regions_scanned']}，重写 {data['regions_rewritten']}",
+        f"碎片率: {data['fragmentation_before']:.1%} → {data['fragmentation_after']:.1%}，"
+        f"空洞: {data['gaps_before']} → {data['gaps_after']}",
+        f"大小: {data['bytes_before'] / 1024 / 1024:.1f} MB → {data['bytes_after'] / 1024 / 1024:.1f} MB，"
+        f"回收 {data['bytes_reclaimed'] / 1024 / 1024:.1f} MB，耗时 {report.duration_seconds:.1f} 秒"
+    ]
+    for error in data["errors"]:
+        lines.append(f"  [跳过] {error['path']}: {error['error']}")
+    return "\n".join(lines)
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+祖父-父-子（GFS）备份保留与按实际释放空间的清理模块
+"""
+
+import datetime
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Set
+
+
+GRANULARITIES = ("hourly", "daily", "weekly", "monthly")
+BUCKET_FORMATS = {
+    "hourly": lambda t: t.strftime("%Y%m%d%H"),
+    "daily": lambda t: t.strftime("%Y%m%d"),
+    "weekly": lambda t: "%04d-W%02d" % t.isocalendar()[:2],
+    "monthly": lambda t: t.strftime("%Y%m")
+}
+
+
+@dataclass
+class RetentionPolicy:
+    """保留策略：最新 keep_last 个 + 每小时/天/周/月各保留 N 个时间段的最新备份，可选磁盘预算"""
+    keep_last: int = 3
+    hourly: int = 24
+    daily: int = 7
+    weekly: int = 4
+    monthly: int = 12
+    disk_budget_bytes: int = 0  # 每个服务器的磁盘预算，0 表示不限制
+
+    def to_dict(self) -> Dict:
+        return {
+            "keep_last": self.keep_last,
+            "hourly": self.hourly,
+            "daily": self.daily,
+            "weekly": self.weekly,
+            "monthly": self.monthly,
+            "disk_budget_bytes": self.disk_budget_bytes
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'RetentionPolicy':
+        return cls(**data)
+
+
+def _eligible(backup, granularity: str) -> bool:
+    """计划备份只参与不超过自身保留类别的时间段（每小时的增量不会被当作月度备份保留）"""
+    retention_class = getattr(backup, "retention_class", "")
+    if retention_class not in GRANULARITIES:
+        return True
+    return GRANULARITIES.index(granularity) <= GRANULARITIES.index(retention_class)
+
+
+def select_gfs_keep(backups: List, policy: RetentionPolicy) -> Set[str]:
+    """按GFS规则选出要保留的备份ID（backups 按时间从新到旧）"""
+    keep = {b.backup_id for b in backups[:policy.keep_last]}
+    for granularity in GRANULARITIES:
+        limit = getattr(policy, granularity)
+        bucket_of = BUCKET_FORMATS[granularity]
+        seen = set()
+        for backup in backups:
+            if len(seen) >= limit:
+                break
+            if not _eligible(backup, granularity):
+                continue
+            bucket = bucket_of(datetime.datetime.fromisoformat(backup.backup_time))
+            if bucket not in seen:
+                seen.add(bucket)
+                keep.add(backup.backup_id)
+    return keep
+
+
+class PruneCostModel:
+    """估算删除一组备份实际能释放的空间
+
+    - ZIP：文件大小；
+    - 去重备份：只有引用计数会归零的块才会被回收；
+    - 增量备份：仍被其他保留的增量清单引用时无法删除（释放0）。
+    """
+
+    def __init__(self, backups: List, chunk_refcounts: Dict[str, List[int]],
+                 load_dedup_chunks: Callable[[str], Set[str]],
+                 load_incremental_refs: Callable[[object], Optional[Set[str]]]):
+        self.backups = {b.backup_id: b for b in backups}
+        self.refcounts = chunk_refcounts
+        self.dedup_chunks: Dict[str, Set[str]] = {}
+        self.incremental_refs: Dict[str, Set[str]] = {}
+        for backup in backups:
+            if backup.backup_format == "dedup":
+                self.dedup_chunks[backup.backup_id] = load_dedup_chunks(backup.backup_id)
+            elif backup.backup_format == "incremental":
+                refs = load_incremental_refs(backup)
+                self.incremental_refs[backup.backup_id] = refs if refs is not None else {backup.backup_id}
+        self.victims: Set[str] = set()
+        self._victim_refs: Dict[str, int] = {}  # 块 -> 已选中的备份中引用它的数量
+
+    def usage(self) -> int:
+        """这些备份当前占用的空间（去重块按唯一块计）"""
+        chunks = set()
+        for chunk_set in self.dedup_chunks.values():
+            chunks |= chunk_set
+        files = sum(b.backup_size for b in self.backups.values() if b.backup_format != "dedup")
+        return files + sum(self.refcounts.get(c, [0, 0])[1] for c in chunks)
+
+    def is_deletable(self, backup_id: str) -> bool:
+        """增量归档只有在没有其他未删除的增量备份引用它时才能删除"""
+        for other_id, refs in self.incremental_refs.items():
+            if other_id != backup_id and other_id not in self.victims and backup_id in refs:
+                return False
+        return True
+
+    def marginal_bytes(self, backup_id: str) -> int:
+        """在已选中的删除集合基础上，再删除该备份能释放的字节数"""
+        if not self.is_deletable(backup_id):
+            return 0
+        backup = self.backups[backup_id]
+        if backup.backup_format != "dedup":
+            return backup.backup_size
+        freed = 0
+        for chunk in self.dedup_chunks.get(backup_id, ()):
+            entry = self.refcounts.get(chunk)
+            if entry and entry[0] - self._victim_refs.get(chunk, 0) <= 1:
+                freed += entry[1]
+        return freed
+
+    def add_victim(self, backup_id: str) -> int:
+        """选中一个备份，返回它的边际释放量"""
+        freed = self.marginal_bytes(backup_id)
+        self.victims.add(backup_id)
+        for chunk in self.dedup_chunks.get(backup_id, ()):
+            self._victim_refs[chunk] = self._victim_refs.get(chunk, 0) + 1
+        return freed
+
+
+def plan_prune(backups: List, policy: RetentionPolicy, cost_model: PruneCostModel) -> List[str]:
+    """计算一次批量清理要删除的备份
+
+    先删除GFS不保留的备份；若仍超出磁盘预算，再从GFS保留集合中（最新 keep_last 个除外）
+    挑选实际释放空间最多的备份，直到满足预算。backups 按时间从新到旧。
+    """
+    keep = select_gfs_keep(backups, policy)
+    usage = cost_model.usage()
+
+    # 从新到旧处理：增量链尾先被选中，链头才能变为可删除
+    for backup in backups:
+        if backup.backup_id not in keep and cost_model.is_deletable(backup.backup_id):
+            usage -= cost_model.add_victim(backup.backup_id)
+
+    if policy.disk_budget_bytes > 0 and usage > policy.disk_budget_bytes:
+        protected = {b.backup_id for b in backups[:max(policy.keep_last, 1)]}
+        candidates = [b.backup_id for b in backups if b.backup_id in keep and b.backup_id not in protected]
+        while usage > policy.disk_budget_bytes and candidates:
+            # 实际释放量最大的优先，相同时删除更旧的
+            best = max(reversed(candidates), key=cost_model.marginal_bytes)
+            freed = cost_model.marginal_bytes(best)
+            if freed <= 0:
+                break
+            usage -= cost_model.add_victim(best)
+            candidates.remove(best)
+        if usage > policy.disk_budget_bytes:
+            print(f"清理后仍超出磁盘预算 {usage - policy.disk_budget_bytes} 字节")
+
+    return [b.backup_id for b in reversed(backups) if b.backup_id in cost_model.victims]
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地S3模拟服务器（用于测试对象存储卸载，数据保存在内存中）
+
+只实现备份用到的接口：分片上传、ListParts、HEAD、范围GET、DELETE。
+用法: python s3_mock_server.py [端口]
+"""
+
+import re
+import sys
+import uuid
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, unquote
+
+
+class MockS3State:
+    """对象和未完成的分片上传"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.objects = {}  # (bucket, key) -> bytes
+        self.uploads = {}  # upload_id -> {part_number: bytes}
+        self.fail_parts = set()  # 模拟失败的分片号（每个失败一次）
+
+
+class MockS3Handler(BaseHTTPRequestHandler):
+    state: MockS3State = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _parse(self):
+        parts = urlsplit(self.path)
+        bucket, _, key = unquote(parts.path).lstrip('/').partition('/')
+        query = {k: v[0] for k, v in parse_qs(parts.query, keep_blank_values=True).items()}
+        return bucket, key, query
+
+    def _reply(self, status: int, body: bytes = b"", headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def _authorized(self) -> bool:
+        if not self.headers.get("Authorization", "").startswith("AWS4-HMAC-SHA256 "):
+            self._reply(403, b"<Error><Code>AccessDenied</Code></Error>")
+            return False
+        return True
+
+    def do_POST(self):
+        bucket, key, query = self._parse()
+        body = self._body()
+        if not self._authorized():
+            return
+        if "uploads" in query:
+            upload_id = uuid.uuid4().hex
+            with self.state.lock:
+                self.state.uploads[upload_id] = {}
+            self._reply(200, f"<InitiateMultipartUploadResult><UploadId>{upload_id}</UploadId>"
+                             f"</InitiateMultipartUploadResult>".encode())
+        elif "uploadId" in query:
+            numbers = [int(n) for n in re.findall(rb"<PartNumber>(\d+)</PartNumber>", body)]
+            with self.state.lock:
+                parts = self.state.uploads.pop(query["uploadId"], None)
+                if parts is None or any(n not in parts for n in numbers):
+                    self._reply(400, b"<Error><Code>InvalidPart</Code></Error>")
+                    return
+                self.state.objects[(bucket, key)] = b"".join(parts[n] for n in sorted(numbers))
+            self._reply(200, b"<CompleteMultipartUploadResult></CompleteMultipartUploadResult>")
+        else:
+            self._reply(400)
+
+    def do_PUT(self):
+        bucket, key, query = self._parse()
+        body = self._body()
+        if not self._authorized():
+            return
+        if "uploadId" in query:
+            number = int(query["partNumber"])
+            with self.state.lock:
+                if number in self.state.fail_parts:
+                    self.state.fail_parts.discard(number)
+                    self._reply(500, b"<Error><Code>InternalError</Code></Error>")
+                    return
+                if query["uploadId"] not in self.state.uploads:
+                    self._reply(404, b"<Error><Code>NoSuchUpload</Code></Error>")
+                    return
+                self.state.uploads[query["uploadId"]][number] = body
+        else:
+            with self.state.lock:
+                self.state.objects[(bucket, key)] = body
+        self._reply(200, headers={"ETag": f'"{hashlib.md5(body).hexdigest()}"'})
+
+    def do_GET(self):
+        bucket, key, query = self._parse()
+        if not self._authorized():
+            return
+        if "uploadId" in query:
+            with self.state.lock:
+                parts = self.state.uploads.get(query["uploadId"])
+                parts = dict(parts) if parts is not None else None
+            if parts is None:
+                self._reply(404, b"<Error><Code>NoSuchUpload</Code></Error>")
+                return
+            items = "".join(f"<Part><PartNumber>{n}</PartNumber><ETag>\"{hashlib.md5(d).hexdigest()}\"</ETag>"
+                            f"<Size>{len(d)}</Size></Part>" for n, d in sorted(parts.items()))
+            self._reply(200, f"<ListPartsResult><IsTruncated>false</IsTruncated>{items}"
+                             f"</ListPartsResult>".encode())
+            return
+
+        data = self.state.objects.get((bucket, key))
+        if data is None:
+            self._reply(404, b"<Error><Code>NoSuchKey</Code></Error>")
+            return
+        match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        if match:
+            start = int(match.group(1))
+            end = int(match.group(2)) if match.group(2) else len(data) - 1
+            self._reply(206, data[start:end + 1], {"Content-Range": f"bytes {start}-{end}/{len(data)}"})
+        else:
+            self._reply(200, data)
+
+    def do_HEAD(self):
+        bucket, key, _ = self._parse()
+        data = self.state.objects.get((bucket, key))
+        if data is None:
+            self._reply(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+
+    def do_DELETE(self):
+        bucket, key, query = self._parse()
+        if not self._authorized():
+            return
+        with self.state.lock:
+            if "uploadId" in query:
+                self.state.uploads.pop(query["uploadId"], None)
+            else:
+                self.state.objects.pop((bucket, key), None)
+        self._reply(204)
+
+
+def start_mock_server(port: int = 0):
+    """在后台线程启动模拟服务器，返回 (server, state)，server.server_address[1] 为端口"""
+    state = MockS3State()
+    handler = type("Handler", (MockS3Handler,), {"state": state})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 9000
+    server, _ = start_mock_server(port)
+    print(f"S3模拟服务器运行在 http://127.0.0.1:{server.server_address[1]}，按 Ctrl+C 停止")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
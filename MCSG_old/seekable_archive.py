@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+可随机访问的 tar+zstd 备份格式模块
+
+归档是一个tar流，按约 BLOCK_SIZE 切成相互独立的zstd帧并行压缩，
+末尾的zstd可跳过帧中保存索引（条目 → tar流偏移，帧 → 压缩/原始偏移），
+因此整个文件仍可被 `zstd -d | tar x` 解开，也可以只解压某个文件所在的帧。
+"""
+
+import os
+import json
+import struct
+import hashlib
+import tarfile
+import threading
+from bisect import bisect_right
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from io_throttle import lower_current_priority
+from parallel_archive import BLOCK_SIZE, BlockHasher, combine_block_digests, member_target_path
+
+try:
+    import zstandard
+except ImportError:  # 没有zstandard时不能使用该格式
+    zstandard = None
+
+
+ARCHIVE_SUFFIX = ".tar.zst"
+INDEX_MAGIC = 0x184D2A50  # zstd可跳过帧，标准解压器会忽略
+FOOTER_MAGIC = 0x184D2A51
+FOOTER_TAG = b"MCSGTZI1"
+FOOTER_SIZE = 8 + 8 + len(FOOTER_TAG)
+TAR_BLOCK = 512
+
+
+def is_available() -> bool:
+    return zstandard is not None
+
+
+def compress_frame(pieces: List[tuple], level: int) -> Tuple[bytes, int, List[bytes]]:
+    """压缩一帧（在工作进程中执行）
+
+    pieces 为 ("b", 字节) 或 ("f", 文件路径, 偏移, 长度)，返回 (压缩帧, 原始长度, 各文件段的SHA-256)。
+    """
+    raw = bytearray()
+    digests = []
+    for piece in pieces:
+        if piece[0] == "b":
+            raw += piece[1]
+            continue
+        _, file_path, offset, length = piece
+        with open(file_path, 'rb') as f:
+            f.seek(offset)
+            data = f.read(length)
+        # 文件在备份期间变短时补零，保持tar流结构完整（哈希按实际写入的数据计算）
+        data = data.ljust(length, b"\0")
+        digests.append(hashlib.sha256(data).digest())
+        raw += data
+    return zstandard.ZstdCompressor(level=level).compress(bytes(raw)), len(raw), digests
+
+
+def _skippable_frame(magic: int, payload: bytes) -> bytes:
+    return struct.pack("<II", magic, len(payload)) + payload
+
+
+class SeekableTarWriter:
+    """并行压缩的 tar+zstd 写入器
+
+    文件数据按 BLOCK_SIZE 对齐切段，每段的SHA-256就是块摘要，
+    文件哈希与ZIP清单使用同一算法（combine_block_digests）。
+    """
+
+    def __init__(self, archive_path: str, level: int = 3, workers: Optional[int] = None,
+                 use_processes: bool = True, throttle=None, priority: Optional[Tuple[int, str]] = None,
+                 frame_size: int = BLOCK_SIZE):
+        if zstandard is None:
+            raise RuntimeError("tar+zstd 备份需要安装 zstandard")
+        self.archive_path = archive_path
+        self.level = level
+        self.workers = workers or os.cpu_count() or 1
+        self.use_processes = use_processes
+        self.throttle = throttle
+        self.priority = priority
+        self.frame_size = max(frame_size, BLOCK_SIZE)  # 一段文件数据必须能放进一帧
+        self.max_pending = self.workers * 4
+        self.frames: List[List[int]] = []  # [压缩偏移, 压缩长度, 原始偏移, 原始长度]
+        self.files: Dict[str, Dict] = {}
+        self.total_raw_bytes = 0
+        self._digests: Dict[str, List[bytes]] = {}
+        self._pieces: List[tuple] = []
+        self._piece_owners: List[str] = []
+        self._frame_raw = 0
+        self._raw_offset = 0
+        self._pending = deque()
+        self._executor = None
+        self._fp = None
+
+    def __enter__(self):
+        self._fp = open(self.archive_path, 'wb')
+        initializer, initargs = (lower_current_priority, self.priority) if self.priority else (None, ())
+        if self.use_processes and self.workers > 1:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=initializer,
+                                                 initargs=initargs)
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, initializer=initializer,
+                                                initargs=initargs)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self._add_bytes(b"\0" * (TAR_BLOCK * 2))  # tar结束标记
+                self._flush_frame()
+                while self._pending:
+                    self._write_frame(*self._pending.popleft())
+                self._write_index()
+        finally:
+            self._executor.shutdown(wait=True, cancel_futures=exc_type is not None)
+            self._fp.close()
+        return False
+
+    def _add_bytes(self, data: bytes):
+        if self._frame_raw + len(data) > self.frame_size and self._pieces:
+            self._flush_frame()
+        self._pieces.append(("b", data))
+        self._frame_raw += len(data)
+        self._raw_offset += len(data)
+
+    def _add_segment(self, file_path: str, arc_path: str, offset: int, length: int):
+        if self._frame_raw + length > self.frame_size and self._pieces:
+            self._flush_frame()
+        if self.throttle:
+            self.throttle.consume(length)  # 段在提交后由工作进程读取，提交前限速
+        self._pieces.append(("f", file_path, offset, length))
+        self._piece_owners.append(arc_path)
+        self._frame_raw += length
+        self._raw_offset += length
+
+    def _flush_frame(self):
+        if not self._pieces:
+            return
+        future = self._executor.submit(compress_frame, self._pieces, self.level)
+        self._pending.append((future, self._raw_offset - self._frame_raw, self._piece_owners))
+        self._pieces, self._piece_owners, self._frame_raw = [], [], 0
+        while len(self._pending) > self.max_pending:
+            self._write_frame(*self._pending.popleft())
+
+    def _write_frame(self, future, raw_offset: int, owners: List[str]):
+        """按顺序取回压缩帧并写入"""
+        data, raw_length, digests = future.result()
+        self.frames.append([self._fp.tell(), len(data), raw_offset, raw_length])
+        self._fp.write(data)
+        for arc_path, digest in zip(owners, digests):
+            self._digests[arc_path].append(digest)
+
+    def write_files(self, files: Iterable[Tuple[str, str]]):
+        """把文件追加到tar流"""
+        for file_path, arc_path in files:
+            try:
+                stat = os.stat(file_path)
+            except OSError as e:
+                print(f"跳过无法读取的文件 {arc_path}: {e}")
+                continue
+
+            name = arc_path.replace(os.sep, '/')
+            info = tarfile.TarInfo(name)
+            info.size = stat.st_size
+            info.mtime = int(stat.st_mtime)
+            info.mode = stat.st_mode & 0o7777
+            self._add_bytes(info.tobuf(tarfile.PAX_FORMAT, "utf-8", "surrogateescape"))
+
+            self.files[name] = {"offset": self._raw_offset, "size": stat.st_size,
+                                "mtime": stat.st_mtime, "mode": info.mode}
+            self._digests[name] = []
+            for offset in range(0, stat.st_size, BLOCK_SIZE):
+                self._add_segment(file_path, name, offset, min(BLOCK_SIZE, stat.st_size - offset))
+            remainder = stat.st_size % TAR_BLOCK
+            if remainder:
+                self._add_bytes(b"\0" * (TAR_BLOCK - remainder))
+            self.total_raw_bytes += stat.st_size
+
+    def _write_index(self):
+        """在末尾写入索引帧和定位索引的尾部帧"""
+        empty_digest = hashlib.sha256(b"").digest()
+        for name, entry in self.files.items():
+            entry["hash"] = combine_block_digests(self._digests[name] or [empty_digest])
+        index = {
+            "version": 1,
+            "hash_block_size": BLOCK_SIZE,
+            "frames": self.frames,
+            "files": self.files
+        }
+        raw = json.dumps(index, ensure_ascii=False).encode('utf-8')
+        index_offset = self._fp.tell()
+        self._fp.write(_skippable_frame(INDEX_MAGIC, zstandard.ZstdCompressor(level=3).compress(raw)))
+        self._fp.write(_skippable_frame(FOOTER_MAGIC, struct.pack("<Q", index_offset) + FOOTER_TAG))
+
+
+def load_index(fp) -> Dict:
+    """从归档末尾读取索引，格式不符时抛出 ValueError"""
+    fp.seek(0, os.SEEK_END)
+    end = fp.tell()
+    if end < FOOTER_SIZE:
+        raise ValueError("不是可随机访问的tar+zstd归档")
+    fp.seek(end - FOOTER_SIZE)
+    magic, length, index_offset = struct.unpack("<IIQ", fp.read(16))
+    if magic != FOOTER_MAGIC or fp.read(len(FOOTER_TAG)) != FOOTER_TAG:
+        raise ValueError("不是可随机访问的tar+zstd归档")
+    fp.seek(index_offset)
+    magic, length = struct.unpack("<II", fp.read(8))
+    if magic != INDEX_MAGIC:
+        raise ValueError("索引帧损坏")
+    return json.loads(zstandard.ZstdDecompressor().decompress(fp.read(length)).decode('utf-8'))
+
+
+class SeekableTarReader:
+    """按索引随机读取归档中的文件，只解压需要的帧（缓存最近一帧，按偏移顺序读取时每帧只解压一次）"""
+
+    def __init__(self, archive_path: str, index: Optional[Dict] = None):
+        if zstandard is None:
+            raise RuntimeError("读取 tar+zstd 备份需要安装 zstandard")
+        self.archive_path = archive_path
+        self._fp = open(archive_path, 'rb')
+        self.index = index or load_index(self._fp)
+        self._frame_starts = [frame[2] for frame in self.index["frames"]]
+        self._decompressor = zstandard.ZstdDecompressor()
+        self._cached: Tuple[int, bytes] = (-1, b"")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def close(self):
+        self._fp.close()
+
+    @property
+    def files(self) -> Dict[str, Dict]:
+        return self.index["files"]
+
+    def _frame(self, number: int) -> bytes:
+        if self._cached[0] != number:
+            offset, length, _, raw_length = self.index["frames"][number]
+            self._fp.seek(offset)
+            data = self._decompressor.decompress(self._fp.read(length), max_output_size=raw_length)
+            if len(data) != raw_length:
+                raise ValueError(f"帧 {number} 长度不符")
+            self._cached = (number, data)
+        return self._cached[1]
+
+    def read_range(self, start: int, length: int) -> Iterator[bytes]:
+        """读取tar流中 [start, start+length) 的数据"""
+        number = bisect_right(self._frame_starts, start) - 1
+        while length > 0:
+            data = self._frame(number)
+            begin = start - self.index["frames"][number][2]
+            chunk = data[begin:begin + length]
+            if not chunk:
+                raise ValueError("索引偏移超出归档范围")
+            yield chunk
+            start += len(chunk)
+            length -= len(chunk)
+            number += 1
+
+    def read_file_checked(self, name: str) -> Iterator[bytes]:
+        """逐块读取文件并在末尾校验哈希，失败抛出 ValueError"""
+        entry = self.files[name]
+        hasher = BlockHasher()
+        for chunk in self.read_range(entry["offset"], entry["size"]):
+            hasher.update(chunk)
+            yield chunk
+        if hasher.hexdigest() != entry["hash"]:
+            raise ValueError(f"哈希校验失败: {name}")
+
+    def extract_file(self, name: str, target_path: str):
+        """解压单个文件（先写临时文件，校验通过后替换目标）"""
+        os.makedirs(os.path.dirname(target_path) or ".", exist_ok=True)
+        temp_path = target_path + ".restore.tmp"
+        try:
+            with open(temp_path, 'wb') as dst:
+                for chunk in self.read_file_checked(name):
+                    dst.write(chunk)
+            entry = self.files[name]
+            os.replace(temp_path, target_path)
+            os.utime(target_path, (entry["mtime"], entry["mtime"]))
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+
+def list_files(archive_path: str) -> List[str]:
+    with open(archive_path, 'rb') as fp:
+        return sorted(load_index(fp)["files"])
+
+
+def extract_seekable(archive_path: str, target_directory: str, paths: Optional[Iterable[str]] = None,
+                     max_workers: int = 4) -> int:
+    """多线程解压（全部或 paths 指定的文件），返回解压的文件数
+
+    文件按所在的起始帧分组，每组由一个线程顺序处理，同一帧只解压一次。
+    """
+    with open(archive_path, 'rb') as fp:
+        index = load_index(fp)
+    wanted = set(paths) if paths is not None else None
+    frame_starts = [frame[2] for frame in index["frames"]]
+
+    groups: Dict[int, List[Tuple[str, str]]] = {}
+    for name, entry in sorted(index["files"].items(), key=lambda item: item[1]["offset"]):
+        if wanted is not None and name not in wanted:
+            continue
+        target_path = member_target_path(target_directory, name)
+        if target_path is None:
+            print(f"跳过不安全的条目: {name}")
+            continue
+        groups.setdefault(bisect_right(frame_starts, entry["offset"]) - 1, []).append((name, target_path))
+
+    local = threading.local()
+    readers: List[SeekableTarReader] = []
+    lock = threading.Lock()
+
+    def extract(group: List[Tuple[str, str]]):
+        reader = getattr(local, "reader", None)
+        if reader is None:
+            reader = local.reader = SeekableTarReader(archive_path, index)
+            with lock:
+                readers.append(reader)
+        for name, target_path in group:
+            reader.extract_file(name, target_path)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for _ in executor.map(extract, groups.values()):
+                pass
+    finally:
+        for reader in readers:
+            reader.close()
+    return sum(len(group) for group in groups.values())
+
+
+def verify_seekable(archive_path: str, throttle=None) -> Tuple[bool, str]:
+    """解压所有帧并校验每个文件的哈希，返回 (是否完好, 错误信息)"""
+    try:
+        with SeekableTarReader(archive_path) as reader:
+            for name, _ in sorted(reader.files.items(), key=lambda item: item[1]["offset"]):
+                for chunk in reader.read_file_checked(name):
+                    if throttle:
+                        throttle.consume(len(chunk))
+        return True, ""
+    except Exception as e:  # 包括 zstandard.ZstdError 等解压错误
+        return False, str(e)
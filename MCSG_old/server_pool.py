@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+服务器池自动扩缩容模块（大厅/小游戏实例池）
+"""
+
+import os
+import json
+import math
+import time
+import threading
+import datetime
+from typing import Dict, List, Optional
+from dataclasses import dataclass, field
+
+
+FORECAST_SLOT_MINUTES = 15
+FORECAST_SLOTS = 24 * 60 // FORECAST_SLOT_MINUTES
+
+
+@dataclass
+class ServerPool:
+    """服务器池配置与状态"""
+    name: str
+    template_name: str = ""  # 仅作记录；新实例从种子实例复制
+    min_size: int = 1
+    max_size: int = 4
+    target_players_per_instance: int = 20
+    scale_up_cooldown: int = 60  # 秒
+    scale_down_cooldown: int = 600  # 秒
+    drain_timeout: int = 300  # 秒，排空超时后强制停止
+    base_port: int = 25600
+    forecast_enabled: bool = False
+    warmup_minutes: int = 10  # 预测提前量：提前多久启动实例
+    forecast_alpha: float = 0.3  # 历史平滑系数
+    seed_server_id: str = ""  # 扩容时复制的实例（为空时复制池内第一个实例）
+    server_ids: List[str] = field(default_factory=list)
+    # 按一天中的时段（15分钟一格）记录的平滑玩家数
+    player_history: List[float] = field(default_factory=lambda: [0.0] * FORECAST_SLOTS)
+    history_samples: List[int] = field(default_factory=lambda: [0] * FORECAST_SLOTS)
+
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "template_name": self.template_name,
+            "min_size": self.min_size,
+            "max_size": self.max_size,
+            "target_players_per_instance": self.target_players_per_instance,
+            "scale_up_cooldown": self.scale_up_cooldown,
+            "scale_down_cooldown": self.scale_down_cooldown,
+            "drain_timeout": self.drain_timeout,
+            "base_port": self.base_port,
+            "forecast_enabled": self.forecast_enabled,
+            "warmup_minutes": self.warmup_minutes,
+            "forecast_alpha": self.forecast_alpha,
+            "seed_server_id": self.seed_server_id,
+            "server_ids": self.server_ids,
+            "player_history": self.player_history,
+            "history_samples": self.history_samples
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'ServerPool':
+        return cls(**data)
+
+
+@dataclass
+class PoolStatus:
+    """服务器池运行状态"""
+    active: List[str] = field(default_factory=list)
+    draining: List[str] = field(default_factory=list)
+    stopped: List[str] = field(default_factory=list)
+    total_players: int = 0
+    forecast_players: float = 0.0
+    desired_size: int = 0
+
+    def to_dict(self) -> Dict:
+        return {
+            "active": self.active,
+            "draining": self.draining,
+            "stopped": self.stopped,
+            "total_players": self.total_players,
+            "forecast_players": self.forecast_players,
+            "desired_size": self.desired_size
+        }
+
+
+def _time_slot(moment: datetime.datetime) -> int:
+    """时间所在的时段编号"""
+    return (moment.hour * 60 + moment.minute) // FORECAST_SLOT_MINUTES
+
+
+class PoolManager:
+    """服务器池管理器
+
+    基于 MultiServerManager 管理若干同模板实例组成的池，
+    根据实时在线人数（可选：按时段历史预测）自动扩容和缩容，缩容前先排空玩家。
+    """
+
+    def __init__(self, multi_server_manager, pools_file: str = "server_pools.json"):
+        self.multi_server_manager = multi_server_manager
+        self.pools_file = pools_file
+        self.pools: Dict[str, ServerPool] = {}
+        self.evaluate_interval = 15
+        self.drain_message = "本服务器即将关闭，请前往其他大厅"
+
+        self.running = False
+        self.scale_thread = None
+        self._stop_event = threading.Event()
+        self._lock = threading.RLock()
+        self._last_scale_up: Dict[str, float] = {}
+        self._last_scale_down: Dict[str, float] = {}
+        self._draining: Dict[str, float] = {}  # server_id -> 开始排空时间
+        self._last_history_update: Dict[str, int] = {}
+        self._slot_peak: Dict[str, int] = {}  # 当前时段内的峰值玩家数
+        self._slot_base: Dict[str, Optional[float]] = {}  # 进入当前时段前的平滑值
+
+        self.load_pools()
+
+    def load_pools(self):
+        """加载服务器池配置"""
+        if os.path.exists(self.pools_file):
+            try:
+                with open(self.pools_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                    self.pools = {p["name"]: ServerPool.from_dict(p) for p in data}
+            except Exception as e:
+                print(f"加载服务器池失败: {e}")
+                self.pools = {}
+
+    def save_pools(self):
+        """保存服务器池配置"""
+        try:
+            with open(self.pools_file, 'w', encoding='utf-8') as f:
+                json.dump([p.to_dict() for p in self.pools.values()], f, indent=4, ensure_ascii=False)
+        except Exception as e:
+            print(f"保存服务器池失败: {e}")
+
+    def create_pool(self, pool: ServerPool) -> bool:
+        """创建服务器池"""
+        with self._lock:
+            if pool.name in self.pools:
+                return False
+            if pool.min_size > pool.max_size:
+                raise ValueError("min_size 不能大于 max_size")
+            self.pools[pool.name] = pool
+            self.save_pools()
+            return True
+
+    def remove_pool(self, name: str, delete_servers: bool = False) -> bool:
+        """删除服务器池"""
+        with self._lock:
+            pool = self.pools.pop(name, None)
+            if not pool:
+                return False
+            if delete_servers:
+                for server_id in pool.server_ids:
+                    self.multi_server_manager.delete_server(server_id)
+            self.save_pools()
+            return True
+
+    def start(self):
+        """启动自动扩缩容"""
+        if self.running:
+            return
+
+        self.running = True
+        self._stop_event.clear()
+        self.scale_thread = threading.Thread(target=self._scale_loop, daemon=True)
+        self.scale_thread.start()
+
+    def stop(self):
+        """停止自动扩缩容（不会停止已运行的实例）"""
+        self.running = False
+        self._stop_event.set()
+        if self.scale_thread:
+            self.scale_thread.join(timeout=5)
+
+    def _scale_loop(self):
+        """扩缩容循环"""
+        while self.running:
+            for pool in list(self.pools.values()):
+                try:
+                    self.evaluate_pool(pool)
+                except Exception as e:
+                    print(f"服务器池 {pool.name} 扩缩容出错: {e}")
+            self._stop_event.wait(self.evaluate_interval)
+
+    def _get_pool_servers(self, pool: ServerPool):
+        """获取池内仍存在的实例"""
+        servers = []
+        for server_id in pool.server_ids:
+            server = self.multi_server_manager.get_server(server_id)
+            if server:
+                servers.append(server)
+        return servers
+
+    def get_pool_status(self, pool: ServerPool) -> PoolStatus:
+        """获取服务器池状态"""
+        status = PoolStatus()
+        for server in self._get_pool_servers(pool):
+            if not server.is_running():
+                self._draining.pop(server.server_id, None)
+                status.stopped.append(server.server_id)
+                continue
+            status.total_players += server.get_online_player_count()
+            if server.server_id in self._draining:
+                status.draining.append(server.server_id)
+            else:
+                status.active.append(server.server_id)
+
+        status.forecast_players = self.forecast_players(pool) if pool.forecast_enabled else 0.0
+        demand = max(status.total_players, status.forecast_players)
+        target = max(pool.target_players_per_instance, 1)
+        # 多留一个玩家的余量，实例满员时即扩容
+        desired = math.ceil((demand + 1) / target)
+        status.desired_size = min(max(desired, pool.min_size), pool.max_size)
+        return status
+
+    def record_history(self, pool: ServerPool, total_players: int, now: Optional[datetime.datetime] = None):
+        """记录时段玩家数：每个时段用该时段的峰值做一次指数平滑
+
+        同一时段内的后续采样只提高峰值，并从进入时段前的平滑值重新计算，
+        不会重复平滑，也不会用原始峰值覆盖平滑结果。
+        """
+        now = now or datetime.datetime.now()
+        slot = _time_slot(now)
+        slot_key = now.toordinal() * FORECAST_SLOTS + slot
+        if self._last_history_update.get(pool.name) == slot_key:
+            if total_players <= self._slot_peak[pool.name]:
+                return
+        else:
+            self._last_history_update[pool.name] = slot_key
+            self._slot_peak[pool.name] = -1
+            # 该时段还没有历史时直接使用峰值
+            self._slot_base[pool.name] = pool.player_history[slot] if pool.history_samples[slot] else None
+            pool.history_samples[slot] += 1
+
+        self._slot_peak[pool.name] = peak = max(self._slot_peak[pool.name], total_players)
+        base = self._slot_base[pool.name]
+        if base is None:
+            pool.player_history[slot] = float(peak)
+        else:
+            alpha = pool.forecast_alpha
+            pool.player_history[slot] = alpha * peak + (1 - alpha) * base
+        self.save_pools()
+
+    def forecast_players(self, pool: ServerPool, now: Optional[datetime.datetime] = None) -> float:
+        """预测未来 warmup_minutes 内的峰值玩家数"""
+        now = now or datetime.datetime.now()
+        slots = max(1, math.ceil(pool.warmup_minutes / FORECAST_SLOT_MINUTES) + 1)
+        start = _time_slot(now)
+        forecast = 0.0
+        for i in range(slots):
+            slot = (start + i) % FORECAST_SLOTS
+            if pool.history_samples[slot]:
+                forecast = max(forecast, pool.player_history[slot])
+        return forecast
+
+    def evaluate_pool(self, pool: ServerPool):
+        """评估并执行一次扩缩容"""
+        with self._lock:
+            status = self.get_pool_status(pool)
+            self.record_history(pool, status.total_players)
+            self._process_draining(pool, status)
+
+            active_count = len(status.active)
+            now = time.time()
+
+            if active_count < status.desired_size:
+                # 优先取消排空，其次启动已停止实例，最后创建新实例
+                if now - self._last_scale_up.get(pool.name, 0) >= pool.scale_up_cooldown or active_count < pool.min_size:
+                    self._scale_up(pool, status, status.desired_size - active_count)
+                    self._last_scale_up[pool.name] = now
+            elif active_count > status.desired_size:
+                if now - self._last_scale_down.get(pool.name, 0) >= pool.scale_down_cooldown:
+                    self._scale_down(pool, status)
+                    self._last_scale_down[pool.name] = now
+
+    def _scale_up(self, pool: ServerPool, status: PoolStatus, count: int):
+        """扩容"""
+        for server_id in list(status.draining):
+            if count <= 0:
+                return
+            self._draining.pop(server_id, None)
+            status.draining.remove(server_id)
+            status.active.append(server_id)
+            count -= 1
+            print(f"服务器池 {pool.name}: 取消排空 {server_id}")
+
+        for server_id in list(status.stopped):
+            if count <= 0:
+                return
+            if self._start_server(server_id):
+                status.stopped.remove(server_id)
+                status.active.append(server_id)
+                count -= 1
+
+        while count > 0 and len(pool.server_ids) < pool.max_size:
+            server_id = self._create_pool_server(pool)
+            if not server_id:
+                break
+            status.active.append(server_id)
+            count -= 1
+
+    def _scale_down(self, pool: ServerPool, status: PoolStatus):
+        """缩容：一次排空一个玩家最少的实例"""
+        candidates = []
+        for server_id in status.active:
+            server = self.multi_server_manager.get_server(server_id)
+            if server:
+                candidates.append((server.get_online_player_count(), server_id, server))
+        if not candidates:
+            return
+
+        _, server_id, server = min(candidates)
+        self._draining[server_id] = time.time()
+        print(f"服务器池 {pool.name}: 开始排空 {server.name}")
+        if server.get_online_player_count() > 0:
+            server.send_command(f"say {self.drain_message}")
+
+    def _process_draining(self, pool: ServerPool, status: PoolStatus):
+        """停止已排空或排空超时的实例"""
+        for server_id in list(status.draining):
+            server = self.multi_server_manager.get_server(server_id)
+            if not server:
+                self._draining.pop(server_id, None)
+                status.draining.remove(server_id)
+                continue
+            started = self._draining.get(server_id, time.time())
+            if server.get_online_player_count() == 0 or time.time() - started >= pool.drain_timeout:
+                print(f"服务器池 {pool.name}: 停止实例 {server.name}")
+                server.stop()
+                self._draining.pop(server_id, None)
+                status.draining.remove(server_id)
+                status.stopped.append(server_id)
+
+    def _seed_server(self, pool: ServerPool):
+        """扩容时复制的实例"""
+        if pool.seed_server_id:
+            return self.multi_server_manager.get_server(pool.seed_server_id)
+        servers = self._get_pool_servers(pool)
+        return servers[0] if servers else None
+
+    def _create_pool_server(self, pool: ServerPool) -> Optional[str]:
+        """复制种子实例（核心文件、eula、配置和地图）创建新实例并启动
+
+        首次启动成功后才加入池；失败时删除创建了一半的实例和目录。
+        """
+        seed = self._seed_server(pool)
+        if not seed:
+            print(f"服务器池 {pool.name} 没有可复制的实例，请设置 seed_server_id")
+            return None
+
+        server_id = None
+        try:
+            port = self.multi_server_manager.allocate_port(pool.base_port)
+            name = f"{pool.name}-{len(pool.server_ids) + 1}"
+            config = seed.config.copy()
+            config["port"] = str(port)
+            try:
+                server_id = self.multi_server_manager.clone_instance(seed.server_id, name, config)
+            finally:
+                self.multi_server_manager.release_port(port)
+        except Exception as e:
+            print(f"服务器池 {pool.name} 创建实例失败: {e}")
+
+        if not server_id or not self._start_server(server_id):
+            if server_id:
+                self.multi_server_manager.delete_server(server_id, remove_files=True)
+            return None
+
+        pool.server_ids.append(server_id)
+        self.save_pools()
+        return server_id
+
+    def _start_server(self, server_id: str) -> bool:
+        """启动池内实例"""
+        server = self.multi_server_manager.get_server(server_id)
+        if not server:
+            return False
+        try:
+            if server.start():
+                return True
+        except Exception as e:
+            print(f"启动池内实例失败 {server.name}: {e}")
+        return False
+
+    def is_draining(self, server_id: str) -> bool:
+        """实例是否正在排空（代理不应再向其分配新玩家）"""
+        return server_id in self._draining
+
+    def get_all_status(self) -> Dict[str, Dict]:
+        """获取所有服务器池状态"""
+        with self._lock:
+            return {name: self.get_pool_status(pool).to_dict() for name, pool in self.pools.items()}
@@ -6,6 +6,7 @@ Minecraft Server Manager - 启动程序
 
 import sys
 import os
+import multiprocessing
 
 
 def check_dependencies():
@@ -58,4 +59,6 @@ def main():
 
 
 if __name__ == "__main__":
+    # 备份并行压缩使用进程池，打包后的程序需要
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+代理编排测试（使用 proxy_standin.py 替身进程，不需要Java）
+
+用法: python -m unittest test_proxy_manager 或 python test_proxy_manager.py
+"""
+
+import os
+import shutil
+import socket
+import tempfile
+import time
+import unittest
+
+from multi_server_manager import MultiServerManager, ServerInstance
+from proxy_manager import ProxyInstance, ProxyManager
+from proxy_standin import use_standin
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class ProxyManagerTest(unittest.TestCase):
+    """两个替身后端 + 一个替身 Velocity 代理"""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix="proxy_test_")
+        self.multi = MultiServerManager(os.path.join(self.root, "servers.json"))
+        self.backends = []
+        for name in ("alpha", "beta"):
+            server = self._add(ServerInstance(name, name, self._directory(name),
+                                              {"port": str(free_port()), "max_players": "20"}))
+            use_standin(server, "backend")
+            self.backends.append(server)
+        self.proxy = self._add(ProxyInstance("proxy", "proxy", self._directory("proxy"),
+                                             {"port": str(free_port())}, "velocity"))
+        use_standin(self.proxy, "proxy")
+        with open(self.proxy.config_file, 'w', encoding='utf-8') as f:
+            f.write('bind = "0.0.0.0:25577"\n\n[servers]\nold = "127.0.0.1:1"\ntry = ["old"]\n')
+        self.proxy_manager = ProxyManager(self.multi)
+        self.proxy_lines = []
+        self.proxy.manager.add_output_callback(self.proxy_lines.append)
+
+        for server in self.backends + [self.proxy]:
+            self.assertTrue(server.start())
+            self.assertTrue(server.wait_until_ready(10))
+
+    def tearDown(self):
+        for server in self.backends + [self.proxy]:
+            if server.is_running() and not server.stop():
+                server.force_stop()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _directory(self, name: str) -> str:
+        directory = os.path.join(self.root, name)
+        os.makedirs(directory)
+        return directory
+
+    def _add(self, server):
+        self.multi.servers[server.server_id] = server
+        return server
+
+    def _join(self, server, *names):
+        for name in names:
+            self.assertIsNotNone(server.wait_for_output(f"{name} joined the game", 5, f"join {name}"))
+
+    def _reload_count(self, expected: int, timeout: float = 5) -> int:
+        """等待代理输出的重载次数达到 expected，返回实际次数"""
+        deadline = time.time() + timeout
+        while True:
+            count = sum(1 for line in list(self.proxy_lines) if "Configuration reloaded" in line)
+            if count >= expected or time.time() > deadline:
+                return count
+            time.sleep(0.05)
+
+    def test_least_loaded_ranking(self):
+        alpha, beta = self.backends
+        self._join(alpha, "Steve", "Alex")
+        self._join(beta, "Notch")
+        self.assertEqual(alpha.get_online_player_count(), 2)
+        self.assertEqual(self.proxy_manager.select_backend(self.proxy), beta)
+
+        # TPS过低的后端不接收新玩家
+        beta.send_command("settps 12")
+        self.assertIsNotNone(beta.wait_for_output("TPS from last", 5, "tps"))
+        self.assertFalse(self.proxy_manager.is_healthy(beta))
+        self.assertEqual([s.name for s in self.proxy_manager.rank_backends(self.proxy)], ["alpha", "beta"])
+
+    def test_render_config(self):
+        self._join(self.backends[0], "Steve")
+        content = self.proxy_manager.render_config(self.proxy)
+        alpha, beta = self.backends
+        self.assertIn(f'alpha = "127.0.0.1:{alpha.port}"', content)
+        self.assertIn(f'beta = "127.0.0.1:{beta.port}"', content)
+        self.assertIn('try = ["beta", "alpha"]', content)
+        self.assertIn('bind = "0.0.0.0:25577"', content)
+        self.assertNotIn("old", content)
+
+    def test_render_config_unique_names(self):
+        # 规范化后与 alpha/beta 重名（大小写、非ASCII字符被去掉）的后端不能互相覆盖
+        upper = self._add(ServerInstance("upper-alpha", "Alpha", self._directory("upper"),
+                                         {"port": str(free_port())}))
+        hall = self._add(ServerInstance("hall-beta", "大厅Beta", self._directory("hall"),
+                                        {"port": str(free_port())}))
+        alpha, beta = self.backends
+        names = self.proxy_manager.backend_names(self.proxy)
+        self.assertEqual(len(set(names.values())), 4)
+        self.assertEqual(names[alpha.server_id], "alpha-alpha")
+        self.assertEqual(names[upper.server_id], "alpha-upper-al")
+
+        content = self.proxy_manager.render_config(self.proxy)
+        for server in (alpha, beta, upper, hall):
+            self.assertIn(f'{names[server.server_id]} = "127.0.0.1:{server.port}"', content)
+
+    def test_sync_proxy_reloads_once_per_change(self):
+        self.assertTrue(self.proxy_manager.sync_proxy(self.proxy))
+        self.assertEqual(self._reload_count(1), 1)
+        self.assertFalse(self.proxy_manager.sync_proxy(self.proxy))
+        self.assertEqual(self._reload_count(2, timeout=0.5), 1)
+        with open(self.proxy.config_file, encoding='utf-8') as f:
+            self.assertIn("alpha", f.read())
+
+    def test_sync_proxy_retries_deferred_reload(self):
+        self.proxy_manager.min_reload_interval = 3600
+        self.proxy_manager.sync_proxy(self.proxy)
+        self.assertEqual(self._reload_count(1), 1)
+
+        # 间隔内的变化只写入文件，重载推迟
+        self._join(self.backends[0], "Steve", "Alex")
+        self.assertTrue(self.proxy_manager.sync_proxy(self.proxy))
+        self.assertEqual(self._reload_count(2, timeout=0.5), 1)
+        with open(self.proxy.config_file, encoding='utf-8') as f:
+            self.assertIn('try = ["beta", "alpha"]', f.read())
+
+        # 内容没有再变化，但间隔过后仍要补上重载
+        self.proxy_manager.min_reload_interval = 0
+        self.assertFalse(self.proxy_manager.sync_proxy(self.proxy))
+        self.assertEqual(self._reload_count(2), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
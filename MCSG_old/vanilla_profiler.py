@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+原版性能分析（/perf、/debug）采集与分析模块
+"""
+
+import os
+import re
+import csv
+import io
+import time
+import zipfile
+from typing import Dict, List, Optional, Tuple
+from dataclasses import dataclass, field
+
+
+# 性能分析树行:  "[02] |   |   ServerLevel[world] minecraft:overworld(201/1) - 80.00%/69.10%"
+PROFILE_LINE_PATTERN = re.compile(
+    r'^\[(\d+)\]\s((?:\|\s{3})*)(.+?)\((\d+)/(\d+)\)\s-\s([\d.]+)%/([\d.]+)%\s*$'
+)
+TIME_SPAN_PATTERN = re.compile(r'Time span:\s*([\d.]+)\s*ms', re.IGNORECASE)
+TICK_SPAN_PATTERN = re.compile(r'Tick span:\s*(\d+)\s*ticks', re.IGNORECASE)
+DIMENSION_PATTERN = re.compile(r'(\w[\w.\-]*:[\w/.\-]+)')
+KEY_VALUE_PATTERN = re.compile(r'^\s*([^:\[\]]{2,80}?):\s+(.+?)\s*$')
+
+
+@dataclass
+class ProfileNode:
+    """性能分析树节点"""
+    name: str
+    path: str
+    depth: int
+    calls: int = 0
+    calls_per_tick: int = 0
+    parent_percent: float = 0.0  # 占父节点的百分比
+    global_percent: float = 0.0  # 占整个tick的百分比
+    children: List['ProfileNode'] = field(default_factory=list)
+
+    @property
+    def self_percent(self) -> float:
+        """节点自身（不含子节点）占用的百分比"""
+        return max(self.global_percent - sum(c.global_percent for c in self.children), 0.0)
+
+    def walk(self):
+        """深度优先遍历"""
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "path": self.path,
+            "calls": self.calls,
+            "calls_per_tick": self.calls_per_tick,
+            "parent_percent": self.parent_percent,
+            "global_percent": self.global_percent,
+            "children": [c.to_dict() for c in self.children]
+        }
+
+
+@dataclass
+class ProfileReport:
+    """一次性能分析的结果"""
+    file_path: str
+    capture_type: str  # "perf" 或 "debug"
+    capture_time: float
+    time_span_ms: float = 0.0
+    tick_span: int = 0
+    trees: Dict[str, ProfileNode] = field(default_factory=dict)  # 报告内文件名 -> 根节点
+    dimensions: Dict[str, ProfileNode] = field(default_factory=dict)  # 维度 -> 子树
+    system_info: Dict[str, str] = field(default_factory=dict)
+    metrics: Dict[str, Dict[str, float]] = field(default_factory=dict)  # CSV指标 -> 列平均值
+
+    @property
+    def average_tick_ms(self) -> float:
+        if self.tick_span:
+            return self.time_span_ms / self.tick_span
+        return 0.0
+
+    def get_nodes(self) -> Dict[str, ProfileNode]:
+        """所有树节点，按路径索引"""
+        nodes = {}
+        for tree_name, root in self.trees.items():
+            for node in root.walk():
+                if node is not root:
+                    nodes[f"{tree_name}:{node.path}"] = node
+        return nodes
+
+    def to_dict(self) -> Dict:
+        return {
+            "file_path": self.file_path,
+            "capture_type": self.capture_type,
+            "capture_time": self.capture_time,
+            "time_span_ms": self.time_span_ms,
+            "tick_span": self.tick_span,
+            "average_tick_ms": self.average_tick_ms,
+            "trees": {name: root.to_dict() for name, root in self.trees.items()},
+            "dimensions": {name: node.to_dict() for name, node in self.dimensions.items()},
+            "system_info": self.system_info,
+            "metrics": self.metrics
+        }
+
+
+def parse_profile_tree(text: str) -> Optional[ProfileNode]:
+    """解析性能分析树文本，返回虚拟根节点"""
+    root = ProfileNode(name="root", path="", depth=-1, global_percent=100.0)
+    stack = [root]
+
+    for line in text.splitlines():
+        match = PROFILE_LINE_PATTERN.match(line.rstrip())
+        if not match:
+            continue
+
+        depth = int(match.group(1))
+        name = match.group(3).strip()
+        # 计数器行（以#开头）不属于计时树
+        if name.startswith('#'):
+            continue
+
+        while len(stack) > 1 and stack[-1].depth >= depth:
+            stack.pop()
+        parent = stack[-1]
+
+        node = ProfileNode(
+            name=name,
+            path=f"{parent.path}.{name}" if parent.path else name,
+            depth=depth,
+            calls=int(match.group(4)),
+            calls_per_tick=int(match.group(5)),
+            parent_percent=float(match.group(6)),
+            global_percent=float(match.group(7))
+        )
+        parent.children.append(node)
+        stack.append(node)
+
+    return root if root.children else None
+
+
+def parse_key_values(text: str) -> Dict[str, str]:
+    """解析 "键: 值" 格式的系统信息"""
+    info = {}
+    for line in text.splitlines():
+        if line.startswith(('//', '--', '[')):
+            continue
+        match = KEY_VALUE_PATTERN.match(line)
+        if match:
+            info.setdefault(match.group(1).strip(), match.group(2))
+    return info
+
+
+def parse_metrics_csv(text: str) -> Dict[str, float]:
+    """解析指标CSV，计算每列的平均值"""
+    reader = csv.reader(io.StringIO(text))
+    header = next(reader, None)
+    if not header:
+        return {}
+
+    sums = [0.0] * len(header)
+    counts = [0] * len(header)
+    for row in reader:
+        for i, value in enumerate(row[:len(header)]):
+            try:
+                sums[i] += float(value)
+                counts[i] += 1
+            except ValueError:
+                continue
+
+    return {name.strip(): sums[i] / counts[i] for i, name in enumerate(header) if counts[i]}
+
+
+def _find_dimensions(root: ProfileNode) -> Dict[str, ProfileNode]:
+    """在性能分析树中查找每个维度的子树（如 ServerLevel[world] minecraft:overworld）"""
+    dimensions = {}
+    for node in root.walk():
+        if node is root or 'level' not in node.name.lower():
+            continue
+        match = DIMENSION_PATTERN.search(node.name)
+        if match and match.group(1) not in dimensions:
+            dimensions[match.group(1)] = node
+    return dimensions
+
+
+def load_profile_report(file_path: str, capture_type: str = "perf") -> ProfileReport:
+    """加载并解析性能分析报告（zip或txt）"""
+    report = ProfileReport(
+        file_path=file_path,
+        capture_type=capture_type,
+        capture_time=os.path.getmtime(file_path)
+    )
+
+    entries: List[Tuple[str, str]] = []
+    if zipfile.is_zipfile(file_path):
+        with zipfile.ZipFile(file_path, 'r') as zipf:
+            for info in zipf.infolist():
+                if info.is_dir() or not info.filename.endswith(('.txt', '.csv')):
+                    continue
+                with zipf.open(info) as f:
+                    entries.append((info.filename, f.read().decode('utf-8', errors='replace')))
+    else:
+        with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+            entries.append((os.path.basename(file_path), f.read()))
+
+    for name, text in entries:
+        if name.endswith('.csv'):
+            metrics = parse_metrics_csv(text)
+            if metrics:
+                report.metrics[name] = metrics
+            continue
+
+        if not report.time_span_ms:
+            match = TIME_SPAN_PATTERN.search(text)
+            if match:
+                report.time_span_ms = float(match.group(1))
+        if not report.tick_span:
+            match = TICK_SPAN_PATTERN.search(text)
+            if match:
+                report.tick_span = int(match.group(1))
+
+        tree = parse_profile_tree(text)
+        if tree:
+            report.trees[name] = tree
+            for dimension, node in _find_dimensions(tree).items():
+                report.dimensions.setdefault(dimension, node)
+        else:
+            # system.txt / server.txt 等系统与JVM信息
+            for key, value in parse_key_values(text).items():
+                report.system_info.setdefault(key, value)
+
+    return report
+
+
+def get_top_consumers(report: ProfileReport, top_n: int = 15) -> List[Dict]:
+    """按自身耗时排序的tick消耗大户"""
+    tick_ms = report.average_tick_ms
+    consumers = []
+    for path, node in report.get_nodes().items():
+        consumers.append({
+            "path": path,
+            "name": node.name,
+            "self_percent": node.self_percent,
+            "global_percent": node.global_percent,
+            "self_ms_per_tick": node.self_percent / 100 * tick_ms if tick_ms else 0.0,
+            "calls_per_tick": node.calls_per_tick
+        })
+    consumers.sort(key=lambda c: c["self_percent"], reverse=True)
+    return consumers[:top_n]
+
+
+def diff_reports(before: ProfileReport, after: ProfileReport, top_n: int = 20) -> List[Dict]:
+    """对比两次采集，按耗时变化排序"""
+    before_nodes = before.get_nodes()
+    after_nodes = after.get_nodes()
+    # 同一服务器的两次采集报告内文件名一致，按路径匹配
+    changes = []
+    for path in set(before_nodes) | set(after_nodes):
+        old = before_nodes.get(path)
+        new = after_nodes.get(path)
+        old_percent = old.self_percent if old else 0.0
+        new_percent = new.self_percent if new else 0.0
+        changes.append({
+            "path": path,
+            "before_percent": old_percent,
+            "after_percent": new_percent,
+            "delta_percent": new_percent - old_percent,
+            "before_ms": old_percent / 100 * before.average_tick_ms,
+            "after_ms": new_percent / 100 * after.average_tick_ms
+        })
+    changes.sort(key=lambda c: abs(c["delta_percent"]), reverse=True)
+    return changes[:top_n]
+
+
+class VanillaProfiler:
+    """原版性能分析器
+
+    通过 send_command 触发 perf/debug 采集，等待 debug 目录生成报告并解析。
+    """
+
+    CAPTURE_TYPES = ("perf", "debug")
+
+    def __init__(self):
+        self.report_timeout = 60
+        self.poll_interval = 0.5
+        self.reports: Dict[str, List[ProfileReport]] = {}  # server_id -> 报告列表
+
+    def _list_report_files(self, server_directory: str) -> Dict[str, float]:
+        """列出debug目录下的报告文件及修改时间"""
+        files = {}
+        debug_dir = os.path.join(server_directory, "debug")
+        for root, _, file_names in os.walk(debug_dir):
+            for file_name in file_names:
+                if file_name.endswith(('.zip', '.txt')):
+                    path = os.path.join(root, file_name)
+                    try:
+                        files[path] = os.path.getmtime(path)
+                    except OSError:
+                        continue
+        return files
+
+    def _wait_for_report(self, server_directory: str, existing: Dict[str, float]) -> Optional[str]:
+        """等待新报告写入完成（文件大小稳定）"""
+        deadline = time.time() + self.report_timeout
+        last_sizes: Dict[str, int] = {}
+        while time.time() < deadline:
+            for path, mtime in self._list_report_files(server_directory).items():
+                if existing.get(path) == mtime:
+                    continue
+                try:
+                    size = os.path.getsize(path)
+                except OSError:
+                    continue
+                if size and last_sizes.get(path) == size:
+                    if not path.endswith('.zip') or zipfile.is_zipfile(path):
+                        return path
+                last_sizes[path] = size
+            time.sleep(self.poll_interval)
+        return None
+
+    def capture(self, server, capture_type: str = "perf", duration: float = 10) -> Optional[ProfileReport]:
+        """采集一次性能分析报告（阻塞直到报告生成）
+
+        perf 最长采集10秒后自动停止；debug 按 duration 采集。
+        """
+        if capture_type not in self.CAPTURE_TYPES:
+            raise ValueError(f"不支持的采集类型: {capture_type}")
+        if not server.is_running():
+            return None
+
+        existing = self._list_report_files(server.directory)
+        if not server.send_command(f"{capture_type} start"):
+            return None
+
+        try:
+            time.sleep(duration)
+        finally:
+            server.send_command(f"{capture_type} stop")
+
+        report_path = self._wait_for_report(server.directory, existing)
+        if not report_path:
+            print(f"等待性能分析报告超时: {server.name}")
+            return None
+
+        try:
+            report = load_profile_report(report_path, capture_type)
+        except Exception as e:
+            print(f"解析性能分析报告失败: {e}")
+            return None
+
+        self.reports.setdefault(server.server_id, []).append(report)
+        return report
+
+    def get_reports(self, server_id: str) -> List[ProfileReport]:
+        """获取服务器的历史采集结果"""
+        return list(self.reports.get(server_id, []))
+
+    def load_existing_reports(self, server) -> List[ProfileReport]:
+        """加载服务器debug目录中已有的报告"""
+        reports = []
+        for path in sorted(self._list_report_files(server.directory), key=os.path.getmtime):
+            capture_type = "perf" if path.endswith('.zip') else "debug"
+            try:
+                reports.append(load_profile_report(path, capture_type))
+            except Exception as e:
+                print(f"解析性能分析报告失败 {path}: {e}")
+        self.reports[server.server_id] = reports
+        return reports
+
+    def format_top_consumers(self, report: ProfileReport, top_n: int = 15) -> str:
+        """生成tick消耗大户的文本摘要"""
+        lines = [f"报告: {os.path.basename(report.file_path)}"]
+        if report.tick_span:
+            lines.append(f"采样: {report.tick_span} ticks / {report.time_span_ms:.0f} ms，"
+                         f"平均 {report.average_tick_ms:.2f} ms/tick")
+        for consumer in get_top_consumers(report, top_n):
+            lines.append(f"{consumer['self_percent']:6.2f}%  {consumer['self_ms_per_tick']:7.3f} ms  "
+                         f"{consumer['path']}")
+        return "\n".join(lines)
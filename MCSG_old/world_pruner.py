@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+世界区块清理模块
+
+按区块的 InhabitedTime（玩家在附近停留的累计tick数）删除只被路过的区块，
+保护出生点和配置的区域（领地等），并把区域文件紧凑地重写。只能在实例停止时运行：
+清理期间持有世界的 session.lock，服务器无法在此期间启动。
+"""
+
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import anvil
+import nbt
+from world_stats import find_region_directories
+
+
+TICKS_PER_SECOND = 20
+DEFAULT_THRESHOLD_TICKS = 60 * TICKS_PER_SECOND
+DEFAULT_SPAWN_RADIUS = 256  # 方块
+INHABITED_TIME_PATHS = ("InhabitedTime", "Level.InhabitedTime")  # 1.18起 / 更早版本
+# 与区块一起删除的同名区域文件（1.17起实体和兴趣点单独存放）
+RELATED_REGION_DIRECTORIES = ("entities", "poi")
+
+
+@dataclass
+class ProtectedArea:
+    """受保护的矩形区域（方块坐标，包含边界），dimension 为维度名或 "*" 表示所有维度"""
+    name: str
+    min_x: int
+    min_z: int
+    max_x: int
+    max_z: int
+    dimension: str = "*"
+
+    @classmethod
+    def around(cls, name: str, x: int, z: int, radius: int, dimension: str = "*") -> 'ProtectedArea':
+        return cls(name, x - radius, z - radius, x + radius, z + radius, dimension)
+
+    def applies_to(self, dimension: str) -> bool:
+        return self.dimension in ("*", dimension)
+
+    def chunk_bounds(self) -> Tuple[int, int, int, int]:
+        """覆盖的区块坐标范围 (min_cx, min_cz, max_cx, max_cz)"""
+        return self.min_x >> 4, self.min_z >> 4, self.max_x >> 4, self.max_z >> 4
+
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "min_x": self.min_x,
+            "min_z": self.min_z,
+            "max_x": self.max_x,
+            "max_z": self.max_z,
+            "dimension": self.dimension
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'ProtectedArea':
+        return cls(
+            name=data.get("name", ""),
+            min_x=int(min(data["min_x"], data["max_x"])),
+            min_z=int(min(data["min_z"], data["max_z"])),
+            max_x=int(max(data["min_x"], data["max_x"])),
+            max_z=int(max(data["min_z"], data["max_z"])),
+            dimension=data.get("dimension", "*")
+        )
+
+
+@dataclass
+class RegionPruneResult:
+    """一组区域文件（地形 + 实体 + 兴趣点）的清理结果"""
+    dimension: str
+    path: str
+    chunks: int = 0
+    removed: int = 0
+    protected: int = 0
+    unknown: int = 0  # 无法读取 InhabitedTime 的区块（保留）
+    bytes_before: int = 0
+    bytes_after: int = 0
+    error: str = ""
+
+    def to_dict(self) -> Dict:
+        return {
+            "dimension": self.dimension,
+            "path": self.path,
+            "chunks": self.chunks,
+            "removed": self.removed,
+            "protected": self.protected,
+            "unknown": self.unknown,
+            "bytes_before": self.bytes_before,
+            "bytes_after": self.bytes_after,
+            "error": self.error
+        }
+
+
+@dataclass
+class PruneReport:
+    """清理报告"""
+    directory: str
+    threshold_ticks: int
+    dry_run: bool
+    started_at: float = 0.0
+    duration_seconds: float = 0.0
+    regions: List[RegionPruneResult] = field(default_factory=list)
+
+    @property
+    def chunks_scanned(self) -> int:
+        return sum(r.chunks for r in self.regions)
+
+    @property
+    def chunks_removed(self) -> int:
+        return sum(r.removed for r in self.regions)
+
+    @property
+    def bytes_reclaimed(self) -> int:
+        return sum(r.bytes_before - r.bytes_after for r in self.regions if not r.error)
+
+    def to_dict(self) -> Dict:
+        return {
+            "directory": self.directory,
+            "threshold_ticks": self.threshold_ticks,
+            "dry_run": self.dry_run,
+            "started_at": self.started_at,
+            "duration_seconds": self.duration_seconds,
+            "regions_scanned": len(self.regions),
+            "regions_changed": sum(1 for r in self.regions if r.removed and not r.error),
+            "chunks_scanned": self.chunks_scanned,
+            "chunks_removed": self.chunks_removed,
+            "chunks_protected": sum(r.protected for r in self.regions),
+            "chunks_unknown": sum(r.unknown for r in self.regions),
+            "errors": [r.to_dict() for r in self.regions if r.error],
+            "bytes_reclaimed": self.bytes_reclaimed
+        }
+
+
+def _lock_file(f) -> bool:
+    """非阻塞地锁住文件（与服务器对 session.lock 使用的锁互斥）"""
+    try:
+        if sys.platform == "win32":
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.lockf(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        return False
+
+
+@contextmanager
+def world_locked(world_directories: List[str]):
+    """锁住各世界的 session.lock，世界正被服务器使用时抛出 RuntimeError"""
+    with ExitStack() as stack:
+        for directory in world_directories:
+            f = stack.enter_context(open(os.path.join(directory, "session.lock"), 'ab'))
+            if not _lock_file(f):
+                raise RuntimeError(f"世界正在被使用（session.lock 已锁定）: {directory}")
+        yield
+
+
+def world_roots(directory: str, dimensions: Dict[str, str]) -> List[str]:
+    """包含 level.dat 的世界目录"""
+    roots = set()
+    for name in dimensions:
+        path = os.path.join(directory, name.split('/')[0])
+        if os.path.isfile(os.path.join(path, "level.dat")):
+            roots.add(path)
+    return sorted(roots)
+
+
+def spawn_areas(directory: str, dimensions: Dict[str, str], radius: int) -> List[ProtectedArea]:
+    """从各主世界的 level.dat 读取出生点，返回出生点周围的保护区域"""
+    areas = []
+    for name in dimensions:
+        level_path = os.path.join(directory, name, "level.dat")
+        if os.path.basename(name) in ("DIM-1", "DIM1") or not os.path.isfile(level_path):
+            continue
+        try:
+            spawn = nbt.query_file(level_path, ["Data.SpawnX", "Data.SpawnZ"])
+        except (OSError, ValueError) as e:
+            print(f"读取出生点失败 {level_path}: {e}")
+            spawn = {}
+        areas.append(ProtectedArea.around("spawn", spawn.get("Data.SpawnX", 0), spawn.get("Data.SpawnZ", 0),
+                                          radius, name))
+    return areas
+
+
+def _is_protected(x: int, z: int, bounds: List[Tuple[int, int, int, int]]) -> bool:
+    for min_x, min_z, max_x, max_z in bounds:
+        if min_x <= x <= max_x and min_z <= z <= max_z:
+            return True
+    return False
+
+
+def prune_region(dimension: str, path: str, related_paths: List[str], threshold_ticks: int,
+                 protected_bounds: List[Tuple[int, int, int, int]], dry_run: bool = False) -> RegionPruneResult:
+    """清理一个区域文件（在工作进程中运行）
+
+    InhabitedTime 低于阈值且不在保护范围内的区块从地形和同名的实体、兴趣点区域文件中
+    一起删除；读不出 InhabitedTime 的区块保留。任何一个文件有损坏的区块时整组不改动。
+    """
+    result = RegionPruneResult(dimension, path)
+    try:
+        errors = []
+        records = list(anvil.iter_chunks(path, errors))
+        related = {p: list(anvil.iter_chunks(p, errors)) for p in related_paths}
+        if errors:
+            result.error = f"有 {len(errors)} 个区块损坏，跳过"
+            return result
+
+        files = [path] + related_paths
+        result.bytes_before = sum(os.path.getsize(p) for p in files)
+        result.chunks = len(records)
+
+        removed = set()
+        for record in records:
+            if _is_protected(record.x, record.z, protected_bounds):
+                result.protected += 1
+                continue
+            try:
+                found = nbt.query(record.decompress(), INHABITED_TIME_PATHS)
+            except (ValueError, OSError):
+                found = {}
+            inhabited = found.get(INHABITED_TIME_PATHS[0], found.get(INHABITED_TIME_PATHS[1]))
+            if inhabited is None:
+                result.unknown += 1
+            elif inhabited < threshold_ticks:
+                removed.add(record.index)
+        result.removed = len(removed)
+
+        external_removed = []
+        after = 0
+        for file_path, file_records in [(path, records)] + list(related.items()):
+            kept = [r for r in file_records if r.index not in removed]
+            external_removed.extend(anvil.external_chunk_path(file_path, r.x, r.z)
+                                    for r in file_records if r.index in removed and r.external)
+            if not removed:
+                after += os.path.getsize(file_path)
+            elif not kept:
+                if not dry_run:
+                    os.remove(file_path)
+            elif dry_run:
+                after += sum(-(-(len(r.payload) + 5) // anvil.SECTOR_SIZE) * anvil.SECTOR_SIZE
+                             for r in kept if not r.external) + anvil.HEADER_SIZE
+            else:
+                after += anvil.write_region(file_path, anvil.spatial_order(kept))
+        # 外部区块文件在区域文件替换后再删除，中途崩溃不会留下指向缺失文件的区块
+        for external_path in external_removed:
+            result.bytes_before += os.path.getsize(external_path)
+            if not dry_run:
+                os.remove(external_path)
+        result.bytes_after = after
+    except (OSError, ValueError) as e:
+        result.error = str(e)
+    return result
+
+
+def prune_world(directory: str, threshold_ticks: int = DEFAULT_THRESHOLD_TICKS,
+                protected_areas: Optional[List[ProtectedArea]] = None, spawn_radius: int = DEFAULT_SPAWN_RADIUS,
+                dimensions: Optional[List[str]] = None, dry_run: bool = False,
+                max_workers: Optional[int] = None) -> PruneReport:
+    """清理服务器目录下所有维度中 InhabitedTime 低于阈值的区块
+
+    必须在服务器停止时调用：运行期间锁住 session.lock，服务器正在运行时抛出 RuntimeError。
+    spawn_radius 大于0时自动保护各主世界出生点周围的区域。dry_run 只统计不修改文件。
+    """
+    report = PruneReport(directory, threshold_ticks, dry_run, time.time())
+    found = find_region_directories(directory)
+    if dimensions:
+        found = {name: path for name, path in found.items() if name in dimensions}
+    areas = list(protected_areas or [])
+    if spawn_radius > 0:
+        areas.extend(spawn_areas(directory, found, spawn_radius))
+
+    jobs = []
+    for name, region_directory in sorted(found.items()):
+        bounds = [area.chunk_bounds() for area in areas if area.applies_to(name)]
+        dimension_directory = os.path.dirname(region_directory)
+        for file_name in sorted(os.listdir(region_directory)):
+            if not anvil.REGION_FILE_PATTERN.match(file_name):
+                continue
+            related = [os.path.join(dimension_directory, sub, file_name) for sub in RELATED_REGION_DIRECTORIES]
+            jobs.append((name, os.path.join(region_directory, file_name),
+                         [p for p in related if os.path.isfile(p)], threshold_ticks, bounds, dry_run))
+
+    with world_locked(world_roots(directory, found)):
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(prune_region, *job) for job in jobs]
+            report.regions = [future.result() for future in futures]
+
+    report.duration_seconds = round(time.time() - report.started_at, 3)
+    return report
+
+
+def format_prune_report(report: PruneReport) -> str:
+    """把清理报告格式化为文本"""
+    data = report.to_dict()
+    lines = [
+        f"区块清理{'（演练，未修改文件）' if report.dry_run else ''}: {report.directory}",
+        f"阈值: {report.threshold_ticks} tick（{report.threshold_ticks / TICKS_PER_SECOND:.0f} 秒）",
+        f"区域文件: {data['regions_scanned']}，修改 {data['regions_changed']}",
+        f"区块: 扫描 {data['chunks_scanned']}，删除 {data['chunks_removed']}，"
+        f"保护 {data['chunks_protected']}，无法判断 {data['chunks_unknown']}",
+        f"回收空间: {report.bytes_reclaimed / 1024 / 1024:.1f} MB，耗时 {report.duration_seconds:.1f} 秒"
+    ]
+    for error in data["errors"]:
+        lines.append(f"  [跳过] {error['path']}: {error['error']}")
+    return "\n".join(lines)
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+世界统计模块（并行扫描所有维度的区域文件头）
+"""
+
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import anvil
+
+
+# 不会包含世界数据的目录
+SKIP_DIRECTORIES = {"logs", "cache", "libraries", "versions", "crash-reports", "backups", ".git"}
+
+
+@dataclass
+class DimensionStats:
+    """一个维度（一个 region 目录）的汇总"""
+    name: str
+    region_directory: str
+    regions: int = 0
+    chunks: int = 0
+    file_bytes: int = 0
+    used_bytes: int = 0
+    free_bytes: int = 0
+    newest_timestamp: int = 0
+    oldest_timestamp: int = 0
+    min_chunk_x: int = 0
+    max_chunk_x: int = 0
+    min_chunk_z: int = 0
+    max_chunk_z: int = 0
+
+    @property
+    def fragmentation(self) -> float:
+        total = self.used_bytes + self.free_bytes
+        return self.free_bytes / total if total else 0.0
+
+    def add(self, stats: anvil.RegionStats):
+        """累加一个区域文件"""
+        first = self.chunks == 0
+        self.regions += 1
+        self.file_bytes += stats.file_size
+        self.used_bytes += stats.used_sectors * anvil.SECTOR_SIZE
+        self.free_bytes += stats.free_sectors * anvil.SECTOR_SIZE
+        if not stats.chunk_count:
+            return
+        self.chunks += stats.chunk_count
+        self.newest_timestamp = max(self.newest_timestamp, stats.newest_timestamp)
+        if stats.oldest_timestamp:
+            self.oldest_timestamp = min(self.oldest_timestamp or stats.oldest_timestamp, stats.oldest_timestamp)
+        # 区域范围（按区域边界计算，不逐个区块比较）
+        x0, z0 = stats.region_x * 32, stats.region_z * 32
+        if first:
+            self.min_chunk_x, self.max_chunk_x, self.min_chunk_z, self.max_chunk_z = x0, x0 + 31, z0, z0 + 31
+        else:
+            self.min_chunk_x = min(self.min_chunk_x, x0)
+            self.max_chunk_x = max(self.max_chunk_x, x0 + 31)
+            self.min_chunk_z = min(self.min_chunk_z, z0)
+            self.max_chunk_z = max(self.max_chunk_z, z0 + 31)
+
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "region_directory": self.region_directory,
+            "regions": self.regions,
+            "chunks": self.chunks,
+            "file_bytes": self.file_bytes,
+            "used_bytes": self.used_bytes,
+            "free_bytes": self.free_bytes,
+            "fragmentation": round(self.fragmentation, 4),
+            "newest_timestamp": self.newest_timestamp,
+            "oldest_timestamp": self.oldest_timestamp,
+            "bounds": [self.min_chunk_x, self.min_chunk_z, self.max_chunk_x, self.max_chunk_z]
+        }
+
+
+@dataclass
+class WorldStats:
+    """服务器目录下所有维度的统计"""
+    directory: str
+    scanned_at: float = 0.0
+    duration_seconds: float = 0.0
+    dimensions: Dict[str, DimensionStats] = field(default_factory=dict)
+    regions: List[anvil.RegionStats] = field(default_factory=list)
+    errors: int = 0
+
+    @property
+    def total_chunks(self) -> int:
+        return sum(d.chunks for d in self.dimensions.values())
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(d.file_bytes for d in self.dimensions.values())
+
+    def most_fragmented(self, limit: int = 10) -> List[anvil.RegionStats]:
+        return sorted(self.regions, key=lambda r: r.free_sectors, reverse=True)[:limit]
+
+    def to_dict(self, include_regions: bool = False) -> Dict:
+        data = {
+            "directory": self.directory,
+            "scanned_at": self.scanned_at,
+            "duration_seconds": self.duration_seconds,
+            "total_chunks": self.total_chunks,
+            "total_bytes": self.total_bytes,
+            "errors": self.errors,
+            "dimensions": {name: d.to_dict() for name, d in self.dimensions.items()}
+        }
+        if include_regions:
+            data["regions"] = [r.to_dict() for r in self.regions]
+        return data
+
+
+def find_region_directories(directory: str) -> Dict[str, str]:
+    """查找所有维度的 region 目录，返回 {维度名: 目录}
+
+    维度名为 region 目录的父目录相对路径，如 world、world/DIM-1、world_nether/DIM-1、
+    world/dimensions/minecraft/xxx。
+    """
+    result = {}
+    for root, dirs, _ in os.walk(directory):
+        dirs[:] = [d for d in dirs if d not in SKIP_DIRECTORIES]
+        if "region" in dirs:
+            name = os.path.relpath(root, directory).replace(os.sep, '/')
+            result[name] = os.path.join(root, "region")
+        # 维度数据目录里不会再嵌套维度
+        dirs[:] = [d for d in dirs if d not in ("region", "entities", "poi", "data", "playerdata", "stats",
+                                                "advancements")]
+    return result
+
+
+def _list_region_files(region_directory: str) -> List[str]:
+    try:
+        with os.scandir(region_directory) as entries:
+            return [entry.path for entry in entries if anvil.REGION_FILE_PATTERN.match(entry.name)]
+    except OSError:
+        return []
+
+
+def scan_world(directory: str, max_workers: int = 8) -> WorldStats:
+    """并行扫描所有区域文件头，只读取每个文件开头的8 KiB"""
+    started = time.time()
+    world = WorldStats(directory, started)
+    jobs = []
+    for name, region_directory in sorted(find_region_directories(directory).items()):
+        world.dimensions[name] = DimensionStats(name, region_directory)
+        jobs.extend((name, path) for path in _list_region_files(region_directory))
+
+    def scan(job):
+        try:
+            return job[0], anvil.scan_region_file(job[1])
+        except (OSError, ValueError):
+            return job[0], None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for name, stats in executor.map(scan, jobs):
+            if stats is None:
+                world.errors += 1
+                continue
+            world.dimensions[name].add(stats)
+            world.regions.append(stats)
+
+    world.duration_seconds = round(time.time() - started, 3)
+    return world
+
+
+class WorldStatsCache:
+    """按目录缓存扫描结果；block 为 False 时返回旧结果并在后台刷新"""
+
+    def __init__(self, max_workers: int = 8):
+        self.max_workers = max_workers
+        self._results: Dict[str, WorldStats] = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def get(self, directory: str, max_age: float = 300, block: bool = True) -> Optional[WorldStats]:
+        directory = os.path.abspath(directory)
+        with self._lock:
+            cached = self._results.get(directory)
+            fresh = cached is not None and time.time() - cached.scanned_at < max_age
+            if fresh:
+                return cached
+            if not block:
+                if directory not in self._refreshing:
+                    self._refreshing.add(directory)
+                    threading.Thread(target=self.refresh, args=(directory,), daemon=True).start()
+                return cached
+        return self.refresh(directory)
+
+    def refresh(self, directory: str) -> WorldStats:
+        """立即重新扫描"""
+        directory = os.path.abspath(directory)
+        try:
+            stats = scan_world(directory, self.max_workers)
+            with self._lock:
+                self._results[directory] = stats
+            return stats
+        finally:
+            with self._lock:
+                self._refreshing.discard(directory)
+
+
+world_stats_cache = WorldStatsCache()